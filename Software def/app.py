@@ -2,6 +2,7 @@
 Calculadora Fiscal de ICMS ST - Aplicação Principal Refatorada
 Interface principal usando Streamlit
 """
+import importlib
 import streamlit as st
 from datetime import datetime
 
@@ -10,16 +11,31 @@ from core.database_manager import DatabaseManager
 from core.icms_calculator import ICMSCalculator
 from core.xml_processor import XMLProcessor
 from core.config_manager import ConfigManager
+from core.persistence_service import PersistenceService
+from core.retention_service import RetentionService
+from core.backup_service import BackupService
+from core.export_service import ExportService
+from core.report_service import ReportService
+from core.dashboard_service import DashboardService
+from core.warmup_service import WarmupService
 from utils.logger import SystemLogger
 from utils.exceptions import ValidationError, CalculationError, DatabaseError
 from utils.validators import Validators
 
-# Imports das páginas
-from pages.dashboard import show_dashboard
-from pages.calculo_icms import show_calculo_icms
-from pages.figuras_tributarias import show_figuras_tributarias
-from pages.relatorios import show_relatorios
-from pages.configuracoes import show_configuracoes
+# Páginas: (módulo, função de exibição), importadas só quando abertas.
+# Assim pandas, plotly, openpyxl e os exportadores ficam fora da inicialização
+PAGINAS = {
+    "dashboard": ("pages.dashboard", "show_dashboard"),
+    "calculo": ("pages.calculo_icms", "show_calculo_icms"),
+    "figuras": ("pages.figuras_tributarias", "show_figuras_tributarias"),
+    "relatorios": ("pages.relatorios", "show_relatorios"),
+    "configuracoes": ("pages.configuracoes", "show_configuracoes")
+}
+
+def carregar_pagina(pagina: str):
+    """Função de exibição da página, importando o módulo no primeiro acesso"""
+    modulo, funcao = PAGINAS[pagina]
+    return getattr(importlib.import_module(modulo), funcao)
 
 # Configuração da página
 st.set_page_config(
@@ -67,11 +83,34 @@ def init_services():
     """Inicializa os serviços do sistema"""
     try:
         db_manager = DatabaseManager()
-        icms_calculator = ICMSCalculator()
+        icms_calculator = ICMSCalculator(db_manager)
         xml_processor = XMLProcessor()
         validators = Validators()
         logger = SystemLogger('app')
-        config_manager = ConfigManager()
+        config_manager = ConfigManager(db_manager)
+        persistence_service = PersistenceService(db_manager)
+        
+        # Expurgo do histórico conforme manter_historico_dias
+        retention_service = RetentionService(db_manager, config_manager)
+        retention_service.start_scheduler()
+        
+        # Backup automático conforme backup_automatico / intervalo_backup_dias
+        backup_service = BackupService(db_manager, config_manager)
+        backup_service.start_scheduler()
+        
+        # Exportações geradas sob demanda e mantidas em cache no disco
+        export_service = ExportService(db_manager)
+        
+        # Relatórios sobre os rollups, em cache até a próxima alteração dos cálculos
+        report_service = ReportService(db_manager)
+        
+        # Métricas do dashboard compartilhadas entre as sessões
+        dashboard_service = DashboardService(db_manager)
+        
+        # Snapshot das figuras, parser de XML e métricas carregados em segundo plano,
+        # para o primeiro cálculo já ter a latência de regime
+        warmup_service = WarmupService(db_manager, icms_calculator, dashboard_service)
+        warmup_service.start()
         
         return {
             'db_manager': db_manager,
@@ -79,7 +118,14 @@ def init_services():
             'xml_processor': xml_processor,
             'validators': validators,
             'logger': logger,
-            'config_manager': config_manager
+            'config_manager': config_manager,
+            'persistence_service': persistence_service,
+            'retention_service': retention_service,
+            'backup_service': backup_service,
+            'export_service': export_service,
+            'report_service': report_service,
+            'dashboard_service': dashboard_service,
+            'warmup_service': warmup_service
         }
     except Exception as e:
         st.error(f"Erro na inicialização dos serviços: {e}")
@@ -113,18 +159,12 @@ def main():
     
     pagina = opcoes_menu[opcao_selecionada]
     
+    # Situação do aquecimento dos serviços
+    st.sidebar.caption(services['warmup_service'].resumo())
+    
     # Roteamento das páginas
     try:
-        if pagina == "dashboard":
-            show_dashboard(services)
-        elif pagina == "calculo":
-            show_calculo_icms(services)
-        elif pagina == "figuras":
-            show_figuras_tributarias(services)
-        elif pagina == "relatorios":
-            show_relatorios(services)
-        elif pagina == "configuracoes":
-            show_configuracoes(services)
+        carregar_pagina(pagina)(services)
     except Exception as e:
         st.error(f"Erro ao carregar página {pagina}: {e}")
         services['logger'].error(f"Erro na página {pagina}: {e}")
@@ -1,18 +1,152 @@
 """
 Componentes de gráficos e visualizações
+
+Os gráficos partem de dados já agregados (resumo por NCM, faixas de valores)
+e séries grandes são reduzidas no servidor antes de seguir para o navegador.
 """
-import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from core.result_store import impressao_digital
 from models.resultado_calculo import ResultadoCalculoGeral
 
+# Acima deste número de pontos a dispersão usa WebGL (scattergl) em vez de SVG
+LIMITE_PONTOS_SVG = 1000
+
+# Acima deste número de itens a dispersão é agregada em uma grade de faixas
+MAX_PONTOS_DISPERSAO = 5000
+FAIXAS_DISPERSAO = 60
+
+# Faixas do histograma de carga de ST e barras do gráfico por NCM
+FAIXAS_CARGA_ST = 20
+MAX_NCMS_GRAFICO = 15
+
+def chave_resultado(resultado: ResultadoCalculoGeral) -> str:
+    """Identificação do resultado para o cache de gráficos (impressão digital das entradas)"""
+    return resultado.impressao_digital or impressao_digital(
+        resultado.origem, resultado.chave_nfe, resultado.data_calculo, resultado.total_itens,
+        resultado.total_valor_produtos, resultado.total_icms_st
+    )
+
+def dados_por_ncm(resultado: ResultadoCalculoGeral, limite: int = MAX_NCMS_GRAFICO) -> pd.DataFrame:
+    """ICMS ST dos NCMs de maior valor, com os demais somados em "Outros" """
+    resumo = resultado.resumo_por_ncm()[['ncm', 'itens', 'icms_st']]
+    if len(resumo) <= limite:
+        return resumo.sort_values('icms_st', ascending=False)
+    
+    maiores = resumo.nlargest(limite, 'icms_st')
+    demais = resumo.drop(maiores.index)
+    outros = pd.DataFrame([{'ncm': 'Outros', 'itens': demais['itens'].sum(), 'icms_st': demais['icms_st'].sum()}])
+    return pd.concat([maiores, outros], ignore_index=True)
+
+def dados_dispersao(frame: pd.DataFrame, max_pontos: int = MAX_PONTOS_DISPERSAO,
+                    faixas: int = FAIXAS_DISPERSAO) -> pd.DataFrame:
+    """Valor × ICMS ST por item; acima de `max_pontos`, um ponto por célula da grade
+    
+    Na agregação cada ponto fica na média dos itens da célula e `itens` traz
+    quantos itens ele representa (no máximo `faixas`² pontos).
+    """
+    dados = pd.DataFrame({
+        'codigo_item': frame['codigo_item'],
+        'valor_total': frame['valor_total'].astype(float),
+        'icms_st': frame['valor_icms_st_recolher'].astype(float),
+        'itens': 1
+    })
+    if len(dados) <= max_pontos:
+        return dados
+    
+    def _faixa(valores: np.ndarray) -> np.ndarray:
+        amplitude = valores.max() - valores.min()
+        if not amplitude:
+            return np.zeros(len(valores), dtype=int)
+        return np.minimum(((valores - valores.min()) / amplitude * faixas).astype(int), faixas - 1)
+    
+    return dados.groupby(
+        [_faixa(dados['valor_total'].to_numpy()), _faixa(dados['icms_st'].to_numpy())], sort=False
+    ).agg(
+        valor_total=('valor_total', 'mean'),
+        icms_st=('icms_st', 'mean'),
+        itens=('itens', 'size')
+    ).reset_index(drop=True)
+
+def dados_carga_st(frame: pd.DataFrame, faixas: int = FAIXAS_CARGA_ST) -> pd.DataFrame:
+    """Quantidade de itens por faixa de carga de ST (ICMS ST sobre o valor do item, em %)"""
+    com_valor = frame[frame['valor_total'] > 0]
+    carga = (com_valor['valor_icms_st_recolher'] / com_valor['valor_total'] * 100).to_numpy()
+    if not len(carga):
+        return pd.DataFrame(columns=['faixa', 'itens'])
+    
+    contagens, limites = np.histogram(carga, bins=faixas)
+    return pd.DataFrame({
+        'faixa': [f"{inicio:.1f}% a {fim:.1f}%" for inicio, fim in zip(limites[:-1], limites[1:])],
+        'itens': contagens
+    })
+
+def figura_dispersao(dados: pd.DataFrame) -> go.Figure:
+    """Dispersão valor × ICMS ST; WebGL acima de LIMITE_PONTOS_SVG pontos"""
+    tipo_trace = go.Scattergl if len(dados) > LIMITE_PONTOS_SVG else go.Scatter
+    agregado = 'codigo_item' not in dados.columns
+    
+    if agregado:
+        # Pontos agregados: tamanho e cor pela quantidade de itens representados
+        trace = tipo_trace(
+            x=dados['valor_total'], y=dados['icms_st'], mode='markers',
+            customdata=dados['itens'],
+            marker=dict(
+                size=np.clip(np.sqrt(dados['itens']) * 3, 4, 30), color=dados['itens'],
+                colorscale='Blues', showscale=True, colorbar=dict(title="Itens")
+            ),
+            hovertemplate="Valor: R$ %{x:,.2f}<br>ICMS ST: R$ %{y:,.2f}<br>Itens: %{customdata}<extra></extra>"
+        )
+        titulo = f"Valor × ICMS ST por Item (agregado em {len(dados)} pontos)"
+    else:
+        trace = tipo_trace(
+            x=dados['valor_total'], y=dados['icms_st'], mode='markers',
+            customdata=dados['codigo_item'], marker=dict(size=6, opacity=0.7),
+            hovertemplate="Item %{customdata}<br>Valor: R$ %{x:,.2f}<br>ICMS ST: R$ %{y:,.2f}<extra></extra>"
+        )
+        titulo = "Valor × ICMS ST por Item"
+    
+    figura = go.Figure(trace)
+    figura.update_layout(title=titulo, xaxis_title="Valor do Item (R$)", yaxis_title="ICMS ST (R$)")
+    return figura
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _figura(chave: str, tipo: str, _resultado: ResultadoCalculoGeral) -> go.Figure:
+    """Figura do gráfico `tipo`, em cache pela impressão digital do resultado"""
+    if tipo == 'distribuicao_st':
+        estatisticas = _resultado.get_estatisticas()
+        dados = pd.DataFrame([
+            {'Categoria': 'Com ST', 'Quantidade': estatisticas['itens_com_st']},
+            {'Categoria': 'Sem ST', 'Quantidade': estatisticas['itens_sem_st']}
+        ])
+        return px.pie(dados, values='Quantidade', names='Categoria', title='Distribuição de Itens por ST')
+    
+    if tipo == 'por_ncm':
+        return px.bar(
+            dados_por_ncm(_resultado), x='ncm', y='icms_st', hover_data=['itens'],
+            labels={'ncm': "NCM", 'icms_st': "ICMS ST (R$)", 'itens': "Itens"}, title="ICMS ST por NCM"
+        ).update_xaxes(type='category')
+    
+    if tipo == 'carga_st':
+        return px.bar(
+            dados_carga_st(_resultado.to_frame()), x='faixa', y='itens',
+            labels={'faixa': "Carga de ST", 'itens': "Itens"}, title="Distribuição da Carga de ST"
+        )
+    
+    return figura_dispersao(dados_dispersao(_resultado.to_frame()))
+
 def show_estatisticas_calculo(resultado: ResultadoCalculoGeral):
     """Exibe estatísticas do cálculo"""
     st.subheader("📈 Estatísticas do Cálculo")
     
-    # Estatísticas por tipo
-    itens_com_st = sum(1 for item in resultado.detalhes_itens if item.valor_icms_st_recolher > 0)
-    itens_sem_figura = sum(1 for item in resultado.detalhes_itens if not item.possui_figura)
+    # Estatísticas derivadas do DataFrame do resultado
+    estatisticas = resultado.get_estatisticas()
+    itens_com_st = estatisticas['itens_com_st']
+    itens_sem_figura = estatisticas['itens_sem_figura']
     
     col1, col2, col3 = st.columns(3)
     
@@ -23,16 +157,19 @@ def show_estatisticas_calculo(resultado: ResultadoCalculoGeral):
         st.metric("Itens sem Figura", itens_sem_figura)
     
     with col3:
-        percentual_st = (itens_com_st / resultado.total_itens * 100) if resultado.total_itens > 0 else 0
-        st.metric("% com ST", f"{percentual_st:.1f}%")
+        st.metric("% com ST", f"{estatisticas['percentual_com_st']:.1f}%")
     
-    # Gráfico de distribuição
+    # Gráficos (figuras em cache por resultado)
     if len(resultado.detalhes_itens) > 1:
-        df_chart = pd.DataFrame([
-            {'Categoria': 'Com ST', 'Quantidade': itens_com_st},
-            {'Categoria': 'Sem ST', 'Quantidade': resultado.total_itens - itens_com_st}
-        ])
+        chave = chave_resultado(resultado)
+        
+        col_grafico1, col_grafico2 = st.columns(2)
+        
+        with col_grafico1:
+            st.plotly_chart(_figura(chave, 'distribuicao_st', resultado), use_container_width=True)
+        
+        with col_grafico2:
+            st.plotly_chart(_figura(chave, 'por_ncm', resultado), use_container_width=True)
         
-        fig = px.pie(df_chart, values='Quantidade', names='Categoria', 
-                    title='Distribuição de Itens por ST')
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        st.plotly_chart(_figura(chave, 'dispersao', resultado), use_container_width=True)
+        st.plotly_chart(_figura(chave, 'carga_st', resultado), use_container_width=True)
\ No newline at end of file
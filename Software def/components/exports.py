@@ -1,52 +1,446 @@
 """
 Funções de exportação de dados
 """
-import pandas as pd
+import csv
+import importlib.util
 import io
-from models.resultado_calculo import ResultadoCalculoGeral
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from config.database import ITENS_DECODIFICADOS_SQL
+from models.resultado_calculo import ResultadoCalculoGeral, ResultadoCalculoItem
+from utils.exceptions import ExportError
+
+# Colunas dos itens: (título, atributo de ResultadoCalculoItem / coluna decodificada, formato)
+COLUNAS_ITENS = [
+    ('Código', 'codigo_item', 'texto'),
+    ('Descrição', 'descricao', 'texto'),
+    ('NCM', 'ncm', 'texto'),
+    ('Quantidade', 'quantidade', 'numero'),
+    ('Valor Unitário', 'valor_unitario', 'numero'),
+    ('Valor Total', 'valor_total', 'moeda'),
+    ('Valor IPI', 'valor_ipi', 'moeda'),
+    ('Valor Frete', 'valor_frete', 'moeda'),
+    ('Frete por Fora', 'valor_frete_fora', 'moeda'),
+    ('Tipo Tributação', 'tipo_tributacao', 'texto'),
+    ('Alíquota ICMS', 'aliquota_icms', 'percentual'),
+    ('MVA Ajustado', 'mva_ajustado', 'percentual'),
+    ('Redução BC ST', 'reducao_bc_st', 'percentual'),
+    ('Redução BC Próprio', 'reducao_bc_proprio', 'percentual'),
+    ('Base Cálculo ST', 'base_calculo_st', 'moeda'),
+    ('ICMS ST Débito', 'valor_icms_st_debito', 'moeda'),
+    ('ICMS Próprio Crédito', 'valor_icms_proprio_credito', 'moeda'),
+    ('ICMS ST a Recolher', 'valor_icms_st_recolher', 'moeda'),
+    ('Custo Final Unitário', 'valor_custo_final', 'moeda'),
+    ('Possui Figura', 'possui_figura', 'booleano'),
+    ('Observações', 'observacoes', 'texto')
+]
+
+# Itens do histórico: identificação do cálculo seguida das colunas dos itens
+COLUNAS_HISTORICO = [
+    ('Cálculo', 'calculo_id', 'inteiro'),
+    ('Data do Cálculo', 'data_calculo', 'texto'),
+    ('Chave NFe', 'chave_nfe', 'texto'),
+    ('Origem', 'origem', 'texto'),
+    ('CNPJ Emitente', 'cnpj_emitente', 'texto')
+] + COLUNAS_ITENS
+
+# Colunas do histórico lidas de calculos_icms_st (as demais vêm dos itens)
+CAMPOS_CALCULO = {
+    'calculo_id': 'c.id',
+    'data_calculo': 'c.data_calculo',
+    'chave_nfe': 'c.chave_nfe',
+    'origem': 'c.origem',
+    'cnpj_emitente': 'c.cnpj_emitente'
+}
+
+# Aba de resumo da exportação por período
+COLUNAS_RESUMO_PERIODO = [
+    ('Mês', 'mes', 'texto'),
+    ('Cálculos', 'calculos', 'inteiro'),
+    ('Itens', 'itens', 'inteiro'),
+    ('Valor Total', 'valor_total', 'moeda'),
+    ('Valor IPI', 'valor_ipi', 'moeda'),
+    ('ICMS ST Débito', 'valor_icms_st_debito', 'moeda'),
+    ('ICMS Próprio Crédito', 'valor_icms_proprio_credito', 'moeda'),
+    ('ICMS ST a Recolher', 'valor_icms_st_recolher', 'moeda'),
+    ('Custo Final', 'custo_final', 'moeda')
+]
+
+# Formatos numéricos das células no Excel
+FORMATOS_EXCEL = {
+    'moeda': {'num_format': '#,##0.00'},
+    'numero': {'num_format': '#,##0.00##'},
+    'percentual': {'num_format': '0.00'},
+    'inteiro': {'num_format': '0'}
+}
+
+# Tipos das colunas no Parquet
+TIPOS_PARQUET = {
+    'texto': 'string',
+    'moeda': 'float64',
+    'numero': 'float64',
+    'percentual': 'float64',
+    'inteiro': 'int64',
+    'booleano': 'bool_'
+}
+
+# Limite de linhas de uma planilha Excel (excluindo o cabeçalho)
+MAX_LINHAS_EXCEL = 1048575
+
+# Linhas gravadas por bloco nos exportadores em lote
+TAMANHO_LOTE_EXPORTACAO = 10000
+
+Linha = Sequence[Any]
+Destino = Union[str, Path, BinaryIO]
 
 def export_to_excel(resultado: ResultadoCalculoGeral) -> bytes:
     """Exporta resultado para Excel"""
     output = io.BytesIO()
+    write_excel(output, linhas_resultado(resultado), COLUNAS_ITENS, resumo_resultado(resultado))
+    return output.getvalue()
+
+def export_to_csv(resultado: ResultadoCalculoGeral) -> bytes:
+    """Exporta resultado para CSV"""
+    output = io.BytesIO()
+    write_csv(output, linhas_resultado(resultado), COLUNAS_ITENS)
+    return output.getvalue()
+
+def export_to_parquet(resultado: ResultadoCalculoGeral) -> bytes:
+    """Exporta resultado para Parquet (requer pyarrow)"""
+    output = io.BytesIO()
+    write_parquet(output, linhas_resultado(resultado), COLUNAS_ITENS)
+    return output.getvalue()
+
+def export_historico(db_manager, destino: Destino, formato: str = 'csv', inicio: Optional[str] = None,
+                     fim: Optional[str] = None, **filtros) -> int:
+    """Exporta os itens salvos do período no formato informado (xlsx, csv ou parquet)"""
+    return get_exportador(formato)(destino, linhas_historico(db_manager, inicio, fim, **filtros), COLUNAS_HISTORICO)
+
+def export_historico_periodo(db_manager, destino: Destino, inicio: str, fim: str, formato: str = 'xlsx',
+                             cnpj_emitente: Optional[str] = None, ncm_prefixo: Optional[str] = None,
+                             origem: Optional[str] = None) -> int:
+    """Exporta o histórico consolidado do período e retorna a quantidade de itens
+    
+    Em xlsx, gera uma aba de resumo mensal e uma aba de itens por mês; nos
+    demais formatos, um único arquivo com todos os itens. As linhas vêm do
+    banco por cursor, sem carregar o período inteiro em memória.
+    """
+    linhas = linhas_historico(db_manager, inicio, fim, cnpj_emitente=cnpj_emitente,
+                              ncm_prefixo=ncm_prefixo, origem=origem)
+    if formato == 'xlsx':
+        return write_excel_mensal(destino, linhas, COLUNAS_HISTORICO)
+    return get_exportador(formato)(destino, linhas, COLUNAS_HISTORICO)
+
+def export_consulta(db_manager, destino: Destino, sql: str, colunas: List[Tuple[str, str, str]],
+                    params: Sequence = (), formato: str = 'csv', inicio: Optional[str] = None,
+                    fim: Optional[str] = None) -> int:
+    """Exporta o resultado de uma consulta sobre o histórico
+    
+    A consulta segue a convenção de `DatabaseManager.iter_historico`
+    ({esquema}.itens_calculo etc.) e deve retornar as colunas na ordem de `colunas`.
+    """
+    return get_exportador(formato)(destino, db_manager.iter_historico(sql, params, inicio, fim), colunas)
+
+def get_exportador(formato: str):
+    """Função de gravação do formato (xlsx, csv ou parquet)"""
+    exportadores = {'xlsx': write_excel, 'csv': write_csv, 'parquet': write_parquet}
+    if formato not in exportadores:
+        raise ExportError(f"Formato de exportação não suportado: {formato}")
+    return exportadores[formato]
+
+def parquet_disponivel() -> bool:
+    """Indica se o pyarrow está instalado (sem importá-lo)"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+def write_excel(destino: Destino, linhas: Iterable[Linha], colunas: List[Tuple[str, str, str]],
+                resumo: Optional[List[Tuple[str, Any, str]]] = None, nome_aba: str = 'Detalhes') -> int:
+    """Grava as linhas em XLSX em modo de memória constante e retorna quantas foram escritas
+    
+    Com `constant_memory` o xlsxwriter descarta cada linha ao passar para a
+    seguinte, então o consumo de memória não cresce com o número de itens.
+    Acima do limite de linhas do Excel, continua em novas abas.
+    """
+    import xlsxwriter
+    
+    workbook = xlsxwriter.Workbook(destino, {'constant_memory': True})
+    
+    try:
+        formatos, cabecalho = _formatos_excel(workbook)
+        
+        if resumo:
+            aba_resumo = workbook.add_worksheet('Resumo')
+            aba_resumo.set_column(0, 0, 24)
+            aba_resumo.set_column(1, 1, 18)
+            aba_resumo.write_row(0, 0, ('Métrica', 'Valor'), cabecalho)
+            for linha, (metrica, valor, formato) in enumerate(resumo, start=1):
+                aba_resumo.write_string(linha, 0, metrica)
+                aba_resumo.write_number(linha, 1, valor, formatos.get(formato))
+        
+        total = 0
+        worksheet = None
+        
+        for linha in linhas:
+            if worksheet is None or total % MAX_LINHAS_EXCEL == 0:
+                numero_aba = total // MAX_LINHAS_EXCEL + 1
+                worksheet = _nova_aba(workbook, nome_aba if numero_aba == 1 else f"{nome_aba} ({numero_aba})",
+                                      colunas, cabecalho)
+            
+            _escrever_linha(worksheet, total % MAX_LINHAS_EXCEL + 1, linha, colunas, formatos)
+            total += 1
+        
+        if worksheet is None:
+            _nova_aba(workbook, nome_aba, colunas, cabecalho)
+        
+        return total
+    
+    finally:
+        workbook.close()
+
+def write_excel_mensal(destino: Destino, linhas: Iterable[Linha], colunas: List[Tuple[str, str, str]]) -> int:
+    """Grava as linhas do histórico em uma aba por mês, precedidas de uma aba de resumo
+    
+    O mês vem da coluna data_calculo. No modo de memória constante cada aba
+    só aceita linhas em ordem crescente, o que as abas mensais respeitam
+    mesmo que um mês reapareça (banco principal após as partições); o
+    resumo é escrito ao final, na aba criada primeiro.
+    """
+    import xlsxwriter
     
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Aba resumo
-        resumo_data = {
-            'Métrica': ['Total de Itens', 'Valor dos Produtos', 'ICMS ST Total', 'Custo Final Total'],
-            'Valor': [resultado.total_itens, resultado.total_valor_produtos, resultado.total_icms_st, resultado.total_custo_final]
-        }
-        df_resumo = pd.DataFrame(resumo_data)
-        df_resumo.to_excel(writer, sheet_name='Resumo', index=False)
-        
-        # Aba detalhes
-        detalhes_data = []
-        for item in resultado.detalhes_itens:
-            detalhes_data.append({
-                'Código': item.codigo_item,
-                'Descrição': item.descricao,
-                'NCM': item.ncm,
-                'Quantidade': item.quantidade,
-                'Valor Unitário': item.valor_unitario,
-                'Valor Total': item.valor_total,
-                'Valor IPI': item.valor_ipi,
-                'Valor Frete': item.valor_frete,
-                'Frete por Fora': item.valor_frete_fora,
-                'Tipo Tributação': item.tipo_tributacao,
-                'Alíquota ICMS': item.aliquota_icms,
-                'MVA Ajustado': item.mva_ajustado,
-                'Redução BC ST': item.reducao_bc_st,
-                'Redução BC Próprio': item.reducao_bc_proprio,
-                'Base Cálculo ST': item.base_calculo_st,
-                'ICMS ST Débito': item.valor_icms_st_debito,
-                'ICMS Próprio Crédito': item.valor_icms_proprio_credito,
-                'ICMS ST a Recolher': item.valor_icms_st_recolher,
-                'Custo Final Unitário': item.valor_custo_final,
-                'Possui Figura': item.possui_figura,
-                'Observações': "; ".join(item.observacoes) if item.observacoes else ""
-            })
-        
-        df_detalhes = pd.DataFrame(detalhes_data)
-        df_detalhes.to_excel(writer, sheet_name='Detalhes', index=False)
-    
-    output.seek(0)
-    return output.getvalue()
\ No newline at end of file
+    posicoes = {campo: i for i, (_, campo, _) in enumerate(colunas)}
+    workbook = xlsxwriter.Workbook(destino, {'constant_memory': True})
+    
+    try:
+        formatos, cabecalho = _formatos_excel(workbook)
+        aba_resumo = workbook.add_worksheet('Resumo')
+        
+        abas: Dict[str, list] = {}  # mês -> [aba, próxima linha, parte]
+        resumo: Dict[str, Dict[str, Any]] = {}
+        ultimo_calculo = None
+        total = 0
+        
+        for linha in linhas:
+            mes = str(linha[posicoes['data_calculo']])[:7]
+            
+            if mes not in abas:
+                abas[mes] = [_nova_aba(workbook, mes, colunas, cabecalho), 1, 1]
+                resumo[mes] = dict.fromkeys((campo for _, campo, _ in COLUNAS_RESUMO_PERIODO), 0)
+                resumo[mes]['mes'] = mes
+            
+            aba = abas[mes]
+            if aba[1] > MAX_LINHAS_EXCEL:
+                aba[2] += 1
+                aba[0] = _nova_aba(workbook, f"{mes} ({aba[2]})", colunas, cabecalho)
+                aba[1] = 1
+            
+            _escrever_linha(aba[0], aba[1], linha, colunas, formatos)
+            aba[1] += 1
+            total += 1
+            
+            metricas = resumo[mes]
+            if linha[posicoes['calculo_id']] != ultimo_calculo:
+                ultimo_calculo = linha[posicoes['calculo_id']]
+                metricas['calculos'] += 1
+            metricas['itens'] += 1
+            for campo in ('valor_total', 'valor_ipi', 'valor_icms_st_debito',
+                          'valor_icms_proprio_credito', 'valor_icms_st_recolher'):
+                metricas[campo] += linha[posicoes[campo]] or 0
+            metricas['custo_final'] += (linha[posicoes['valor_custo_final']] or 0) * (linha[posicoes['quantidade']] or 0)
+        
+        # Resumo por mês e total do período
+        aba_resumo.set_column(0, len(COLUNAS_RESUMO_PERIODO) - 1, 20)
+        aba_resumo.write_row(0, 0, [titulo for titulo, _, _ in COLUNAS_RESUMO_PERIODO], cabecalho)
+        
+        meses = [resumo[mes] for mes in sorted(resumo)]
+        totais = {campo: sum(m[campo] for m in meses) for _, campo, _ in COLUNAS_RESUMO_PERIODO[1:]}
+        totais['mes'] = 'Total'
+        
+        for numero, metricas in enumerate(meses + [totais], start=1):
+            valores = [round(metricas[campo], 2) if formato == 'moeda' else metricas[campo]
+                       for _, campo, formato in COLUNAS_RESUMO_PERIODO]
+            _escrever_linha(aba_resumo, numero, valores, COLUNAS_RESUMO_PERIODO, formatos)
+        
+        return total
+    
+    finally:
+        workbook.close()
+
+def write_csv(destino: Destino, linhas: Iterable[Linha], colunas: List[Tuple[str, str, str]],
+              tamanho_lote: int = TAMANHO_LOTE_EXPORTACAO, delimitador: str = ';') -> int:
+    """Grava as linhas em CSV (UTF-8 com BOM) em blocos e retorna quantas foram escritas
+    
+    O separador padrão é ponto e vírgula, como espera o Excel em português;
+    os números seguem com ponto decimal para leitura por outras ferramentas.
+    """
+    total = 0
+    linhas = iter(linhas)
+    
+    with _abrir_texto(destino) as arquivo:
+        writer = csv.writer(arquivo, delimiter=delimitador)
+        writer.writerow([titulo for titulo, _, _ in colunas])
+        
+        booleanas = [i for i, (_, _, formato) in enumerate(colunas) if formato == 'booleano']
+        
+        while True:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+            
+            if booleanas:
+                lote = [_booleanos_texto(linha, booleanas) for linha in lote]
+            
+            writer.writerows(lote)
+            total += len(lote)
+    
+    return total
+
+def write_parquet(destino: Destino, linhas: Iterable[Linha], colunas: List[Tuple[str, str, str]],
+                  tamanho_lote: int = 50000, compressao: str = 'zstd') -> int:
+    """Grava as linhas em Parquet, um row group por bloco, e retorna quantas foram escritas
+    
+    As colunas usam os nomes dos campos (codigo_item, valor_total...) para
+    facilitar a leitura por ferramentas de BI.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Exportação Parquet requer o pacote pyarrow")
+    
+    schema = pa.schema([(campo, getattr(pa, TIPOS_PARQUET[formato])()) for _, campo, formato in colunas])
+    total = 0
+    linhas = iter(linhas)
+    
+    with pq.ParquetWriter(destino, schema, compression=compressao) as writer:
+        while True:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+            
+            # Transpõe o bloco para colunas; o SQLite devolve booleanos como 0/1
+            arrays = []
+            for valores, tipo in zip(zip(*lote), schema.types):
+                if tipo == pa.bool_():
+                    valores = [None if v is None else bool(v) for v in valores]
+                arrays.append(pa.array(valores, type=tipo))
+            
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            total += len(lote)
+    
+    return total
+
+def resumo_resultado(resultado: ResultadoCalculoGeral) -> List[Tuple[str, Any, str]]:
+    """Métricas da aba de resumo: (métrica, valor, formato)"""
+    return [
+        ('Total de Itens', resultado.total_itens, 'inteiro'),
+        ('Valor dos Produtos', resultado.total_valor_produtos, 'moeda'),
+        ('ICMS ST Total', resultado.total_icms_st, 'moeda'),
+        ('Custo Final Total', resultado.total_custo_final, 'moeda')
+    ]
+
+def linhas_resultado(resultado: ResultadoCalculoGeral) -> Iterator[Linha]:
+    """Itens do resultado como tuplas na ordem de COLUNAS_ITENS"""
+    for item in resultado.detalhes_itens:
+        yield tuple(_valor_item(item, campo) for _, campo, _ in COLUNAS_ITENS)
+
+def linhas_historico(db_manager, inicio: Optional[str] = None, fim: Optional[str] = None,
+                     cnpj_emitente: Optional[str] = None, ncm_prefixo: Optional[str] = None,
+                     origem: Optional[str] = None) -> Iterator[Linha]:
+    """Itens salvos no período como tuplas na ordem de COLUNAS_HISTORICO
+    
+    Lê o banco principal e as partições mensais por cursor, sem materializar
+    o resultado. `inicio` e `fim` (inclusivos) são datas AAAA-MM-DD; os
+    filtros opcionais restringem por emitente, prefixo do NCM e origem.
+    """
+    where, params = [], []
+    if inicio:
+        where.append("c.data_calculo >= ?")
+        params.append(str(inicio)[:10])
+    if fim:
+        where.append("c.data_calculo < date(?, '+1 day')")
+        params.append(str(fim)[:10])
+    if cnpj_emitente:
+        where.append("c.cnpj_emitente = ?")
+        params.append(''.join(filter(str.isdigit, cnpj_emitente)))
+    if ncm_prefixo:
+        where.append("x.ncm LIKE ?")
+        params.append(''.join(filter(str.isdigit, ncm_prefixo)) + '%')
+    if origem:
+        where.append("c.origem = ?")
+        params.append(origem)
+    
+    colunas = ', '.join(CAMPOS_CALCULO.get(campo, f"x.{campo}") for _, campo, _ in COLUNAS_HISTORICO)
+    sql = f"""
+        SELECT {colunas}
+        FROM ({ITENS_DECODIFICADOS_SQL}) x
+        JOIN {{esquema}}.calculos_icms_st c ON c.id = x.calculo_id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY c.data_calculo, c.id, x.id
+    """
+    
+    posicao_observacoes = len(COLUNAS_HISTORICO) - 1
+    for row in db_manager.iter_historico(sql, params, inicio, fim):
+        # Observações são gravadas separadas por quebra de linha
+        if row[posicao_observacoes]:
+            row = row[:posicao_observacoes] + (row[posicao_observacoes].replace('\n', '; '),)
+        yield row
+
+def _valor_item(item: ResultadoCalculoItem, campo: str) -> Any:
+    """Valor do campo do item pronto para exportação"""
+    valor = getattr(item, campo)
+    if campo == 'observacoes':
+        return "; ".join(valor) if valor else ""
+    return valor
+
+@contextmanager
+def _abrir_texto(destino: Destino):
+    """Abre o destino (caminho ou stream binário) para escrita de texto"""
+    if isinstance(destino, (str, Path)):
+        with open(destino, 'w', encoding='utf-8-sig', newline='') as arquivo:
+            yield arquivo
+        return
+    
+    arquivo = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    try:
+        yield arquivo
+    finally:
+        # Libera o stream sem fechá-lo, para o chamador ler o conteúdo
+        arquivo.flush()
+        arquivo.detach()
+
+def _booleanos_texto(linha: Linha, posicoes: List[int]) -> Linha:
+    """Converte as colunas booleanas para Sim/Não"""
+    linha = list(linha)
+    for posicao in posicoes:
+        if linha[posicao] is not None:
+            linha[posicao] = "Sim" if linha[posicao] else "Não"
+    return linha
+
+def _formatos_excel(workbook):
+    """Formatos numéricos e de cabeçalho do workbook"""
+    formatos = {nome: workbook.add_format(formato) for nome, formato in FORMATOS_EXCEL.items()}
+    cabecalho = workbook.add_format({'bold': True, 'bg_color': '#D9E1F2', 'border': 1})
+    return formatos, cabecalho
+
+def _nova_aba(workbook, nome: str, colunas: List[Tuple[str, str, str]], cabecalho):
+    """Cria aba de detalhes com cabeçalho e larguras das colunas"""
+    worksheet = workbook.add_worksheet(nome)
+    for coluna, (titulo, campo, _) in enumerate(colunas):
+        worksheet.set_column(coluna, coluna, 45 if campo in ('descricao', 'observacoes') else max(12, len(titulo) + 2))
+        worksheet.write_string(0, coluna, titulo, cabecalho)
+    worksheet.freeze_panes(1, 0)
+    return worksheet
+
+def _escrever_linha(worksheet, linha: int, valores: Linha, colunas: List[Tuple[str, str, str]], formatos: dict):
+    """Escreve uma linha tipando cada célula conforme o formato da coluna"""
+    for coluna, (valor, (_, _, formato)) in enumerate(zip(valores, colunas)):
+        if valor is None:
+            continue
+        if formato == 'texto':
+            worksheet.write_string(linha, coluna, str(valor))
+        elif formato == 'booleano':
+            worksheet.write_string(linha, coluna, "Sim" if valor else "Não")
+        else:
+            worksheet.write_number(linha, coluna, valor, formatos[formato])
\ No newline at end of file
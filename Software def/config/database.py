@@ -1,36 +1,105 @@
 """
 Configuração do banco de dados SQLite
 """
+import re
 import sqlite3
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 import os
 
 # Configuração do banco de dados
+@lru_cache(maxsize=None)
 def get_db_path():
-    """Retorna o caminho do banco de dados baseado no ambiente"""
+    """Retorna o caminho do banco de dados baseado no ambiente
+    
+    Resolvido no primeiro uso: importar este módulo não importa o streamlit
+    nem lê os secrets.
+    """
     try:
         import streamlit as st
         # Tenta usar configuração do Streamlit secrets
-        if hasattr(st, 'secrets') and 'database' in st.secrets:
+        if 'database' in st.secrets:
             return st.secrets['database']['db_path']
-    except (ImportError, KeyError):
+    except Exception:
+        # Sem streamlit, sem secrets.toml (StreamlitSecretNotFoundError) ou sem a chave db_path
         pass
     
-    # Fallback para desenvolvimento local
-    return Path(__file__).parent.parent / "data" / "calculadora.db"
+    # Fallback para desenvolvimento local; cria o diretório data se não existir
+    caminho = Path(__file__).parent.parent / "data" / "calculadora.db"
+    caminho.parent.mkdir(exist_ok=True)
+    return caminho
+
+def __getattr__(nome: str):
+    """Mantém `DB_PATH` como atributo do módulo, calculado sob demanda"""
+    if nome == 'DB_PATH':
+        return get_db_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+# Valor de PRAGMA auto_vacuum para o modo INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Início de vigência atribuído às figuras cadastradas antes do versionamento
+VIGENCIA_INICIAL = '1900-01-01'
+
+# Layout de itens_calculo: 1 = original (textos e REAL), 2 = compacto
+LAYOUT_ITENS_COMPACTO = 2
+
+# Valores monetários de itens_calculo gravados em centavos (INTEGER)
+COLUNAS_CENTAVOS = (
+    'valor_total', 'valor_ipi', 'valor_frete', 'valor_frete_fora', 'base_calculo_st',
+    'valor_icms_st_debito', 'valor_icms_proprio_credito', 'valor_icms_st_recolher', 'valor_custo_final'
+)
 
-# Caminho do banco de dados
-DB_PATH = get_db_path()
+# Índices de busca textual: (tabela FTS5, tabela de conteúdo, colunas indexadas).
+# Descrições dos itens ficam em textos_itens (uma vez por texto distinto)
+BUSCA_TEXTUAL = (
+    ('figuras_fts', 'figuras_tributarias', ('ncm', 'descricao')),
+    ('textos_itens_fts', 'textos_itens', ('texto',))
+)
 
-# Criar diretório data se não existir (apenas para SQLite local)
-if isinstance(DB_PATH, Path):
-    DB_PATH.parent.mkdir(exist_ok=True)
+# MVA aplicado ao item conforme a versão da figura (itens com ST usam o MVA da alíquota)
+_MVA_DA_FIGURA = """CASE WHEN i.tipo_tributacao = 'st' THEN
+                   CASE WHEN i.aliquota_icms = 12 THEN v.mva_ajustado_12 ELSE v.mva_ajustado_4 END
+               ELSE 0.0 END"""
 
-def init_database():
-    """Inicializa o banco de dados com as tabelas necessárias"""
-    conn = sqlite3.connect(DB_PATH)
+# Itens do layout compacto decodificados para as colunas originais;
+# {esquema} é 'main' ou o alias de uma partição anexada. Alíquotas nulas
+# no item vêm da versão da figura usada no cálculo (figura_versao_id)
+ITENS_DECODIFICADOS_SQL = f"""
+    SELECT i.id, i.calculo_id, i.codigo_item, d.texto AS descricao, i.ncm,
+           i.quantidade, i.valor_unitario,
+           {', '.join(f'i.{coluna}_centavos / 100.0 AS {coluna}' for coluna in COLUNAS_CENTAVOS[:4])},
+           i.tipo_tributacao, i.aliquota_icms,
+           COALESCE(i.mva_ajustado, {_MVA_DA_FIGURA}, 0.0) AS mva_ajustado,
+           COALESCE(i.reducao_bc_st, v.reducao_bc_icms_st, 0.0) AS reducao_bc_st,
+           COALESCE(i.reducao_bc_proprio, v.reducao_bc_icms_proprio, 0.0) AS reducao_bc_proprio,
+           {', '.join(f'i.{coluna}_centavos / 100.0 AS {coluna}' for coluna in COLUNAS_CENTAVOS[4:])},
+           i.possui_figura, COALESCE(o.texto, '') AS observacoes, i.figura_versao_id
+    FROM {{esquema}}.itens_calculo i
+    JOIN main.textos_itens d ON d.id = i.descricao_id
+    LEFT JOIN main.textos_itens o ON o.id = i.observacoes_id
+    LEFT JOIN main.figuras_tributarias_versoes v ON v.id = i.figura_versao_id
+"""
+
+def init_database(conn: Optional[sqlite3.Connection] = None):
+    """Inicializa o banco de dados com as tabelas necessárias
+    
+    Sem conexão usa o banco de get_db_path(); com conexão (backend injetado no
+    DatabaseManager) cria as tabelas nela e não a fecha.
+    """
+    propria = conn is None
+    if propria:
+        conn = sqlite3.connect(get_db_path())
     cursor = conn.cursor()
     
+    # Vacuum incremental permite devolver espaço após expurgos sem VACUUM completo.
+    # Em banco novo basta o PRAGMA; em banco existente a mudança exige um VACUUM (uma vez)
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+    
     # Tabela de figuras tributárias
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS figuras_tributarias (
@@ -52,9 +121,161 @@ def init_database():
         )
     """)
     
-    # Tabela de cálculos salvos
+    # Versões das figuras com período de vigência [início, fim); fim nulo = vigente
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS figuras_tributarias_versoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ncm TEXT NOT NULL,
+            descricao TEXT NOT NULL,
+            tipo_tributacao TEXT NOT NULL CHECK (tipo_tributacao IN ('st', 'tributado')),
+            aliquota_icms_12 REAL DEFAULT 12.0,
+            aliquota_icms_4 REAL DEFAULT 4.0,
+            mva_ajustado_12 REAL DEFAULT 0.0,
+            mva_ajustado_4 REAL DEFAULT 0.0,
+            reducao_bc_icms_st REAL DEFAULT 0.0,
+            reducao_bc_icms_proprio REAL DEFAULT 0.0,
+            observacoes TEXT,
+            origem_dados TEXT DEFAULT 'manual',
+            ativo BOOLEAN DEFAULT TRUE,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            vigencia_inicio DATE NOT NULL,
+            vigencia_fim DATE
+        )
+    """)
+    _remover_unicidade_versoes(cursor)
+    
+    # Figuras anteriores ao versionamento viram a primeira versão, vigente desde sempre
+    cursor.execute("""
+        INSERT INTO figuras_tributarias_versoes (
+            ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
+            mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
+            observacoes, origem_dados, ativo, data_criacao, data_atualizacao, vigencia_inicio
+        )
+        SELECT ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
+               mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
+               observacoes, origem_dados, ativo, data_criacao, data_atualizacao, ?
+        FROM figuras_tributarias f
+        WHERE NOT EXISTS (SELECT 1 FROM figuras_tributarias_versoes v WHERE v.ncm = f.ncm)
+    """, (VIGENCIA_INICIAL,))
+    figuras_migradas = cursor.rowcount > 0
+    
+    # Textos repetidos dos itens (descrições e observações), codificados por ID
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS textos_itens (
+            id INTEGER PRIMARY KEY,
+            texto TEXT UNIQUE NOT NULL
+        )
+    """)
+    
+    # Tabelas de cálculos salvos e seus itens
+    itens_compactados = criar_tabelas_historico(cursor)
+    
+    # Itens decodificados, para consultas avulsas no banco principal
+    cursor.execute(f"CREATE VIEW IF NOT EXISTS vw_itens_calculo AS {ITENS_DECODIFICADOS_SQL.format(esquema='main')}")
+    
+    # Busca textual (FTS5) nas descrições de figuras e itens
+    criar_busca_textual(cursor)
+    
+    # Totais pré-agregados (dia/mês/total por NCM, origem e emitente),
+    # mantidos na mesma transação de save_calculo
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_calculos (
+            granularidade TEXT NOT NULL CHECK (granularidade IN ('dia', 'mes', 'total')),
+            periodo TEXT NOT NULL,
+            dimensao TEXT NOT NULL CHECK (dimensao IN ('geral', 'ncm', 'origem', 'emitente')),
+            chave TEXT NOT NULL,
+            qtd_calculos INTEGER DEFAULT 0,
+            qtd_itens INTEGER DEFAULT 0,
+            valor_produtos REAL DEFAULT 0.0,
+            icms_st_recolher REAL DEFAULT 0.0,
+            custo_final REAL DEFAULT 0.0,
+            PRIMARY KEY (granularidade, periodo, dimensao, chave)
+        ) WITHOUT ROWID
+    """)
+    
+    # Totais por item (código + NCM) por dia/mês, para os rankings de itens
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_itens (
+            granularidade TEXT NOT NULL CHECK (granularidade IN ('dia', 'mes')),
+            periodo TEXT NOT NULL,
+            codigo_item TEXT NOT NULL,
+            ncm TEXT NOT NULL,
+            descricao_id INTEGER,
+            qtd_calculos INTEGER DEFAULT 0,
+            ocorrencias INTEGER DEFAULT 0,
+            quantidade REAL DEFAULT 0.0,
+            valor_produtos_centavos INTEGER DEFAULT 0,
+            icms_st_recolher_centavos INTEGER DEFAULT 0,
+            PRIMARY KEY (granularidade, periodo, codigo_item, ncm)
+        ) WITHOUT ROWID
+    """)
+    
+    # Contadores de alteração por escopo ('calculos', 'figuras'): chave dos caches de relatórios
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS controle_alteracoes (
+            escopo TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    if figuras_migradas:
+        # Snapshots de figuras já carregados (em outros processos) deixam de valer
+        cursor.execute("""
+            INSERT INTO controle_alteracoes (escopo, versao) VALUES ('figuras', 1)
+            ON CONFLICT (escopo) DO UPDATE SET versao = versao + 1
+        """)
+    
+    # Catálogo das partições mensais de histórico (arquivos em data/historico)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS particoes_historico (
+            mes TEXT PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            id_min INTEGER,
+            id_max INTEGER,
+            qtd_calculos INTEGER DEFAULT 0,
+            comprimido BOOLEAN DEFAULT FALSE,
+            data_arquivamento TIMESTAMP,
+            layout INTEGER DEFAULT 1
+        )
+    """)
+    _garantir_coluna(cursor, 'particoes_historico', 'layout', 'INTEGER DEFAULT 1')
+    _garantir_coluna(cursor, 'particoes_historico', 'impressoes_indexadas', 'BOOLEAN DEFAULT FALSE')
+    
+    # Impressões digitais dos cálculos arquivados: o salvamento continua idempotente após o arquivamento
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS calculos_icms_st (
+        CREATE TABLE IF NOT EXISTS impressoes_arquivadas (
+            impressao_digital TEXT PRIMARY KEY,
+            calculo_id INTEGER NOT NULL,
+            mes TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_impressoes_arquivadas_mes ON impressoes_arquivadas(mes)")
+    
+    # Índices para performance
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_figuras_ncm ON figuras_tributarias(ncm)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_figuras_ativo ON figuras_tributarias(ativo)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_figuras_ativo_tipo_ncm ON figuras_tributarias(ativo, tipo_tributacao, ncm)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_figuras_versoes_vigencia ON figuras_tributarias_versoes(ncm, vigencia_inicio, id)")
+    
+    conn.commit()
+    
+    # Devolver ao sistema o espaço do layout antigo dos itens
+    if itens_compactados:
+        conn.executescript("PRAGMA incremental_vacuum;")
+    
+    if propria:
+        conn.close()
+
+def criar_tabelas_historico(cursor, esquema: str = 'main') -> bool:
+    """Cria as tabelas de cálculos e itens (e seus índices) no esquema informado
+    
+    Usada tanto para o banco principal quanto para as partições mensais
+    anexadas (ATTACH), que compartilham exatamente o mesmo layout. Itens no
+    layout original são convertidos para o compacto; retorna True nesse caso.
+    """
+    # Tabela de cálculos salvos
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {esquema}.calculos_icms_st (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             origem TEXT NOT NULL,
             chave_nfe TEXT,
@@ -68,48 +289,200 @@ def init_database():
             itens_com_st INTEGER DEFAULT 0,
             itens_sem_figura INTEGER DEFAULT 0,
             observacoes_gerais TEXT,
-            data_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            data_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            cnpj_emitente TEXT,
+            nome_emitente TEXT,
+            impressao_digital TEXT
         )
     """)
     
+    # Colunas adicionadas depois da criação original da tabela
+    _garantir_coluna(cursor, f'{esquema}.calculos_icms_st', 'cnpj_emitente', 'TEXT')
+    _garantir_coluna(cursor, f'{esquema}.calculos_icms_st', 'nome_emitente', 'TEXT')
+    _garantir_coluna(cursor, f'{esquema}.calculos_icms_st', 'impressao_digital', 'TEXT')
+    
     # Tabela de itens dos cálculos
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS itens_calculo (
+    _criar_tabela_itens(cursor, f'{esquema}.itens_calculo')
+    
+    compactados = False
+    cursor.execute(f"PRAGMA {esquema}.table_info(itens_calculo)")
+    if 'descricao' in [row[1] for row in cursor.fetchall()]:
+        _compactar_itens(cursor, esquema)
+        compactados = True
+    
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.idx_calculos_data ON calculos_icms_st(data_calculo)")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {esquema}.idx_calculos_impressao ON calculos_icms_st(impressao_digital)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.idx_calculos_chave ON calculos_icms_st(chave_nfe)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.idx_calculos_emitente ON calculos_icms_st(cnpj_emitente, data_calculo)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.idx_itens_calculo_id ON itens_calculo(calculo_id)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.idx_itens_descricao ON itens_calculo(descricao_id)")
+    
+    return compactados
+
+def criar_busca_textual(cursor) -> bool:
+    """Cria os índices FTS5 de figuras e textos dos itens, sincronizados por triggers
+    
+    Os índices usam as próprias tabelas como conteúdo (external content) e,
+    na criação, são populados com os dados existentes. Retorna False se o
+    SQLite não tiver o módulo FTS5 (a busca então usa LIKE).
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('figuras_fts', 'textos_itens_fts')")
+    existentes = {row[0] for row in cursor.fetchall()}
+    
+    try:
+        for tabela_fts, tabela, colunas in BUSCA_TEXTUAL:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {tabela_fts} USING fts5(
+                    {', '.join(colunas)},
+                    content='{tabela}', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            
+            novos = ', '.join(f'new.{coluna}' for coluna in colunas)
+            antigos = ', '.join(f'old.{coluna}' for coluna in colunas)
+            
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ai AFTER INSERT ON {tabela} BEGIN
+                    INSERT INTO {tabela_fts} (rowid, {', '.join(colunas)}) VALUES (new.id, {novos});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ad AFTER DELETE ON {tabela} BEGIN
+                    INSERT INTO {tabela_fts} ({tabela_fts}, rowid, {', '.join(colunas)}) VALUES ('delete', old.id, {antigos});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela_fts}_au AFTER UPDATE OF {', '.join(colunas)} ON {tabela} BEGIN
+                    INSERT INTO {tabela_fts} ({tabela_fts}, rowid, {', '.join(colunas)}) VALUES ('delete', old.id, {antigos});
+                    INSERT INTO {tabela_fts} (rowid, {', '.join(colunas)}) VALUES (new.id, {novos});
+                END
+            """)
+            
+            if tabela_fts not in existentes:
+                cursor.execute(f"INSERT INTO {tabela_fts} ({tabela_fts}) VALUES ('rebuild')")
+        
+        return True
+        
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        return False
+
+def _criar_tabela_itens(cursor, tabela: str):
+    """Cria a tabela de itens no layout compacto
+    
+    Descrição e observações referenciam textos_itens, valores monetários são
+    centavos e as alíquotas ficam nulas quando iguais às da versão da figura.
+    """
+    centavos = ',\n'.join(
+        f"            {coluna}_centavos INTEGER {'NOT NULL' if coluna == 'valor_total' else 'DEFAULT 0'}"
+        for coluna in COLUNAS_CENTAVOS
+    )
+    
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tabela} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             calculo_id INTEGER NOT NULL,
             codigo_item TEXT NOT NULL,
-            descricao TEXT NOT NULL,
+            descricao_id INTEGER NOT NULL,
             ncm TEXT NOT NULL,
             quantidade REAL NOT NULL,
             valor_unitario REAL NOT NULL,
-            valor_total REAL NOT NULL,
-            valor_ipi REAL DEFAULT 0.0,
-            valor_frete REAL DEFAULT 0.0,
-            valor_frete_fora REAL DEFAULT 0.0,
             tipo_tributacao TEXT,
+            figura_versao_id INTEGER,
             aliquota_icms REAL DEFAULT 0.0,
-            mva_ajustado REAL DEFAULT 0.0,
-            reducao_bc_st REAL DEFAULT 0.0,
-            reducao_bc_proprio REAL DEFAULT 0.0,
-            base_calculo_st REAL DEFAULT 0.0,
-            valor_icms_st_debito REAL DEFAULT 0.0,
-            valor_icms_proprio_credito REAL DEFAULT 0.0,
-            valor_icms_st_recolher REAL DEFAULT 0.0,
-            valor_custo_final REAL DEFAULT 0.0,
+            mva_ajustado REAL,
+            reducao_bc_st REAL,
+            reducao_bc_proprio REAL,
+{centavos},
             possui_figura BOOLEAN DEFAULT FALSE,
-            observacoes TEXT,
-            FOREIGN KEY (calculo_id) REFERENCES calculos_icms_st (id)
+            observacoes_id INTEGER,
+            FOREIGN KEY (calculo_id) REFERENCES calculos_icms_st (id),
+            FOREIGN KEY (descricao_id) REFERENCES textos_itens (id),
+            FOREIGN KEY (observacoes_id) REFERENCES textos_itens (id),
+            FOREIGN KEY (figura_versao_id) REFERENCES figuras_tributarias_versoes (id)
         )
     """)
+
+def _compactar_itens(cursor, esquema: str):
+    """Converte itens_calculo do layout original para o compacto, no mesmo esquema
     
-    # Índices para performance
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_figuras_ncm ON figuras_tributarias(ncm)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_figuras_ativo ON figuras_tributarias(ativo)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_calculos_data ON calculos_icms_st(data_calculo)")
+    A versão da figura de cada item é a vigente na data do cálculo; alíquotas
+    que diferem dela (figuras alteradas antes do versionamento) são mantidas
+    no item, as demais ficam nulas.
+    """
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO main.textos_itens (texto)
+        SELECT descricao FROM {esquema}.itens_calculo
+        UNION
+        SELECT observacoes FROM {esquema}.itens_calculo WHERE observacoes <> ''
+    """)
     
-    conn.commit()
-    conn.close()
+    # Descarta a visão antes de trocar a tabela (o RENAME valida as visões do esquema)
+    cursor.execute(f"DROP VIEW IF EXISTS {esquema}.vw_itens_calculo")
+    _criar_tabela_itens(cursor, f'{esquema}.itens_calculo_compacto')
+    
+    centavos = ', '.join(f"CAST(ROUND(i.{coluna} * 100) AS INTEGER)" for coluna in COLUNAS_CENTAVOS)
+    cursor.execute(f"""
+        INSERT INTO {esquema}.itens_calculo_compacto (
+            id, calculo_id, codigo_item, descricao_id, ncm, quantidade, valor_unitario,
+            tipo_tributacao, figura_versao_id, aliquota_icms, mva_ajustado, reducao_bc_st, reducao_bc_proprio,
+            {', '.join(f'{coluna}_centavos' for coluna in COLUNAS_CENTAVOS)},
+            possui_figura, observacoes_id
+        )
+        SELECT i.id, i.calculo_id, i.codigo_item, d.id, i.ncm, i.quantidade, i.valor_unitario,
+               i.tipo_tributacao, v.id, i.aliquota_icms,
+               CASE WHEN i.mva_ajustado = COALESCE({_MVA_DA_FIGURA}, 0.0) THEN NULL ELSE i.mva_ajustado END,
+               CASE WHEN i.reducao_bc_st = COALESCE(v.reducao_bc_icms_st, 0.0) THEN NULL ELSE i.reducao_bc_st END,
+               CASE WHEN i.reducao_bc_proprio = COALESCE(v.reducao_bc_icms_proprio, 0.0) THEN NULL ELSE i.reducao_bc_proprio END,
+               {centavos},
+               i.possui_figura, o.id
+        FROM (
+            SELECT i.*, CASE WHEN i.possui_figura THEN (
+                SELECT v.id FROM main.figuras_tributarias_versoes v
+                WHERE v.ncm = i.ncm AND v.vigencia_inicio <= substr(c.data_calculo, 1, 10)
+                ORDER BY v.vigencia_inicio DESC, v.id DESC
+                LIMIT 1
+            ) END AS versao_id
+            FROM {esquema}.itens_calculo i
+            LEFT JOIN {esquema}.calculos_icms_st c ON c.id = i.calculo_id
+        ) i
+        JOIN main.textos_itens d ON d.texto = i.descricao
+        LEFT JOIN main.textos_itens o ON o.texto = i.observacoes
+        LEFT JOIN main.figuras_tributarias_versoes v ON v.id = i.versao_id
+    """)
+    
+    cursor.execute(f"DROP TABLE {esquema}.itens_calculo")
+    cursor.execute(f"ALTER TABLE {esquema}.itens_calculo_compacto RENAME TO itens_calculo")
+
+def _remover_unicidade_versoes(cursor):
+    """Recria figuras_tributarias_versoes sem UNIQUE (ncm, vigencia_inicio)
+    
+    Versões são imutáveis (itens salvos as referenciam): regravar a figura com
+    o mesmo início cria outra versão e encerra a anterior com vigência vazia.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'figuras_tributarias_versoes'")
+    ddl = cursor.fetchone()[0]
+    if 'UNIQUE' not in ddl:
+        return
+    
+    ddl = ddl.replace('figuras_tributarias_versoes', 'figuras_tributarias_versoes_nova', 1)
+    cursor.execute(re.sub(r',\s*UNIQUE \(ncm, vigencia_inicio\)', '', ddl))
+    cursor.execute("INSERT INTO figuras_tributarias_versoes_nova SELECT * FROM figuras_tributarias_versoes")
+    cursor.execute("DROP TABLE figuras_tributarias_versoes")
+    cursor.execute("ALTER TABLE figuras_tributarias_versoes_nova RENAME TO figuras_tributarias_versoes")
+
+def _garantir_coluna(cursor, tabela: str, coluna: str, definicao: str):
+    """Adiciona coluna à tabela caso ainda não exista (migração de bancos antigos)
+    
+    `tabela` pode vir qualificada pelo esquema, como em 'main.itens_calculo'.
+    """
+    esquema, _, nome = tabela.rpartition('.')
+    cursor.execute(f"PRAGMA {esquema or 'main'}.table_info({nome})")
+    if coluna not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
 
 def get_connection():
     """Retorna conexão com o banco de dados"""
-    return sqlite3.connect(DB_PATH)
\ No newline at end of file
+    return sqlite3.connect(get_db_path())
\ No newline at end of file
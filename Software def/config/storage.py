@@ -0,0 +1,102 @@
+"""
+Backends de armazenamento do banco SQLite (arquivo, memória e snapshot)
+"""
+import shutil
+import sqlite3
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+from config.database import get_db_path
+
+class SQLiteStorage:
+    """Banco em arquivo; sem caminho usa o banco da aplicação (get_db_path)"""
+    
+    somente_leitura = False
+    
+    def __init__(self, caminho: Optional[Union[str, Path]] = None):
+        self.caminho = Path(caminho) if caminho else Path(get_db_path())
+    
+    def connect(self) -> sqlite3.Connection:
+        """Abre nova conexão com o banco"""
+        return sqlite3.connect(self.caminho)
+    
+    @property
+    def diretorio(self) -> Path:
+        """Pasta de arquivos auxiliares (partições do histórico)"""
+        return self.caminho.parent
+    
+    def close(self):
+        """Libera recursos do backend"""
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.caminho)!r})"
+
+class MemoryStorage(SQLiteStorage):
+    """SQLite em memória compartilhado entre as conexões (cache compartilhado)
+    
+    Cada instância é um banco isolado, o que permite testes paralelos e
+    benchmarks sem E/S de disco. O banco existe enquanto a conexão âncora
+    estiver aberta, ou seja, até `close()`.
+    """
+    
+    def __init__(self, nome: Optional[str] = None):
+        self.nome = nome or f"calculadora_{uuid.uuid4().hex}"
+        self.uri = f"file:{self.nome}?mode=memory&cache=shared"
+        self._ancora = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self._diretorio: Optional[Path] = None
+    
+    def connect(self) -> sqlite3.Connection:
+        """Abre nova conexão com o banco em memória"""
+        return sqlite3.connect(self.uri, uri=True)
+    
+    @property
+    def diretorio(self) -> Path:
+        """Pasta temporária para as partições (criada sob demanda)"""
+        if self._diretorio is None:
+            self._diretorio = Path(tempfile.mkdtemp(prefix=f"{self.nome}_"))
+        return self._diretorio
+    
+    def close(self):
+        """Fecha a conexão âncora, descartando o banco e a pasta temporária das partições"""
+        self._ancora.close()
+        if self._diretorio is not None:
+            shutil.rmtree(self._diretorio, ignore_errors=True)
+            self._diretorio = None
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.nome!r})"
+
+class SnapshotStorage(MemoryStorage):
+    """Cópia somente leitura, em memória, do banco no momento da criação
+    
+    A cópia é feita com a API de backup do SQLite; as conexões abertas
+    depois disso rejeitam qualquer escrita (PRAGMA query_only).
+    """
+    
+    somente_leitura = True
+    
+    def __init__(self, origem: Optional[SQLiteStorage] = None):
+        super().__init__()
+        self.origem = origem or SQLiteStorage()
+        
+        conn_origem = self.origem.connect()
+        try:
+            conn_origem.backup(self._ancora)
+        finally:
+            conn_origem.close()
+    
+    def connect(self) -> sqlite3.Connection:
+        """Abre conexão somente leitura com o snapshot"""
+        conn = super().connect()
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+    
+    @property
+    def diretorio(self) -> Path:
+        """Partições do banco de origem (lidas sem alteração)"""
+        return self.origem.diretorio
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.origem!r})"
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""
+Backup online do banco de dados e das partições do histórico (API de backup do SQLite + gzip)
+
+Cada backup é o arquivo calculadora_AAAAMMDD_HHMMSS.db.gz e, se houver meses
+arquivados, a pasta calculadora_AAAAMMDD_HHMMSS_historico com um .gz por partição.
+
+Uso pela linha de comando (a partir da pasta da aplicação):
+    python -m core.backup_service                      # cria backup
+    python -m core.backup_service --verificar ARQUIVO  # checa integridade
+    python -m core.backup_service --restaurar ARQUIVO  # restaura backup
+"""
+import argparse
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.logger import SystemLogger
+from utils.exceptions import DatabaseError
+
+class BackupService:
+    """Cria, rotaciona, verifica e restaura backups comprimidos do banco e das partições"""
+    
+    PREFIXO = "calculadora_"
+    EXTENSAO = ".db.gz"
+    SUFIXO_PARTICOES = "_historico"
+    
+    def __init__(self, db_manager, config_manager=None, diretorio: Optional[Path] = None,
+                 manter_backups: int = 10, paginas_por_passo: int = 256):
+        self.logger = SystemLogger('backup_service')
+        self.db_manager = db_manager
+        self.config_manager = config_manager
+        self.diretorio = Path(diretorio) if diretorio else Path(db_manager.storage.diretorio) / "backups"
+        self.manter_backups = manter_backups
+        self.paginas_por_passo = paginas_por_passo
+        
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def criar_backup(self) -> Path:
+        """Cria backup comprimido do banco e das partições e aplica a rotação"""
+        with self._lock:
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+            
+            nome = f"{self.PREFIXO}{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            temporario = self.diretorio / f".{nome}.db.tmp"
+            destino = self.diretorio / f"{nome}{self.EXTENSAO}"
+            pasta = self._pasta_particoes(destino)
+            
+            try:
+                # Catálogo e partições copiados sem arquivamento no meio
+                with self.db_manager.particoes_estaveis():
+                    # Cópia online em passos: sessões ativas continuam lendo e gravando
+                    conn_destino = sqlite3.connect(temporario)
+                    try:
+                        self.db_manager.backup_to(conn_destino, self.paginas_por_passo)
+                        if not self._integridade_ok(conn_destino):
+                            raise DatabaseError("Cópia do banco falhou na verificação de integridade")
+                        particoes = self._particoes(conn_destino)
+                    finally:
+                        conn_destino.close()
+                    
+                    if particoes:
+                        self._copiar_particoes(particoes, pasta)
+                
+                # Arquivo principal por último: sem ele o backup não é listado
+                with open(temporario, 'rb') as origem, gzip.open(destino, 'wb') as saida:
+                    shutil.copyfileobj(origem, saida)
+            
+            except Exception:
+                shutil.rmtree(pasta, ignore_errors=True)
+                destino.unlink(missing_ok=True)
+                raise
+            
+            finally:
+                temporario.unlink(missing_ok=True)
+            
+            self.logger.info(f"Backup criado: {destino.name}")
+            self._rotacionar()
+            return destino
+    
+    def listar_backups(self) -> List[Path]:
+        """Lista os backups existentes, do mais recente para o mais antigo"""
+        if not self.diretorio.exists():
+            return []
+        return sorted(self.diretorio.glob(f"{self.PREFIXO}*{self.EXTENSAO}"), reverse=True)
+    
+    def ultimo_backup(self) -> Optional[datetime]:
+        """Data de criação do backup mais recente"""
+        backups = self.listar_backups()
+        return datetime.fromtimestamp(backups[0].stat().st_mtime) if backups else None
+    
+    def verificar_backup(self, caminho: Path) -> bool:
+        """Descompacta o backup em área temporária e executa integrity_check no banco e em cada partição
+        
+        Falha também se faltar o arquivo de algum mês do catálogo.
+        """
+        caminho = Path(caminho)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                conn = sqlite3.connect(self._descompactar(caminho, Path(tmp)))
+                try:
+                    if not self._integridade_ok(conn):
+                        return False
+                    particoes = self._particoes(conn)
+                finally:
+                    conn.close()
+                
+                self._extrair_particoes(caminho, particoes, Path(tmp))
+                return True
+        
+        except Exception as e:
+            self.logger.error(f"Erro ao verificar backup {caminho}: {e}")
+            return False
+    
+    def restaurar_backup(self, caminho: Path) -> bool:
+        """Restaura o banco e as partições a partir de um backup verificado
+        
+        Tudo é descompactado e verificado antes de tocar no banco em uso.
+        Backups sem a pasta de partições (formato anterior) restauram só o
+        banco; os arquivos de partição existentes são mantidos.
+        """
+        caminho = Path(caminho)
+        
+        with self._lock, tempfile.TemporaryDirectory() as tmp:
+            conn_origem = sqlite3.connect(self._descompactar(caminho, Path(tmp)))
+            try:
+                if not self._integridade_ok(conn_origem):
+                    raise DatabaseError(f"Backup corrompido: {caminho.name}")
+                
+                particoes = self._particoes(conn_origem)
+                if particoes and not self._pasta_particoes(caminho).exists():
+                    self.logger.warning(f"Backup {caminho.name} sem partições; mantidos os arquivos atuais do histórico")
+                    arquivos = {}
+                else:
+                    arquivos = self._extrair_particoes(caminho, particoes, Path(tmp))
+                
+                with self.db_manager.particoes_estaveis():
+                    self.db_manager.restore_from(conn_origem, self.paginas_por_passo)
+                    for mes, arquivo in arquivos.items():
+                        conn_particao = sqlite3.connect(arquivo)
+                        try:
+                            self.db_manager.restore_particao_from(mes, conn_particao, self.paginas_por_passo)
+                        finally:
+                            conn_particao.close()
+                    self.db_manager.sincronizar_particoes()
+            finally:
+                conn_origem.close()
+        
+        if not self.db_manager.integrity_check():
+            raise DatabaseError("Banco restaurado falhou na verificação de integridade")
+        
+        self.logger.info(f"Backup restaurado: {caminho.name}")
+        return True
+    
+    def backup_pendente(self) -> bool:
+        """Indica se o backup automático está habilitado e vencido"""
+        config = self._config()
+        if not config.backup_automatico:
+            return False
+        
+        ultimo = self.ultimo_backup()
+        return ultimo is None or datetime.now() - ultimo >= timedelta(days=config.intervalo_backup_dias)
+    
+    def start_scheduler(self, verificacao_minutos: float = 60.0):
+        """Verifica periodicamente se há backup automático a fazer"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._parar.clear()
+        
+        def _loop():
+            while not self._parar.is_set():
+                try:
+                    if self.backup_pendente():
+                        self.criar_backup()
+                except Exception as e:
+                    self.logger.error(f"Erro no backup automático: {e}")
+                self._parar.wait(verificacao_minutos * 60)
+        
+        self._thread = threading.Thread(target=_loop, name='backup-scheduler', daemon=True)
+        self._thread.start()
+    
+    def stop_scheduler(self, timeout: Optional[float] = 5.0):
+        """Interrompe o agendamento de backups"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def _rotacionar(self):
+        """Remove backups excedentes (e suas partições), mantendo os mais recentes"""
+        for antigo in self.listar_backups()[self.manter_backups:]:
+            try:
+                shutil.rmtree(self._pasta_particoes(antigo), ignore_errors=True)
+                antigo.unlink()
+                self.logger.info(f"Backup removido na rotação: {antigo.name}")
+            except OSError as e:
+                self.logger.warning(f"Não foi possível remover backup {antigo.name}: {e}")
+    
+    def _descompactar(self, caminho: Path, diretorio: Path) -> Path:
+        """Descompacta backup .db.gz para o diretório informado"""
+        destino = diretorio / caminho.name.replace(self.EXTENSAO, ".db")
+        with gzip.open(caminho, 'rb') as origem, open(destino, 'wb') as saida:
+            shutil.copyfileobj(origem, saida)
+        return destino
+    
+    def _pasta_particoes(self, caminho: Path) -> Path:
+        """Pasta com as partições de um backup (calculadora_..._historico)"""
+        return caminho.with_name(caminho.name.replace(self.EXTENSAO, self.SUFIXO_PARTICOES))
+    
+    def _particoes(self, conn: sqlite3.Connection) -> Dict[str, str]:
+        """Catálogo de partições de uma cópia do banco: mês -> nome do arquivo"""
+        return dict(conn.execute("SELECT mes, arquivo FROM particoes_historico ORDER BY mes").fetchall())
+    
+    def _copiar_particoes(self, particoes: Dict[str, str], pasta: Path):
+        """Copia e verifica cada partição do catálogo, gravando <arquivo>.gz na pasta do backup"""
+        pasta.mkdir()
+        with tempfile.TemporaryDirectory() as tmp:
+            for mes, arquivo in particoes.items():
+                temporario = Path(tmp) / arquivo
+                conn_destino = sqlite3.connect(temporario)
+                try:
+                    self.db_manager.backup_particao_to(mes, conn_destino, self.paginas_por_passo)
+                    if not self._integridade_ok(conn_destino):
+                        raise DatabaseError(f"Cópia da partição {mes} falhou na verificação de integridade")
+                finally:
+                    conn_destino.close()
+                
+                with open(temporario, 'rb') as origem, gzip.open(pasta / f"{arquivo}.gz", 'wb') as saida:
+                    shutil.copyfileobj(origem, saida)
+                temporario.unlink()
+    
+    def _extrair_particoes(self, caminho: Path, particoes: Dict[str, str], diretorio: Path) -> Dict[str, Path]:
+        """Descompacta e verifica as partições do backup; mês -> arquivo descompactado"""
+        pasta = self._pasta_particoes(caminho)
+        arquivos = {}
+        for mes, arquivo in particoes.items():
+            comprimido = pasta / f"{arquivo}.gz"
+            if not comprimido.exists():
+                raise DatabaseError(f"Backup {caminho.name} sem a partição {mes}")
+            
+            destino = diretorio / arquivo
+            with gzip.open(comprimido, 'rb') as origem, open(destino, 'wb') as saida:
+                shutil.copyfileobj(origem, saida)
+            
+            conn = sqlite3.connect(destino)
+            try:
+                if not self._integridade_ok(conn):
+                    raise DatabaseError(f"Partição {mes} corrompida no backup {caminho.name}")
+            finally:
+                conn.close()
+            arquivos[mes] = destino
+        return arquivos
+    
+    def _integridade_ok(self, conn: sqlite3.Connection) -> bool:
+        """Executa PRAGMA integrity_check na conexão"""
+        return conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    
+    def _config(self):
+        """Configuração do usuário padrão"""
+        if self.config_manager:
+            return self.config_manager.load_config()
+        return self.db_manager.get_user_config()
+
+def main():
+    """Ponto de entrada da linha de comando"""
+    parser = argparse.ArgumentParser(description="Backup do banco da calculadora")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--verificar', metavar='ARQUIVO', help="Verifica a integridade de um backup")
+    grupo.add_argument('--restaurar', metavar='ARQUIVO', help="Restaura o banco a partir de um backup")
+    args = parser.parse_args()
+    
+    from core.database_manager import DatabaseManager
+    
+    service = BackupService(DatabaseManager())
+    
+    if args.verificar:
+        ok = service.verificar_backup(Path(args.verificar))
+        print("Backup íntegro" if ok else "Backup corrompido ou ilegível")
+        raise SystemExit(0 if ok else 1)
+    
+    if args.restaurar:
+        service.restaurar_backup(Path(args.restaurar))
+        print("Backup restaurado e verificado")
+        return
+    
+    print(f"Backup criado: {service.criar_backup()}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
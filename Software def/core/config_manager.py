@@ -9,8 +9,8 @@ from utils.logger import SystemLogger
 class ConfigManager:
     """Gerenciador centralizado de configurações"""
     
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager: Optional[DatabaseManager] = None):
+        self.db_manager = db_manager or DatabaseManager()
         self.logger = SystemLogger('config_manager')
         self._current_config: Optional[UserConfig] = None
         self._cache_enabled = True
@@ -0,0 +1,47 @@
+"""
+Métricas do dashboard, compartilhadas entre sessões e renovadas só quando o banco muda
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logger import SystemLogger
+
+class DashboardService:
+    """Cache das estatísticas do banco, invalidado pelos contadores de alteração
+    
+    Cada gravação de cálculos ou figuras incrementa um contador em
+    controle_alteracoes (na mesma transação). A cada exibição o serviço lê
+    apenas esses contadores e só refaz as consultas quando algum mudou, de
+    modo que vários usuários abrindo o dashboard compartilham os mesmos números.
+    """
+    
+    def __init__(self, db_manager):
+        self.logger = SystemLogger('dashboard_service')
+        self.db_manager = db_manager
+        
+        self._versao: Optional[Tuple] = None
+        self._metricas: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def versao(self) -> Tuple:
+        """Contadores de alteração atuais (escopo, versão), em ordem"""
+        return tuple(sorted(self.db_manager.get_versoes_dados().items()))
+    
+    def get_metricas(self) -> Dict[str, Any]:
+        """Estatísticas do banco, recalculadas apenas após alterações"""
+        versao = self.versao()
+        
+        with self._lock:
+            if versao != self._versao or not self._metricas:
+                metricas = self.db_manager.get_estatisticas()
+                # Falha na consulta não fica em cache
+                if metricas:
+                    self._versao, self._metricas = versao, metricas
+                return metricas
+            
+            return self._metricas
+    
+    def invalidar(self):
+        """Descarta as métricas em cache (ex.: após restaurar um backup)"""
+        with self._lock:
+            self._versao, self._metricas = None, {}
\ No newline at end of file
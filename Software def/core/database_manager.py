@@ -1,12 +1,22 @@
 """
 Gerenciador do banco de dados SQLite
 """
+import gzip
+import shutil
 import sqlite3
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
 from pathlib import Path
 
-from config.database import get_connection, init_database
+from config.database import (
+    COLUNAS_CENTAVOS, ITENS_DECODIFICADOS_SQL, LAYOUT_ITENS_COMPACTO, init_database, criar_tabelas_historico
+)
+from config.storage import SQLiteStorage
+from core.figura_index import FiguraVigenciaIndex
 from models.figura_tributaria import FiguraTributaria
 from models.resultado_calculo import ResultadoCalculoGeral, ResultadoCalculoItem
 from models.user_config import UserConfig
@@ -16,85 +26,275 @@ from utils.exceptions import DatabaseError
 class DatabaseManager:
     """Gerenciador do banco de dados"""
     
-    def __init__(self):
+    # Rollups: expressão do período por granularidade
+    ROLLUP_GRANULARIDADES = {
+        'dia': "substr(c.data_calculo, 1, 10)",
+        'mes': "substr(c.data_calculo, 1, 7)",
+        'total': "''"
+    }
+    
+    # Rollups: (expressão da chave, origem dos dados, métricas) por dimensão;
+    # {esquema} é 'main' ou o alias de uma partição anexada
+    _ROLLUP_METRICAS_CALCULO = (
+        "COUNT(*)", "SUM(c.total_itens)", "SUM(c.total_valor_produtos)",
+        "SUM(c.total_icms_st_recolher)", "SUM(c.total_custo_final)"
+    )
+    ROLLUP_DIMENSOES = {
+        'geral': ("''", "{esquema}.calculos_icms_st c", _ROLLUP_METRICAS_CALCULO),
+        'origem': ("c.origem", "{esquema}.calculos_icms_st c", _ROLLUP_METRICAS_CALCULO),
+        'emitente': ("COALESCE(c.cnpj_emitente, '')", "{esquema}.calculos_icms_st c", _ROLLUP_METRICAS_CALCULO),
+        'ncm': ("i.ncm", "{esquema}.itens_calculo i JOIN {esquema}.calculos_icms_st c ON c.id = i.calculo_id", (
+            "COUNT(DISTINCT c.id)", "COUNT(*)", "SUM(i.valor_total_centavos) / 100.0",
+            "SUM(i.valor_icms_st_recolher_centavos) / 100.0", "SUM(i.valor_custo_final_centavos * i.quantidade) / 100.0"
+        ))
+    }
+    ROLLUP_METRICAS = ('qtd_calculos', 'qtd_itens', 'valor_produtos', 'icms_st_recolher', 'custo_final')
+    
+    # Colunas dos cabeçalhos de cálculos salvos (buscar_calculos)
+    CALCULO_COLUNAS = ('id', 'data_calculo', 'origem', 'chave_nfe', 'cnpj_emitente', 'nome_emitente',
+                       'total_itens', 'total_valor_produtos', 'total_icms_st_recolher', 'total_custo_final',
+                       'itens_com_st', 'itens_sem_figura')
+    
+    # Colunas dos itens de um cálculo salvo (get_itens_calculo)
+    ITEM_COLUNAS = ('id', 'codigo_item', 'descricao', 'ncm', 'quantidade', 'valor_unitario', 'valor_total',
+                    'valor_ipi', 'valor_frete', 'valor_frete_fora', 'tipo_tributacao', 'aliquota_icms',
+                    'mva_ajustado', 'reducao_bc_st', 'reducao_bc_proprio', 'base_calculo_st',
+                    'valor_icms_st_debito', 'valor_icms_proprio_credito', 'valor_icms_st_recolher',
+                    'valor_custo_final', 'possui_figura', 'observacoes', 'figura_versao_id')
+    
+    # Colunas lidas de figuras_tributarias, na ordem esperada por _row_to_figura
+    FIGURA_COLUNAS = """ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
+                       mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
+                       observacoes, origem_dados, ativo, data_criacao, data_atualizacao"""
+    
+    # Colunas lidas de figuras_tributarias_versoes (FIGURA_COLUNAS + vigência)
+    VERSAO_COLUNAS = FIGURA_COLUNAS + ", vigencia_inicio, vigencia_fim, id"
+    
+    def __init__(self, storage: Optional[SQLiteStorage] = None):
         self.logger = SystemLogger('database_manager')
-        # Inicializar banco se necessário
-        init_database()
+        # Backend de armazenamento: arquivo (padrão), memória ou snapshot
+        self.storage = storage or SQLiteStorage()
+        
+        # Serializa compressão/descompressão dos arquivos de partição
+        self._lock_particoes = threading.Lock()
+        # Impede arquivar, comprimir ou remover partições durante backup e restauração
+        self._lock_arquivamento = threading.RLock()
+        
+        # Cópias descomprimidas das partições .gz para leitura: mês -> (assinatura do .gz, caminho)
+        self._copias_leitura: Dict[str, Tuple[Tuple[int, int], Path]] = {}
+        self._cache_particoes: Optional[tempfile.TemporaryDirectory] = None
+        
+        # Inicializar banco se necessário (snapshots são somente leitura)
+        if not self.storage.somente_leitura:
+            self.init_database()
+            self._garantir_rollups()
+            self._indexar_impressoes_arquivadas()
+            self._compactar_particoes()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Nova conexão com o banco do backend configurado"""
+        return self.storage.connect()
+    
+    def _garantir_rollups(self):
+        """Constrói os rollups em bancos que já tinham cálculos antes deles existirem"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT EXISTS (SELECT 1 FROM calculos_icms_st) OR EXISTS (SELECT 1 FROM rollup_calculos),
+                       EXISTS (SELECT 1 FROM rollup_calculos) AND EXISTS (SELECT 1 FROM rollup_itens)
+            """)
+            possui_calculos, possui_rollups = cursor.fetchone()
+            conn.close()
+            
+            if possui_calculos and not possui_rollups:
+                self.rebuild_rollups()
+                
+        except Exception as e:
+            self.logger.error(f"Erro ao verificar rollups: {e}")
+    
+    def _indexar_impressoes_arquivadas(self):
+        """Registra as impressões digitais de partições arquivadas antes de impressoes_arquivadas existir"""
+        try:
+            conn = self._connect()
+            meses = [row[0] for row in conn.execute(
+                "SELECT mes FROM particoes_historico WHERE NOT COALESCE(impressoes_indexadas, 0)"
+            ).fetchall()]
+            conn.close()
+        except Exception as e:
+            self.logger.error(f"Erro ao listar partições sem impressões digitais indexadas: {e}")
+            return
+        
+        for mes in meses:
+            try:
+                conn = self._connect()
+                try:
+                    with self._particao_anexada(conn, mes) as esquema:
+                        cursor = conn.cursor()
+                        cursor.execute(f"""
+                            INSERT OR REPLACE INTO main.impressoes_arquivadas (impressao_digital, calculo_id, mes)
+                            SELECT impressao_digital, id, ? FROM {esquema}.calculos_icms_st
+                            WHERE impressao_digital IS NOT NULL
+                        """, (mes,))
+                        cursor.execute("UPDATE particoes_historico SET impressoes_indexadas = 1 WHERE mes = ?", (mes,))
+                        conn.commit()
+                finally:
+                    conn.close()
+                
+            except Exception as e:
+                self.logger.error(f"Erro ao indexar impressões digitais da partição {mes}: {e}")
+    
+    def _compactar_particoes(self):
+        """Converte para o layout compacto os itens das partições arquivadas no layout original"""
+        try:
+            conn = self._connect()
+            particoes = conn.execute(
+                "SELECT mes FROM particoes_historico WHERE COALESCE(layout, 1) < ?", (LAYOUT_ITENS_COMPACTO,)
+            ).fetchall()
+            conn.close()
+            
+            for (mes,) in particoes:
+                comprimido = self._particao(mes)['comprimido']
+                
+                conn = self._connect()
+                try:
+                    with self._particao_anexada(conn, mes, escrita=True) as esquema:
+                        criar_tabelas_historico(conn.cursor(), esquema)
+                        self._atualizar_catalogo(conn.cursor(), mes)
+                        conn.commit()
+                        conn.execute(f"VACUUM {esquema}")
+                finally:
+                    conn.close()
+                
+                if comprimido:
+                    self.comprimir_particao(mes)
+                self.logger.info(f"Itens da partição {mes} convertidos para o layout compacto")
+                
+        except Exception as e:
+            self.logger.error(f"Erro ao compactar partições: {e}")
     
     def init_database(self):
         """Inicializa o banco de dados (método wrapper)"""
         try:
-            init_database()
+            conn = self._connect()
+            try:
+                init_database(conn)
+            finally:
+                conn.close()
             self.logger.info("Banco de dados inicializado com sucesso")
         except Exception as e:
             self.logger.error(f"Erro na inicialização do banco: {e}")
             raise
     
-    def save_figura_tributaria(self, figura: FiguraTributaria) -> bool:
-        """Salva figura tributária no banco"""
+    def save_figura_tributaria(self, figura: FiguraTributaria, vigencia_inicio: Optional[date] = None) -> bool:
+        """Salva figura tributária no banco como nova versão vigente a partir de `vigencia_inicio`
+        
+        A versão anterior tem a vigência encerrada no início da nova (nada é
+        sobrescrito, pois itens salvos referenciam a versão usada). Início
+        retroativo, anterior a versões já cadastradas, vale só até a versão
+        seguinte. Sem data, a vigência começa hoje.
+        """
+        inicio = str(vigencia_inicio or figura.vigencia_inicio or date.today())[:10]
+        valores = (
+            figura.ncm, figura.descricao, figura.tipo_tributacao,
+            figura.aliquota_icms_12, figura.aliquota_icms_4,
+            figura.mva_ajustado_12, figura.mva_ajustado_4,
+            figura.reducao_bc_icms_st, figura.reducao_bc_icms_proprio,
+            figura.observacoes, figura.origem_dados, figura.ativo,
+            datetime.now()
+        )
+        
         try:
-            conn = get_connection()
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute("""
-                INSERT OR REPLACE INTO figuras_tributarias (
-                    ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
-                    mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
-                    observacoes, origem_dados, ativo, data_atualizacao
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                figura.ncm, figura.descricao, figura.tipo_tributacao,
-                figura.aliquota_icms_12, figura.aliquota_icms_4,
-                figura.mva_ajustado_12, figura.mva_ajustado_4,
-                figura.reducao_bc_icms_st, figura.reducao_bc_icms_proprio,
-                figura.observacoes, figura.origem_dados, figura.ativo,
-                datetime.now()
-            ))
-            
-            conn.commit()
-            conn.close()
+            try:
+                # Versão seguinte à nova (quando o início informado é retroativo)
+                cursor.execute("""
+                    SELECT MIN(vigencia_inicio) FROM figuras_tributarias_versoes
+                    WHERE ncm = ? AND vigencia_inicio > ?
+                """, (figura.ncm, inicio))
+                vigencia_fim = cursor.fetchone()[0]
+                
+                # Encerrar a versão que estava vigente no início da nova
+                # (com o mesmo início, ela fica com vigência vazia)
+                cursor.execute("""
+                    UPDATE figuras_tributarias_versoes SET vigencia_fim = ?
+                    WHERE ncm = ? AND vigencia_inicio <= ?
+                      AND (vigencia_fim IS NULL OR vigencia_fim > ?)
+                """, (inicio, figura.ncm, inicio, inicio))
+                
+                cursor.execute("""
+                    INSERT INTO figuras_tributarias_versoes (
+                        ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
+                        mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
+                        observacoes, origem_dados, ativo, data_atualizacao, vigencia_inicio, vigencia_fim
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, valores + (inicio, vigencia_fim))
+                
+                # figuras_tributarias guarda a versão mais recente (listagens e filtros).
+                # UPSERT mantém o ID e dispara o trigger de UPDATE da busca textual
+                if vigencia_fim is None:
+                    cursor.execute("""
+                        INSERT INTO figuras_tributarias (
+                            ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
+                            mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
+                            observacoes, origem_dados, ativo, data_atualizacao
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (ncm) DO UPDATE SET
+                            descricao = excluded.descricao,
+                            tipo_tributacao = excluded.tipo_tributacao,
+                            aliquota_icms_12 = excluded.aliquota_icms_12,
+                            aliquota_icms_4 = excluded.aliquota_icms_4,
+                            mva_ajustado_12 = excluded.mva_ajustado_12,
+                            mva_ajustado_4 = excluded.mva_ajustado_4,
+                            reducao_bc_icms_st = excluded.reducao_bc_icms_st,
+                            reducao_bc_icms_proprio = excluded.reducao_bc_icms_proprio,
+                            observacoes = excluded.observacoes,
+                            origem_dados = excluded.origem_dados,
+                            ativo = excluded.ativo,
+                            data_atualizacao = excluded.data_atualizacao
+                    """, valores)
+                
+                self._registrar_alteracao(cursor, 'figuras')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
             
-            self.logger.info(f"Figura tributária salva: NCM {figura.ncm}")
+            self.logger.info(f"Figura tributária salva: NCM {figura.ncm}, vigente a partir de {inicio}")
             return True
             
         except Exception as e:
             self.logger.error(f"Erro ao salvar figura tributária: {e}")
             raise DatabaseError(f"Falha ao salvar figura: {e}")
     
-    def get_figura_tributaria(self, ncm: str) -> Optional[FiguraTributaria]:
-        """Busca figura tributária por NCM"""
+    def get_figura_tributaria(self, ncm: str, data: Optional[date] = None) -> Optional[FiguraTributaria]:
+        """Busca a figura tributária do NCM vigente na data (padrão: hoje)"""
+        data = str(data or date.today())[:10]
+        
         try:
-            conn = get_connection()
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
-                       mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
-                       observacoes, origem_dados, ativo, data_criacao, data_atualizacao
-                FROM figuras_tributarias 
-                WHERE ncm = ? AND ativo = 1
-            """, (ncm,))
+            # Índice (ncm, vigencia_inicio, id): a versão vigente é a última iniciada até a data
+            cursor.execute(f"""
+                SELECT {self.VERSAO_COLUNAS}
+                FROM figuras_tributarias_versoes
+                WHERE ncm = ? AND vigencia_inicio <= ?
+                ORDER BY vigencia_inicio DESC, id DESC
+                LIMIT 1
+            """, (ncm, data))
             
             row = cursor.fetchone()
             conn.close()
             
             if row:
-                return FiguraTributaria(
-                    ncm=row[0],
-                    descricao=row[1],
-                    tipo_tributacao=row[2],
-                    aliquota_icms_12=row[3],
-                    aliquota_icms_4=row[4],
-                    mva_ajustado_12=row[5],
-                    mva_ajustado_4=row[6],
-                    reducao_bc_icms_st=row[7],
-                    reducao_bc_icms_proprio=row[8],
-                    observacoes=row[9],
-                    origem_dados=row[10],
-                    ativo=bool(row[11]),
-                    data_criacao=datetime.fromisoformat(row[12]) if row[12] else None,
-                    data_atualizacao=datetime.fromisoformat(row[13]) if row[13] else None
-                )
+                figura = self._row_to_figura(row)
+                if figura.ativo and figura.vigente_em(date.fromisoformat(data)):
+                    return figura
             
             return None
             
@@ -102,16 +302,256 @@ class DatabaseManager:
             self.logger.error(f"Erro ao buscar figura tributária: {e}")
             return None
     
+    def get_versoes_figura(self, ncm: str) -> List[FiguraTributaria]:
+        """Histórico de versões da figura do NCM, em ordem de vigência"""
+        return self.get_indice_vigencias([ncm]).versoes(ncm)
+    
+    def get_indice_vigencias(self, ncms: Optional[Iterable[str]] = None) -> FiguraVigenciaIndex:
+        """Carrega as versões das figuras (todas ou dos NCMs informados) em um índice em memória"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            if ncms is None:
+                cursor.execute(f"SELECT {self.VERSAO_COLUNAS} FROM figuras_tributarias_versoes")
+                rows = cursor.fetchall()
+            else:
+                # Lotes abaixo do limite de parâmetros do SQLite
+                ncms, rows = sorted(set(ncms)), []
+                for inicio in range(0, len(ncms), 500):
+                    lote = ncms[inicio:inicio + 500]
+                    cursor.execute(f"""
+                        SELECT {self.VERSAO_COLUNAS}
+                        FROM figuras_tributarias_versoes
+                        WHERE ncm IN ({', '.join('?' * len(lote))})
+                    """, lote)
+                    rows.extend(cursor.fetchall())
+            
+            conn.close()
+            
+            return FiguraVigenciaIndex(self._row_to_figura(row) for row in rows)
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao carregar vigências das figuras: {e}")
+            raise DatabaseError(f"Falha ao carregar vigências: {e}")
+    
+    def get_versao_figuras(self) -> int:
+        """Identificador crescente da última alteração nas figuras (maior ID de versão)"""
+        try:
+            conn = self._connect()
+            versao = conn.execute("SELECT COALESCE(MAX(id), 0) FROM figuras_tributarias_versoes").fetchone()[0]
+            conn.close()
+            return versao
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar versão das figuras: {e}")
+            return 0
+    
+    def get_versao_dados(self, escopo: str = 'calculos') -> int:
+        """Contador de alterações do escopo ('calculos' ou 'figuras'), usado como chave de cache"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT versao FROM controle_alteracoes WHERE escopo = ?", (escopo,)).fetchone()
+            conn.close()
+            return row[0] if row else 0
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar versão dos dados ({escopo}): {e}")
+            return 0
+    
+    def get_versoes_dados(self) -> Dict[str, int]:
+        """Contadores de alteração de todos os escopos, em uma consulta"""
+        try:
+            conn = self._connect()
+            rows = conn.execute("SELECT escopo, versao FROM controle_alteracoes").fetchall()
+            conn.close()
+            return dict(rows)
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar versões dos dados: {e}")
+            return {}
+    
+    def aquecer(self) -> int:
+        """Lê o esquema, os contadores e o catálogo de partições (aquecimento da inicialização)
+        
+        Cada operação abre sua própria conexão, então não há conexão a manter
+        aberta: o que fica pronto é o cache de páginas do sistema para o
+        esquema e as tabelas lidas por toda página. Retorna o número de
+        objetos do esquema.
+        """
+        try:
+            conn = self._connect()
+            objetos = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]
+            conn.execute("SELECT escopo, versao FROM controle_alteracoes").fetchall()
+            conn.execute("SELECT mes FROM particoes_historico").fetchall()
+            conn.close()
+            return objetos
+            
+        except Exception as e:
+            self.logger.error(f"Erro no aquecimento do banco: {e}")
+            raise DatabaseError(f"Falha no aquecimento do banco: {e}")
+    
+    def get_textos_itens(self, ids: Sequence[int]) -> Dict[int, str]:
+        """Textos de textos_itens (descrições e observações dos itens) pelos IDs"""
+        ids = [id_texto for id_texto in ids if id_texto is not None]
+        if not ids:
+            return {}
+        
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                f"SELECT id, texto FROM textos_itens WHERE id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()
+            conn.close()
+            return dict(rows)
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar textos dos itens: {e}")
+            return {}
+    
+    def _registrar_alteracao(self, cursor: sqlite3.Cursor, escopo: str):
+        """Incrementa o contador de alterações do escopo (na transação de quem chama)"""
+        cursor.execute("""
+            INSERT INTO controle_alteracoes (escopo, versao) VALUES (?, 1)
+            ON CONFLICT (escopo) DO UPDATE SET versao = versao + 1
+        """, (escopo,))
+    
+    def buscar(self, texto: str, limit: int = 20) -> Dict[str, List]:
+        """Busca textual ranqueada em figuras e itens salvos
+        
+        Retorna {'figuras': [FiguraTributaria], 'itens': [dict]}, cada lista
+        com até `limit` resultados, dos mais relevantes para os menos.
+        """
+        return {
+            'figuras': self.buscar_figuras(texto, limit),
+            'itens': self.buscar_itens(texto, limit)
+        }
+    
+    def buscar_figuras(self, texto: str, limit: int = 20) -> List[FiguraTributaria]:
+        """Figuras cuja descrição (ou NCM) contém os termos, por relevância (BM25)"""
+        consulta = self._consulta_fts(texto)
+        if not consulta:
+            return []
+        
+        colunas = ', '.join(f"f.{coluna.strip()}" for coluna in self.FIGURA_COLUNAS.split(','))
+        
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            if self._possui_fts(cursor):
+                cursor.execute(f"""
+                    SELECT {colunas}
+                    FROM figuras_fts
+                    JOIN figuras_tributarias f ON f.id = figuras_fts.rowid
+                    WHERE figuras_fts MATCH ?
+                    ORDER BY figuras_fts.rank
+                    LIMIT ?
+                """, (consulta, limit))
+            else:
+                termos = self._termos_busca(texto)
+                cursor.execute(f"""
+                    SELECT {colunas} FROM figuras_tributarias f
+                    WHERE {' AND '.join("(f.descricao LIKE ? OR f.ncm LIKE ?)" for _ in termos)}
+                    ORDER BY f.ncm
+                    LIMIT ?
+                """, [padrao for termo in termos for padrao in (f"%{termo}%", f"{termo}%")] + [limit])
+            
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [self._row_to_figura(row) for row in rows]
+            
+        except Exception as e:
+            self.logger.error(f"Erro na busca de figuras: {e}")
+            return []
+    
+    def buscar_itens(self, texto: str, limit: int = 20, candidatos: int = 200) -> List[Dict[str, Any]]:
+        """Itens salvos (banco principal e partições) cuja descrição contém os termos
+        
+        A busca textual roda sobre as descrições distintas (textos_itens); os
+        itens das `candidatos` descrições mais relevantes são lidos pelo índice
+        de descricao_id e ordenados por relevância e, depois, do mais recente.
+        """
+        consulta = self._consulta_fts(texto)
+        if not consulta:
+            return []
+        
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            if self._possui_fts(cursor):
+                cursor.execute("""
+                    SELECT rowid, texto FROM textos_itens_fts
+                    WHERE textos_itens_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                """, (consulta, candidatos))
+            else:
+                termos = self._termos_busca(texto)
+                cursor.execute(f"""
+                    SELECT id, texto FROM textos_itens
+                    WHERE {' AND '.join("texto LIKE ?" for _ in termos)}
+                    LIMIT ?
+                """, [f"%{termo}%" for termo in termos] + [candidatos])
+            
+            descricoes = {row[0]: (posicao, row[1]) for posicao, row in enumerate(cursor.fetchall())}
+            conn.close()
+            
+        except Exception as e:
+            self.logger.error(f"Erro na busca de itens: {e}")
+            return []
+        
+        if not descricoes:
+            return []
+        
+        # Em cada esquema, os `limit` melhores: relevância da descrição, depois o mais recente
+        colunas = ('calculo_id', 'data_calculo', 'codigo_item', 'descricao_id', 'ncm',
+                   'quantidade', 'valor_total', 'valor_icms_st_recolher', 'valor_custo_final')
+        itens = list(self.iter_historico(f"""
+            WITH relevancia (descricao_id, posicao) AS (VALUES {', '.join(['(?, ?)'] * len(descricoes))})
+            SELECT i.calculo_id, c.data_calculo, i.codigo_item, i.descricao_id, i.ncm, i.quantidade,
+                   i.valor_total_centavos / 100.0, i.valor_icms_st_recolher_centavos / 100.0,
+                   i.valor_custo_final_centavos / 100.0
+            FROM relevancia r
+            JOIN {{esquema}}.itens_calculo i ON i.descricao_id = r.descricao_id
+            JOIN {{esquema}}.calculos_icms_st c ON c.id = i.calculo_id
+            ORDER BY r.posicao, i.id DESC
+            LIMIT ?
+        """, [valor for descricao_id, (posicao, _) in descricoes.items() for valor in (descricao_id, posicao)] + [limit]))
+        
+        itens.sort(key=lambda row: (descricoes[row[3]][0], -row[0]))
+        
+        resultado = []
+        for row in itens[:limit]:
+            item = dict(zip(colunas, row))
+            item['descricao'] = descricoes[item.pop('descricao_id')][1]
+            resultado.append(item)
+        
+        return resultado
+    
+    def _possui_fts(self, cursor: sqlite3.Cursor) -> bool:
+        """Indica se os índices FTS5 existem (SQLite compilado com FTS5)"""
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('figuras_fts', 'textos_itens_fts')")
+        return cursor.fetchone()[0] == 2
+    
+    def _termos_busca(self, texto: str) -> List[str]:
+        """Termos da busca, sem aspas e operadores"""
+        return ''.join(c if c.isalnum() else ' ' for c in texto or '').split()
+    
+    def _consulta_fts(self, texto: str) -> str:
+        """Consulta FTS5 em que cada termo é buscado como prefixo (todos obrigatórios)"""
+        return ' '.join(f'"{termo}"*' for termo in self._termos_busca(texto))
+    
     def get_all_figuras_tributarias(self) -> Dict[str, FiguraTributaria]:
         """Retorna todas as figuras tributárias ativas"""
         try:
-            conn = get_connection()
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT ncm, descricao, tipo_tributacao, aliquota_icms_12, aliquota_icms_4,
-                       mva_ajustado_12, mva_ajustado_4, reducao_bc_icms_st, reducao_bc_icms_proprio,
-                       observacoes, origem_dados, ativo, data_criacao, data_atualizacao
+            cursor.execute(f"""
+                SELECT {self.FIGURA_COLUNAS}
                 FROM figuras_tributarias 
                 WHERE ativo = 1
                 ORDER BY ncm
@@ -122,22 +562,7 @@ class DatabaseManager:
             
             figuras = {}
             for row in rows:
-                figura = FiguraTributaria(
-                    ncm=row[0],
-                    descricao=row[1],
-                    tipo_tributacao=row[2],
-                    aliquota_icms_12=row[3],
-                    aliquota_icms_4=row[4],
-                    mva_ajustado_12=row[5],
-                    mva_ajustado_4=row[6],
-                    reducao_bc_icms_st=row[7],
-                    reducao_bc_icms_proprio=row[8],
-                    observacoes=row[9],
-                    origem_dados=row[10],
-                    ativo=bool(row[11]),
-                    data_criacao=datetime.fromisoformat(row[12]) if row[12] else None,
-                    data_atualizacao=datetime.fromisoformat(row[13]) if row[13] else None
-                )
+                figura = self._row_to_figura(row)
                 figuras[figura.ncm] = figura
             
             return figuras
@@ -146,94 +571,355 @@ class DatabaseManager:
             self.logger.error(f"Erro ao buscar figuras tributárias: {e}")
             return {}
     
-    def save_calculo(self, resultado: ResultadoCalculoGeral) -> int:
-        """Salva resultado de cálculo no banco"""
+    def list_figuras(self, after_ncm: Optional[str] = None, limit: int = 50,
+                     filters: Optional[Dict[str, Any]] = None) -> List[FiguraTributaria]:
+        """Lista figuras tributárias paginadas por NCM (paginação keyset)
+        
+        Retorna até `limit` figuras com NCM maior que `after_ncm`, aplicando
+        os filtros no próprio SQL. Para a próxima página, passe o NCM da
+        última figura retornada como `after_ncm`.
+        """
         try:
-            conn = get_connection()
+            where, params = self._build_figuras_where(filters)
+            
+            if after_ncm:
+                where.append("ncm > ?")
+                params.append(after_ncm)
+            
+            where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+            
+            conn = self._connect()
             cursor = conn.cursor()
             
-            # Salvar cálculo principal
-            cursor.execute("""
-                INSERT INTO calculos_icms_st (
-                    origem, chave_nfe, total_itens, total_valor_produtos,
-                    total_icms_st_debito, total_icms_proprio_credito, total_icms_st_recolher,
-                    total_custo_final, total_frete_por_fora, itens_com_st, itens_sem_figura,
-                    observacoes_gerais, data_calculo
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                resultado.origem, resultado.chave_nfe, resultado.total_itens,
-                resultado.total_valor_produtos, resultado.total_icms_st_debito,
-                resultado.total_icms_proprio_credito, resultado.total_icms_st,
-                resultado.total_custo_final, resultado.total_frete_por_fora,
-                resultado.itens_com_st, resultado.itens_sem_figura,
-                '\n'.join(resultado.observacoes_gerais), resultado.data_calculo
-            ))
+            cursor.execute(f"""
+                SELECT {self.FIGURA_COLUNAS}
+                FROM figuras_tributarias
+                {where_sql}
+                ORDER BY ncm
+                LIMIT ?
+            """, (*params, limit))
+            
+            rows = cursor.fetchall()
+            conn.close()
             
-            calculo_id = cursor.lastrowid
+            return [self._row_to_figura(row) for row in rows]
             
-            # Salvar itens do cálculo
-            for item in resultado.detalhes_itens:
-                cursor.execute("""
-                    INSERT INTO itens_calculo (
-                        calculo_id, codigo_item, descricao, ncm, quantidade, valor_unitario,
-                        valor_total, valor_ipi, valor_frete, valor_frete_fora, tipo_tributacao,
-                        aliquota_icms, mva_ajustado, reducao_bc_st, reducao_bc_proprio,
-                        base_calculo_st, valor_icms_st_debito, valor_icms_proprio_credito,
-                        valor_icms_st_recolher, valor_custo_final, possui_figura, observacoes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    calculo_id, item.codigo_item, item.descricao, item.ncm,
-                    item.quantidade, item.valor_unitario, item.valor_total,
-                    item.valor_ipi, item.valor_frete, item.valor_frete_fora,
-                    item.tipo_tributacao, item.aliquota_icms, item.mva_ajustado,
-                    item.reducao_bc_st, item.reducao_bc_proprio, item.base_calculo_st,
-                    item.valor_icms_st_debito, item.valor_icms_proprio_credito,
-                    item.valor_icms_st_recolher, item.valor_custo_final,
-                    item.possui_figura, '\n'.join(item.observacoes)
-                ))
+        except Exception as e:
+            self.logger.error(f"Erro ao listar figuras tributárias: {e}")
+            return []
+    
+    def count_figuras(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Conta figuras tributárias com os mesmos filtros de list_figuras"""
+        try:
+            where, params = self._build_figuras_where(filters)
+            where_sql = f"WHERE {' AND '.join(where)}" if where else ""
             
-            conn.commit()
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute(f"SELECT COUNT(*) FROM figuras_tributarias {where_sql}", params)
+            total = cursor.fetchone()[0]
             conn.close()
             
-            self.logger.info(f"Cálculo salvo com ID: {calculo_id}")
-            return calculo_id
+            return total
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao contar figuras tributárias: {e}")
+            return 0
+    
+    def _build_figuras_where(self, filters: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+        """Monta cláusulas WHERE para os filtros de figuras
+        
+        Filtros aceitos: 'ncm_prefix' (str), 'tipo_tributacao' ('st' ou
+        'tributado') e 'ativo' (bool). Valores None são ignorados.
+        """
+        where = []
+        params = []
+        filters = filters or {}
+        
+        ncm_prefix = filters.get('ncm_prefix')
+        if ncm_prefix:
+            # Intervalo [prefixo, prefixo seguinte) aproveita o índice de NCM,
+            # ao contrário de LIKE 'prefixo%'
+            ncm_prefix = str(ncm_prefix).strip()
+            where.append("ncm >= ? AND ncm < ?")
+            params.extend([ncm_prefix, ncm_prefix[:-1] + chr(ord(ncm_prefix[-1]) + 1)])
+        
+        if filters.get('tipo_tributacao'):
+            where.append("tipo_tributacao = ?")
+            params.append(filters['tipo_tributacao'])
+        
+        if filters.get('ativo') is not None:
+            where.append("ativo = ?")
+            params.append(1 if filters['ativo'] else 0)
+        
+        return where, params
+    
+    def _row_to_figura(self, row: Tuple) -> FiguraTributaria:
+        """Converte linha de figuras_tributarias (FIGURA_COLUNAS) ou de versões (VERSAO_COLUNAS) em FiguraTributaria"""
+        if len(row) > 14:
+            vigencia = {
+                'vigencia_inicio': date.fromisoformat(row[14]),
+                'vigencia_fim': date.fromisoformat(row[15]) if row[15] else None,
+                'versao_id': row[16]
+            }
+        else:
+            vigencia = {}
+        
+        return FiguraTributaria(
+            ncm=row[0],
+            descricao=row[1],
+            tipo_tributacao=row[2],
+            aliquota_icms_12=row[3],
+            aliquota_icms_4=row[4],
+            mva_ajustado_12=row[5],
+            mva_ajustado_4=row[6],
+            reducao_bc_icms_st=row[7],
+            reducao_bc_icms_proprio=row[8],
+            observacoes=row[9],
+            origem_dados=row[10],
+            ativo=bool(row[11]),
+            data_criacao=datetime.fromisoformat(row[12]) if row[12] else None,
+            data_atualizacao=datetime.fromisoformat(row[13]) if row[13] else None,
+            **vigencia
+        )
+    
+    def save_calculo(self, resultado: ResultadoCalculoGeral) -> int:
+        """Salva resultado de cálculo no banco"""
+        return self.save_calculos([resultado])[0]
+    
+    def save_calculos(self, resultados: List[ResultadoCalculoGeral]) -> List[int]:
+        """Salva vários resultados de cálculo em uma única transação
+        
+        Resultados com impressão digital já gravada (no banco principal ou em
+        uma partição) não são inseridos de novo: retornam o ID existente.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                ids, novos = [], []
+                for resultado in resultados:
+                    calculo_id = self._calculo_por_impressao(cursor, resultado.impressao_digital)
+                    if calculo_id is None:
+                        calculo_id = self._inserir_calculo(cursor, resultado)
+                        novos.append(calculo_id)
+                    ids.append(calculo_id)
+                
+                self._aplicar_rollups(cursor, novos, 1)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            
+            self.logger.info(f"Cálculos salvos com IDs: {ids}")
+            return ids
             
         except Exception as e:
             self.logger.error(f"Erro ao salvar cálculo: {e}")
             raise DatabaseError(f"Falha ao salvar cálculo: {e}")
     
-    def get_estatisticas(self) -> Dict[str, any]:
-        """Retorna estatísticas do banco"""
+    def buscar_calculos(self, chave_nfe: Optional[str] = None, inicio: Optional[str] = None,
+                        fim: Optional[str] = None, cnpj_emitente: Optional[str] = None,
+                        limite: int = 50, deslocamento: int = 0) -> List[Dict[str, Any]]:
+        """Cabeçalhos dos cálculos salvos (banco principal e partições), do mais recente ao mais antigo
+        
+        `chave_nfe` aceita a chave completa (busca pelo índice) ou parte dela;
+        `inicio` e `fim` (inclusivos) são datas AAAA-MM-DD.
+        """
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
+            where, params = [], []
+            
+            chave = ''.join(filter(str.isdigit, chave_nfe or ''))
+            if len(chave) == 44:
+                where.append("chave_nfe = ?")
+                params.append(chave)
+            elif chave:
+                where.append("chave_nfe LIKE ?")
+                params.append(f"%{chave}%")
             
-            # Contar figuras
-            cursor.execute("SELECT COUNT(*) FROM figuras_tributarias WHERE ativo = 1")
-            total_figuras = cursor.fetchone()[0]
+            if inicio:
+                where.append("data_calculo >= ?")
+                params.append(str(inicio)[:10])
+            if fim:
+                where.append("data_calculo < date(?, '+1 day')")
+                params.append(str(fim)[:10])
+            
+            cnpj = ''.join(filter(str.isdigit, cnpj_emitente or ''))
+            if cnpj:
+                where.append("cnpj_emitente = ?")
+                params.append(cnpj)
+            
+            # Cada esquema devolve no máximo a página pedida; a mescla ordena o conjunto
+            sql = f"""
+                SELECT {', '.join(self.CALCULO_COLUNAS)} FROM {{esquema}}.calculos_icms_st
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY data_calculo DESC, id DESC
+                LIMIT ?
+            """
+            rows = list(self.iter_historico(sql, params + [limite + deslocamento], inicio, fim))
+            rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
             
-            cursor.execute("SELECT COUNT(*) FROM figuras_tributarias WHERE ativo = 1 AND tipo_tributacao = 'st'")
-            figuras_st = cursor.fetchone()[0]
+            return [dict(zip(self.CALCULO_COLUNAS, row)) for row in rows[deslocamento:deslocamento + limite]]
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar cálculos salvos: {e}")
+            return []
+    
+    def get_itens_calculo(self, calculo_id: int, data_calculo: Any, limite: int = 100,
+                          deslocamento: int = 0) -> List[Dict[str, Any]]:
+        """Página de itens de um cálculo salvo, pelo índice de calculo_id
+        
+        `data_calculo` indica a partição onde o cálculo pode estar; só ela e o
+        banco principal são consultados.
+        """
+        try:
+            sql = f"""
+                SELECT {', '.join(f'x.{coluna}' for coluna in self.ITEM_COLUNAS)}
+                FROM ({ITENS_DECODIFICADOS_SQL}) x
+                WHERE x.calculo_id = ?
+                ORDER BY x.id
+                LIMIT ? OFFSET ?
+            """
+            mes = str(data_calculo)[:7]
+            rows = self.iter_historico(sql, (calculo_id, limite, deslocamento), mes, mes)
+            return [dict(zip(self.ITEM_COLUNAS, row)) for row in rows]
             
-            # Contar cálculos
-            cursor.execute("SELECT COUNT(*) FROM calculos_icms_st")
-            total_calculos = cursor.fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar itens do cálculo {calculo_id}: {e}")
+            return []
+    
+    def _calculo_por_impressao(self, cursor: sqlite3.Cursor, impressao: Optional[str]) -> Optional[int]:
+        """ID do cálculo já salvo com a impressão digital (banco principal ou registro dos arquivados)"""
+        if not impressao:
+            return None
+        cursor.execute("""
+            SELECT id FROM calculos_icms_st WHERE impressao_digital = ?
+            UNION ALL
+            SELECT calculo_id FROM impressoes_arquivadas WHERE impressao_digital = ?
+        """, (impressao, impressao))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _inserir_calculo(self, cursor: sqlite3.Cursor, resultado: ResultadoCalculoGeral) -> int:
+        """Insere cálculo e itens usando o cursor informado (sem commit)"""
+        # Salvar cálculo principal
+        cursor.execute("""
+            INSERT INTO calculos_icms_st (
+                origem, chave_nfe, total_itens, total_valor_produtos,
+                total_icms_st_debito, total_icms_proprio_credito, total_icms_st_recolher,
+                total_custo_final, total_frete_por_fora, itens_com_st, itens_sem_figura,
+                observacoes_gerais, data_calculo, cnpj_emitente, nome_emitente, impressao_digital
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            resultado.origem, resultado.chave_nfe, resultado.total_itens,
+            resultado.total_valor_produtos, resultado.total_icms_st_debito,
+            resultado.total_icms_proprio_credito, resultado.total_icms_st,
+            resultado.total_custo_final, resultado.total_frete_por_fora,
+            resultado.itens_com_st, resultado.itens_sem_figura,
+            '\n'.join(resultado.observacoes_gerais), resultado.data_calculo,
+            resultado.cnpj_emitente, resultado.nome_emitente, resultado.impressao_digital
+        ))
+        
+        calculo_id = cursor.lastrowid
+        
+        # Salvar itens do cálculo (layout compacto: textos por ID, valores em centavos)
+        # Descrição vazia também vira texto (descricao_id é obrigatório); observações vazias ficam nulas
+        observacoes = ['\n'.join(item.observacoes) for item in resultado.detalhes_itens]
+        textos = self._ids_textos(
+            cursor, [item.descricao or '' for item in resultado.detalhes_itens] + list(filter(None, observacoes))
+        )
+        
+        cursor.executemany(f"""
+            INSERT INTO itens_calculo (
+                calculo_id, codigo_item, descricao_id, ncm, quantidade, valor_unitario,
+                tipo_tributacao, figura_versao_id, aliquota_icms, mva_ajustado,
+                reducao_bc_st, reducao_bc_proprio,
+                {', '.join(f'{coluna}_centavos' for coluna in COLUNAS_CENTAVOS)},
+                possui_figura, observacoes_id
+            ) VALUES ({', '.join('?' * (14 + len(COLUNAS_CENTAVOS)))})
+        """, [(
+            calculo_id, item.codigo_item, textos[item.descricao or ''], item.ncm,
+            item.quantidade, item.valor_unitario, item.tipo_tributacao,
+            item.figura_versao_id, item.aliquota_icms,
+            # Alíquotas da figura (ou zeradas, sem figura) ficam nulas: derivadas de figura_versao_id
+            *(None if item.figura_versao_id or not valor else valor
+              for valor in (item.mva_ajustado, item.reducao_bc_st, item.reducao_bc_proprio)),
+            *(self._centavos(getattr(item, coluna)) for coluna in COLUNAS_CENTAVOS),
+            item.possui_figura, textos[observacao] if observacao else None
+        ) for item, observacao in zip(resultado.detalhes_itens, observacoes)])
+        
+        return calculo_id
+    
+    def _ids_textos(self, cursor: sqlite3.Cursor, textos: List[str]) -> Dict[str, int]:
+        """IDs de textos_itens para os textos informados, cadastrando os novos"""
+        textos = sorted(set(textos))
+        cursor.executemany("INSERT OR IGNORE INTO textos_itens (texto) VALUES (?)", [(texto,) for texto in textos])
+        
+        ids = {}
+        for inicio in range(0, len(textos), 500):
+            lote = textos[inicio:inicio + 500]
+            cursor.execute(f"SELECT texto, id FROM textos_itens WHERE texto IN ({', '.join('?' * len(lote))})", lote)
+            ids.update(cursor.fetchall())
+        
+        return ids
+    
+    @staticmethod
+    def _centavos(valor: float) -> int:
+        """Converte valor monetário em centavos inteiros (arredondamento comercial)"""
+        return int((Decimal(str(valor or 0)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    
+    def get_estatisticas(self) -> Dict[str, Any]:
+        """Retorna estatísticas do banco (figuras ativas, totais dos rollups e últimos cálculos)"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
             
-            # Últimos cálculos
+            # Contagens e totais em uma única consulta; os totais de cálculos
+            # vêm do rollup geral, que inclui as partições arquivadas
             cursor.execute("""
-                SELECT data_calculo, total_icms_st_recolher 
-                FROM calculos_icms_st 
-                ORDER BY data_calculo DESC 
+                SELECT
+                    (SELECT COUNT(*) FROM figuras_tributarias WHERE ativo = 1),
+                    (SELECT COUNT(*) FROM figuras_tributarias WHERE ativo = 1 AND tipo_tributacao = 'st'),
+                    COALESCE(r.qtd_calculos, 0), COALESCE(r.qtd_itens, 0),
+                    COALESCE(r.valor_produtos, 0.0), COALESCE(r.icms_st_recolher, 0.0)
+                FROM (SELECT 1) LEFT JOIN rollup_calculos r
+                  ON r.granularidade = 'total' AND r.periodo = '' AND r.dimensao = 'geral' AND r.chave = ''
+            """)
+            total_figuras, figuras_st, total_calculos, total_itens, total_valor_produtos, total_icms_st = cursor.fetchone()
+            
+            # Últimos cálculos: em geral todos no banco principal
+            cursor.execute("""
+                SELECT data_calculo, total_icms_st_recolher FROM calculos_icms_st
+                ORDER BY data_calculo DESC, id DESC
                 LIMIT 5
             """)
             ultimos_calculos = cursor.fetchall()
+            cursor.execute("SELECT MAX(mes) FROM particoes_historico")
+            ultimo_mes_arquivado = cursor.fetchone()[0]
             
             conn.close()
             
+            # As partições só são lidas se o principal não tiver 5 cálculos
+            # posteriores ao último mês arquivado
+            if ultimo_mes_arquivado and (
+                    len(ultimos_calculos) < 5
+                    or str(ultimos_calculos[-1][0]) < self._limites_mes(ultimo_mes_arquivado)[1]):
+                ultimos_calculos = [
+                    (calculo['data_calculo'], calculo['total_icms_st_recolher'])
+                    for calculo in self.buscar_calculos(limite=5)
+                ]
+            
             return {
                 'total_figuras': total_figuras,
                 'figuras_st': figuras_st,
                 'total_calculos': total_calculos,
+                'total_itens': total_itens,
+                'total_valor_produtos': total_valor_produtos,
+                'total_icms_st': total_icms_st,
                 'ultimos_calculos': ultimos_calculos
             }
             
@@ -241,10 +927,733 @@ class DatabaseManager:
             self.logger.error(f"Erro ao buscar estatísticas: {e}")
             return {}
     
+    def get_rollup(self, granularidade: str = 'total', periodo: str = '',
+                   dimensao: str = 'geral', chave: str = '') -> Dict[str, Any]:
+        """Retorna uma linha de rollup_calculos (consulta pela chave primária)"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT qtd_calculos, qtd_itens, valor_produtos, icms_st_recolher, custo_final
+                FROM rollup_calculos
+                WHERE granularidade = ? AND periodo = ? AND dimensao = ? AND chave = ?
+            """, (granularidade, periodo, dimensao, chave))
+            
+            row = cursor.fetchone() or (0, 0, 0.0, 0.0, 0.0)
+            conn.close()
+            
+            return dict(zip(self.ROLLUP_METRICAS, row))
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar rollup: {e}")
+            return dict.fromkeys(self.ROLLUP_METRICAS, 0)
+    
+    def get_rollups(self, granularidade: str, dimensao: str, inicio: Optional[str] = None,
+                    fim: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Retorna linhas de rollup de uma granularidade/dimensão, opcionalmente por período
+        
+        `inicio` e `fim` seguem o formato do período ('AAAA-MM-DD' para dia,
+        'AAAA-MM' para mês) e são inclusivos.
+        """
+        try:
+            where = ["granularidade = ?", "dimensao = ?"]
+            params: List[Any] = [granularidade, dimensao]
+            
+            if inicio:
+                where.append("periodo >= ?")
+                params.append(inicio)
+            if fim:
+                where.append("periodo <= ?")
+                params.append(fim)
+            
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute(f"""
+                SELECT periodo, chave, {', '.join(self.ROLLUP_METRICAS)}
+                FROM rollup_calculos
+                WHERE {' AND '.join(where)}
+                ORDER BY periodo, chave
+            """, params)
+            
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [dict(zip(('periodo', 'chave') + self.ROLLUP_METRICAS, row)) for row in rows]
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar rollups: {e}")
+            return []
+    
+    def get_rollup_itens(self, granularidade: str, inicio: str, fim: str) -> List[Tuple]:
+        """Totais por item (código, NCM) no período, somados de rollup_itens
+        
+        Linhas: (codigo_item, ncm, descricao_id, qtd_calculos, ocorrencias,
+        quantidade, valor_produtos_centavos, icms_st_recolher_centavos).
+        """
+        try:
+            conn = self._connect()
+            rows = conn.execute("""
+                SELECT codigo_item, ncm, MAX(descricao_id), SUM(qtd_calculos), SUM(ocorrencias),
+                       SUM(quantidade), SUM(valor_produtos_centavos), SUM(icms_st_recolher_centavos)
+                FROM rollup_itens
+                WHERE granularidade = ? AND periodo BETWEEN ? AND ?
+                GROUP BY codigo_item, ncm
+            """, (granularidade, inicio, fim)).fetchall()
+            conn.close()
+            return rows
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar rollups de itens: {e}")
+            return []
+    
+    def rebuild_rollups(self) -> bool:
+        """Recalcula rollup_calculos e rollup_itens do zero a partir dos cálculos salvos"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute("DELETE FROM rollup_calculos")
+                cursor.execute("DELETE FROM rollup_itens")
+                self._aplicar_rollups(cursor, None, 1)
+                conn.commit()
+                
+                # Meses arquivados continuam compondo os totais (ATTACH exige
+                # estar fora de transação, então cada partição é somada à parte)
+                for particao in self.listar_particoes():
+                    with self._particao_anexada(conn, particao['mes']) as esquema:
+                        self._aplicar_rollups(cursor, None, 1, esquema)
+                        conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            
+            self.logger.info("Rollups reconstruídos")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao reconstruir rollups: {e}")
+            raise DatabaseError(f"Falha ao reconstruir rollups: {e}")
+    
+    def _aplicar_rollups(self, cursor: sqlite3.Cursor, ids: Optional[List[int]], sinal: int,
+                         esquema: str = 'main'):
+        """Soma (sinal=1) ou subtrai (sinal=-1) os cálculos informados dos rollups
+        
+        Com `ids` None considera todos os cálculos do esquema (usado na reconstrução
+        e no descarte de partições). Executa no cursor recebido, dentro da
+        transação de quem chama.
+        """
+        if ids is not None and not ids:
+            return
+        
+        if ids is None:
+            filtro, params_filtro = "1 = 1", []
+        else:
+            filtro, params_filtro = f"c.id IN ({', '.join('?' * len(ids))})", list(ids)
+        
+        for granularidade, periodo_sql in self.ROLLUP_GRANULARIDADES.items():
+            for dimensao, (chave_sql, origem_sql, metricas_sql) in self.ROLLUP_DIMENSOES.items():
+                metricas = ', '.join(f"? * {metrica}" for metrica in metricas_sql)
+                cursor.execute(f"""
+                    INSERT INTO rollup_calculos (
+                        granularidade, periodo, dimensao, chave,
+                        qtd_calculos, qtd_itens, valor_produtos, icms_st_recolher, custo_final
+                    )
+                    SELECT ?, {periodo_sql}, ?, {chave_sql}, {metricas}
+                    FROM {origem_sql.format(esquema=esquema)}
+                    WHERE {filtro}
+                    GROUP BY 2, 4
+                    ON CONFLICT (granularidade, periodo, dimensao, chave) DO UPDATE SET
+                        qtd_calculos = qtd_calculos + excluded.qtd_calculos,
+                        qtd_itens = qtd_itens + excluded.qtd_itens,
+                        valor_produtos = valor_produtos + excluded.valor_produtos,
+                        icms_st_recolher = icms_st_recolher + excluded.icms_st_recolher,
+                        custo_final = custo_final + excluded.custo_final
+                """, [granularidade, dimensao] + [sinal] * len(metricas_sql) + params_filtro)
+        
+        for granularidade in ('dia', 'mes'):
+            cursor.execute(f"""
+                INSERT INTO rollup_itens (
+                    granularidade, periodo, codigo_item, ncm, descricao_id, qtd_calculos, ocorrencias,
+                    quantidade, valor_produtos_centavos, icms_st_recolher_centavos
+                )
+                SELECT ?, {self.ROLLUP_GRANULARIDADES[granularidade]}, i.codigo_item, COALESCE(i.ncm, ''),
+                       MAX(i.descricao_id), ? * COUNT(DISTINCT c.id), ? * COUNT(*), ? * SUM(i.quantidade),
+                       ? * SUM(i.valor_total_centavos), ? * SUM(i.valor_icms_st_recolher_centavos)
+                FROM {esquema}.itens_calculo i JOIN {esquema}.calculos_icms_st c ON c.id = i.calculo_id
+                WHERE {filtro}
+                GROUP BY 2, 3, 4
+                ON CONFLICT (granularidade, periodo, codigo_item, ncm) DO UPDATE SET
+                    descricao_id = COALESCE(descricao_id, excluded.descricao_id),
+                    qtd_calculos = qtd_calculos + excluded.qtd_calculos,
+                    ocorrencias = ocorrencias + excluded.ocorrencias,
+                    quantidade = quantidade + excluded.quantidade,
+                    valor_produtos_centavos = valor_produtos_centavos + excluded.valor_produtos_centavos,
+                    icms_st_recolher_centavos = icms_st_recolher_centavos + excluded.icms_st_recolher_centavos
+            """, [granularidade] + [sinal] * 5 + params_filtro)
+        
+        if sinal < 0:
+            cursor.execute("DELETE FROM rollup_calculos WHERE qtd_calculos <= 0")
+            cursor.execute("DELETE FROM rollup_itens WHERE ocorrencias <= 0")
+        
+        # Toda alteração de cálculos passa pelos rollups
+        self._registrar_alteracao(cursor, 'calculos')
+    
+    def delete_calculos_anteriores(self, data_limite: datetime, limite: int = 500,
+                                   mes: Optional[str] = None) -> int:
+        """Remove até `limite` cálculos anteriores à data limite, com seus itens
+        
+        Cada chamada é uma transação curta; chame repetidamente até retornar 0
+        para expurgar tudo sem bloquear os demais escritores por muito tempo.
+        Com `mes` (AAAA-MM) o expurgo é feito na partição arquivada desse mês.
+        """
+        # Arquivamento, compressão e remoção de partições não correm durante um backup
+        with self._lock_arquivamento:
+            try:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    with self._particao_anexada(conn, mes, escrita=True) as esquema:
+                        cursor.execute(f"""
+                            SELECT id FROM {esquema}.calculos_icms_st
+                            WHERE data_calculo < ?
+                            ORDER BY data_calculo
+                            LIMIT ?
+                        """, (data_limite, limite))
+                        ids = [row[0] for row in cursor.fetchall()]
+                        
+                        if ids:
+                            marcadores = ', '.join('?' * len(ids))
+                            self._aplicar_rollups(cursor, ids, -1, esquema)
+                            if mes:
+                                cursor.execute(f"""
+                                    DELETE FROM main.impressoes_arquivadas WHERE mes = ? AND calculo_id IN ({marcadores})
+                                """, [mes] + ids)
+                            cursor.execute(f"DELETE FROM {esquema}.itens_calculo WHERE calculo_id IN ({marcadores})", ids)
+                            cursor.execute(f"DELETE FROM {esquema}.calculos_icms_st WHERE id IN ({marcadores})", ids)
+                            
+                            if mes:
+                                self._atualizar_catalogo(cursor, mes)
+                        
+                        conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.close()
+                
+                return len(ids)
+                
+            except Exception as e:
+                self.logger.error(f"Erro ao remover cálculos antigos: {e}")
+                raise DatabaseError(f"Falha ao remover cálculos antigos: {e}")
+    
+    def incremental_vacuum(self, paginas: Optional[int] = None) -> int:
+        """Executa PRAGMA incremental_vacuum e retorna o número de páginas liberadas"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute("PRAGMA freelist_count")
+            livres_antes = cursor.fetchone()[0]
+            
+            # executescript percorre todos os passos do PRAGMA (cada passo libera uma página)
+            if paginas:
+                conn.executescript(f"PRAGMA incremental_vacuum({int(paginas)});")
+            else:
+                conn.executescript("PRAGMA incremental_vacuum;")
+            
+            cursor.execute("PRAGMA freelist_count")
+            livres_depois = cursor.fetchone()[0]
+            conn.close()
+            
+            return livres_antes - livres_depois
+            
+        except Exception as e:
+            self.logger.error(f"Erro no vacuum incremental: {e}")
+            return 0
+    
+    def listar_particoes(self, inicio: Optional[Any] = None, fim: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """Partições mensais arquivadas, em ordem cronológica
+        
+        `inicio` e `fim` (date, datetime ou texto AAAA-MM[-DD]) limitam os meses retornados.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            where, params = [], []
+            if inicio:
+                where.append("mes >= ?")
+                params.append(str(inicio)[:7])
+            if fim:
+                where.append("mes <= ?")
+                params.append(str(fim)[:7])
+            
+            cursor.execute(f"""
+                SELECT mes, arquivo, id_min, id_max, qtd_calculos, comprimido, data_arquivamento
+                FROM particoes_historico
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY mes
+            """, params)
+            
+            colunas = ('mes', 'arquivo', 'id_min', 'id_max', 'qtd_calculos', 'comprimido', 'data_arquivamento')
+            particoes = [dict(zip(colunas, row)) for row in cursor.fetchall()]
+            conn.close()
+            
+            for particao in particoes:
+                particao['comprimido'] = bool(particao['comprimido'])
+            
+            return particoes
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao listar partições: {e}")
+            return []
+    
+    def arquivar_mes(self, mes: str) -> int:
+        """Move os cálculos do mês (AAAA-MM) do banco principal para a partição mensal
+        
+        O mês corrente nunca é arquivado. Retorna o número de cálculos movidos.
+        """
+        # Arquivamento, compressão e remoção de partições não correm durante um backup
+        with self._lock_arquivamento:
+            if mes >= datetime.now().strftime('%Y-%m'):
+                raise DatabaseError(f"O mês corrente ({mes}) permanece no banco principal")
+            
+            inicio, fim = self._limites_mes(mes)
+            
+            try:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    with self._particao_anexada(conn, mes, criar=True) as esquema:
+                        criar_tabelas_historico(cursor, esquema)
+                        
+                        periodo = "SELECT id FROM main.calculos_icms_st WHERE data_calculo >= ? AND data_calculo < ?"
+                        for tabela, filtro in (('itens_calculo', 'calculo_id'), ('calculos_icms_st', 'id')):
+                            colunas = ', '.join(self._colunas(cursor, tabela))
+                            cursor.execute(f"""
+                                INSERT INTO {esquema}.{tabela} ({colunas})
+                                SELECT {colunas} FROM main.{tabela} WHERE {filtro} IN ({periodo})
+                            """, (inicio, fim))
+                            if tabela == 'calculos_icms_st':
+                                movidos = cursor.rowcount
+                        
+                        # Impressões digitais ficam registradas no banco principal (salvamento idempotente)
+                        cursor.execute(f"""
+                            INSERT OR REPLACE INTO main.impressoes_arquivadas (impressao_digital, calculo_id, mes)
+                            SELECT impressao_digital, id, ? FROM main.calculos_icms_st
+                            WHERE impressao_digital IS NOT NULL AND id IN ({periodo})
+                        """, (mes, inicio, fim))
+                        
+                        # Rollups não mudam: os totais continuam valendo para o mês arquivado
+                        cursor.execute(f"DELETE FROM main.itens_calculo WHERE calculo_id IN ({periodo})", (inicio, fim))
+                        cursor.execute(f"DELETE FROM main.calculos_icms_st WHERE id IN ({periodo})", (inicio, fim))
+                        
+                        self._atualizar_catalogo(cursor, mes)
+                        cursor.execute("UPDATE particoes_historico SET impressoes_indexadas = 1 WHERE mes = ?", (mes,))
+                        conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.close()
+                
+                if movidos:
+                    self.logger.info(f"Mês {mes} arquivado: {movidos} cálculos")
+                return movidos
+                
+            except DatabaseError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Erro ao arquivar mês {mes}: {e}")
+                raise DatabaseError(f"Falha ao arquivar mês {mes}: {e}")
+    
+    def arquivar_meses_anteriores(self) -> Dict[str, int]:
+        """Arquiva todos os meses anteriores ao corrente que ainda estão no banco principal"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT substr(data_calculo, 1, 7) FROM calculos_icms_st
+                WHERE data_calculo < ?
+                ORDER BY 1
+            """, (datetime.now().strftime('%Y-%m-01'),))
+            meses = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar meses a arquivar: {e}")
+            return {}
+        
+        return {mes: self.arquivar_mes(mes) for mes in meses}
+    
+    def comprimir_particao(self, mes: str) -> bool:
+        """Comprime (gzip) o arquivo da partição; leituras usam uma cópia temporária descomprimida"""
+        # Arquivamento, compressão e remoção de partições não correm durante um backup
+        with self._lock_arquivamento:
+            try:
+                with self._lock_particoes:
+                    particao = self._particao(mes)
+                    if particao is None or particao['comprimido']:
+                        return False
+                    
+                    caminho = self._caminho_particao(particao['arquivo'])
+                    with open(caminho, 'rb') as origem, gzip.open(f"{caminho}.gz", 'wb') as saida:
+                        shutil.copyfileobj(origem, saida)
+                    
+                    self._marcar_comprimido(mes, True)
+                    caminho.unlink()
+                
+                self.logger.info(f"Partição {mes} comprimida")
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"Erro ao comprimir partição {mes}: {e}")
+                raise DatabaseError(f"Falha ao comprimir partição {mes}: {e}")
+    
+    def remover_particao(self, mes: str) -> int:
+        """Descarta a partição inteira do mês, subtraindo-a dos rollups"""
+        # Arquivamento, compressão e remoção de partições não correm durante um backup
+        with self._lock_arquivamento:
+            try:
+                particao = self._particao(mes)
+                if particao is None:
+                    return 0
+                
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    with self._particao_anexada(conn, mes) as esquema:
+                        cursor.execute(f"SELECT COUNT(*) FROM {esquema}.calculos_icms_st")
+                        removidos = cursor.fetchone()[0]
+                        
+                        self._aplicar_rollups(cursor, None, -1, esquema)
+                        cursor.execute("DELETE FROM impressoes_arquivadas WHERE mes = ?", (mes,))
+                        cursor.execute("DELETE FROM particoes_historico WHERE mes = ?", (mes,))
+                        conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.close()
+                
+                caminho = self._caminho_particao(particao['arquivo'])
+                caminho.unlink(missing_ok=True)
+                Path(f"{caminho}.gz").unlink(missing_ok=True)
+                self._descartar_copia_leitura(mes)
+                
+                self.logger.info(f"Partição {mes} removida: {removidos} cálculos")
+                return removidos
+                
+            except Exception as e:
+                self.logger.error(f"Erro ao remover partição {mes}: {e}")
+                raise DatabaseError(f"Falha ao remover partição {mes}: {e}")
+    
+    def iter_historico(self, sql: str, params: Sequence = (), inicio: Optional[Any] = None,
+                       fim: Optional[Any] = None, incluir_principal: bool = True) -> Iterator[Tuple]:
+        """Executa a consulta em cada partição do período e no banco principal
+        
+        A consulta referencia as tabelas como {esquema}.calculos_icms_st e
+        {esquema}.itens_calculo. As partições são lidas em ordem cronológica,
+        uma por vez e somente leitura, seguidas do banco principal (mês corrente).
+        """
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            
+            for particao in self.listar_particoes(inicio, fim):
+                with self._particao_anexada(conn, particao['mes']) as esquema:
+                    cursor = conn.execute(sql.format(esquema=esquema), params)
+                    try:
+                        yield from cursor
+                    finally:
+                        cursor.close()
+            
+            if incluir_principal:
+                cursor = conn.execute(sql.format(esquema='main'), params)
+                try:
+                    yield from cursor
+                finally:
+                    cursor.close()
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def _particao_anexada(self, conn: sqlite3.Connection, mes: Optional[str], criar: bool = False,
+                          escrita: bool = False):
+        """Anexa a partição do mês como esquema 'historico' (sem mês, usa 'main')
+        
+        Só com `criar` ou `escrita` o arquivo anexado é o da partição; leituras
+        de partições comprimidas usam uma cópia temporária.
+        """
+        if not mes:
+            yield 'main'
+            return
+        
+        caminho = self._preparar_particao(mes, criar, escrita or criar)
+        conn.execute("ATTACH DATABASE ? AS historico", (str(caminho),))
+        try:
+            yield 'historico'
+        finally:
+            # DETACH falha com transação aberta (só acontece quando houve erro)
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("DETACH DATABASE historico")
+    
+    def _preparar_particao(self, mes: str, criar: bool = False, escrita: bool = False) -> Path:
+        """Caminho do arquivo da partição a anexar
+        
+        Para escrita, partição comprimida é descomprimida no lugar (e marcada
+        no catálogo); para leitura, o .gz e o catálogo ficam como estão.
+        """
+        with self._lock_particoes:
+            particao = self._particao(mes)
+            
+            if particao is None:
+                if not criar:
+                    raise DatabaseError(f"Partição {mes} não encontrada")
+                caminho = self._caminho_particao(f"calculos_{mes.replace('-', '_')}.db")
+                caminho.parent.mkdir(parents=True, exist_ok=True)
+                return caminho
+            
+            caminho = self._caminho_particao(particao['arquivo'])
+            if particao['comprimido'] and not escrita:
+                return self._copia_leitura(mes, caminho)
+            
+            if particao['comprimido']:
+                with gzip.open(f"{caminho}.gz", 'rb') as origem, open(caminho, 'wb') as saida:
+                    shutil.copyfileobj(origem, saida)
+                self._marcar_comprimido(mes, False)
+                Path(f"{caminho}.gz").unlink()
+            
+            return caminho
+    
+    def _copia_leitura(self, mes: str, caminho: Path) -> Path:
+        """Cópia descomprimida da partição em pasta temporária, reaproveitada enquanto o .gz não mudar"""
+        comprimido = Path(f"{caminho}.gz")
+        estado = comprimido.stat()
+        assinatura = (estado.st_mtime_ns, estado.st_size)
+        
+        copia = self._copias_leitura.get(mes)
+        if copia and copia[0] == assinatura and copia[1].exists():
+            return copia[1]
+        
+        if self._cache_particoes is None:
+            self._cache_particoes = tempfile.TemporaryDirectory(prefix='particoes_')
+        
+        # Grava ao lado e substitui: leitores da cópia anterior mantêm o arquivo aberto
+        destino = Path(self._cache_particoes.name) / caminho.name
+        temporario = destino.with_suffix('.tmp')
+        with gzip.open(comprimido, 'rb') as origem, open(temporario, 'wb') as saida:
+            shutil.copyfileobj(origem, saida)
+        temporario.replace(destino)
+        
+        self._copias_leitura[mes] = (assinatura, destino)
+        return destino
+    
+    def _descartar_copia_leitura(self, mes: str):
+        """Remove a cópia de leitura da partição, se houver"""
+        with self._lock_particoes:
+            copia = self._copias_leitura.pop(mes, None)
+        if copia:
+            copia[1].unlink(missing_ok=True)
+    
+    def _particao(self, mes: str) -> Optional[Dict[str, Any]]:
+        """Entrada do catálogo para o mês, se arquivado"""
+        particoes = self.listar_particoes(mes, mes)
+        return particoes[0] if particoes else None
+    
+    def _atualizar_catalogo(self, cursor: sqlite3.Cursor, mes: str):
+        """Atualiza o catálogo com o intervalo de IDs e a contagem da partição anexada"""
+        cursor.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM historico.calculos_icms_st")
+        id_min, id_max, quantidade = cursor.fetchone()
+        
+        cursor.execute("""
+            INSERT INTO particoes_historico (mes, arquivo, id_min, id_max, qtd_calculos, data_arquivamento, layout)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (mes) DO UPDATE SET
+                id_min = excluded.id_min,
+                id_max = excluded.id_max,
+                qtd_calculos = excluded.qtd_calculos,
+                data_arquivamento = excluded.data_arquivamento,
+                layout = excluded.layout
+        """, (mes, f"calculos_{mes.replace('-', '_')}.db", id_min, id_max, quantidade, datetime.now(),
+              LAYOUT_ITENS_COMPACTO))
+    
+    def _marcar_comprimido(self, mes: str, comprimido: bool):
+        """Registra no catálogo se o arquivo da partição está comprimido"""
+        conn = self._connect()
+        conn.execute("UPDATE particoes_historico SET comprimido = ? WHERE mes = ?", (comprimido, mes))
+        conn.commit()
+        conn.close()
+    
+    def _caminho_particao(self, arquivo: str) -> Path:
+        """Caminho completo de um arquivo de partição (pasta historico ao lado do banco)"""
+        return self.storage.diretorio / "historico" / arquivo
+    
+    def _colunas(self, cursor: sqlite3.Cursor, tabela: str) -> List[str]:
+        """Colunas da tabela no banco principal, na ordem de criação"""
+        cursor.execute(f"PRAGMA main.table_info({tabela})")
+        return [row[1] for row in cursor.fetchall()]
+    
+    def _limites_mes(self, mes: str) -> Tuple[str, str]:
+        """Início (inclusivo) e fim (exclusivo) do mês AAAA-MM como texto comparável a data_calculo"""
+        ano, numero = int(mes[:4]), int(mes[5:7])
+        proximo = f"{ano + 1}-01" if numero == 12 else f"{ano}-{numero + 1:02d}"
+        return f"{mes}-01", f"{proximo}-01"
+    
+    def backup_to(self, destino: sqlite3.Connection, paginas_por_passo: int = 256, pausa: float = 0.01):
+        """Copia o banco para a conexão destino usando a API de backup do SQLite
+        
+        A cópia é feita em passos de `paginas_por_passo` páginas, liberando o
+        banco entre os passos para que as sessões ativas não fiquem bloqueadas.
+        """
+        try:
+            conn = self._connect()
+            conn.backup(destino, pages=paginas_por_passo, sleep=pausa)
+            conn.close()
+            
+        except Exception as e:
+            self.logger.error(f"Erro no backup do banco: {e}")
+            raise DatabaseError(f"Falha no backup: {e}")
+    
+    def restore_from(self, origem: sqlite3.Connection, paginas_por_passo: int = 256, pausa: float = 0.01):
+        """Substitui o conteúdo do banco pelo da conexão origem (API de backup)
+        
+        Os contadores de controle_alteracoes ficam acima dos anteriores à
+        restauração, invalidando os caches (figuras, dashboard, relatórios)
+        de todos os processos.
+        """
+        try:
+            conn = self._connect()
+            antes = dict(conn.execute("SELECT escopo, versao FROM controle_alteracoes").fetchall())
+            origem.backup(conn, pages=paginas_por_passo, sleep=pausa)
+            
+            # Backups antigos podem não ter o esquema atual (inclusive os contadores)
+            init_database(conn)
+            restaurados = dict(conn.execute("SELECT escopo, versao FROM controle_alteracoes").fetchall())
+            for escopo in set(antes) | set(restaurados) | {'calculos', 'figuras'}:
+                conn.execute("""
+                    INSERT INTO controle_alteracoes (escopo, versao) VALUES (?, ?)
+                    ON CONFLICT (escopo) DO UPDATE SET versao = excluded.versao
+                """, (escopo, max(antes.get(escopo, 0), restaurados.get(escopo, 0)) + 1))
+            conn.commit()
+            conn.close()
+            
+            self.logger.info("Banco de dados restaurado a partir de backup")
+            
+        except Exception as e:
+            self.logger.error(f"Erro na restauração do banco: {e}")
+            raise DatabaseError(f"Falha na restauração: {e}")
+    
+    @contextmanager
+    def particoes_estaveis(self):
+        """Mantém os arquivos de partição inalterados (sem arquivar, comprimir ou remover) no bloco"""
+        with self._lock_arquivamento:
+            yield
+    
+    def backup_particao_to(self, mes: str, destino: sqlite3.Connection, paginas_por_passo: int = 256,
+                           pausa: float = 0.01):
+        """Copia a partição do mês para a conexão destino (API de backup); .gz não é alterado"""
+        try:
+            conn = sqlite3.connect(self._preparar_particao(mes))
+            conn.backup(destino, pages=paginas_por_passo, sleep=pausa)
+            conn.close()
+            
+        except Exception as e:
+            self.logger.error(f"Erro no backup da partição {mes}: {e}")
+            raise DatabaseError(f"Falha no backup da partição {mes}: {e}")
+    
+    def restore_particao_from(self, mes: str, origem: sqlite3.Connection, paginas_por_passo: int = 256,
+                              pausa: float = 0.01):
+        """Substitui o arquivo da partição do mês pelo conteúdo da conexão origem
+        
+        O mês precisa constar do catálogo (restaurado antes com restore_from);
+        a partição fica descomprimida.
+        """
+        try:
+            with self._lock_arquivamento:
+                particao = self._particao(mes)
+                if particao is None:
+                    raise DatabaseError(f"Partição {mes} não consta do catálogo")
+                
+                caminho = self._caminho_particao(particao['arquivo'])
+                caminho.parent.mkdir(parents=True, exist_ok=True)
+                caminho.unlink(missing_ok=True)
+                
+                conn = sqlite3.connect(caminho)
+                origem.backup(conn, pages=paginas_por_passo, sleep=pausa)
+                conn.close()
+                
+                Path(f"{caminho}.gz").unlink(missing_ok=True)
+                self._marcar_comprimido(mes, False)
+                self._descartar_copia_leitura(mes)
+            
+        except Exception as e:
+            self.logger.error(f"Erro na restauração da partição {mes}: {e}")
+            raise DatabaseError(f"Falha na restauração da partição {mes}: {e}")
+    
+    def sincronizar_particoes(self) -> List[str]:
+        """Alinha os arquivos da pasta historico ao catálogo (após uma restauração)
+        
+        Marca cada partição como comprimida ou não conforme o arquivo presente e
+        apaga arquivos de meses fora do catálogo, que seriam reaproveitados por
+        um novo arquivamento. Retorna os meses do catálogo sem arquivo.
+        """
+        with self._lock_arquivamento:
+            catalogados, ausentes = set(), []
+            for particao in self.listar_particoes():
+                caminho = self._caminho_particao(particao['arquivo'])
+                catalogados.update({caminho.name, f"{caminho.name}.gz"})
+                self._descartar_copia_leitura(particao['mes'])
+                
+                if caminho.exists():
+                    Path(f"{caminho}.gz").unlink(missing_ok=True)
+                    self._marcar_comprimido(particao['mes'], False)
+                elif Path(f"{caminho}.gz").exists():
+                    self._marcar_comprimido(particao['mes'], True)
+                else:
+                    ausentes.append(particao['mes'])
+            
+            pasta = self.storage.diretorio / "historico"
+            if pasta.exists():
+                for arquivo in pasta.glob("calculos_*.db*"):
+                    if arquivo.name not in catalogados:
+                        arquivo.unlink()
+                        self.logger.info(f"Arquivo de partição fora do catálogo removido: {arquivo.name}")
+            
+            if ausentes:
+                self.logger.warning(f"Partições do catálogo sem arquivo: {', '.join(ausentes)}")
+            
+            # Backups anteriores ao registro de impressões digitais dos arquivados
+            self._indexar_impressoes_arquivadas()
+            return ausentes
+    
+    def integrity_check(self) -> bool:
+        """Executa PRAGMA integrity_check no banco"""
+        try:
+            conn = self._connect()
+            resultado = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            conn.close()
+            
+            return resultado == 'ok'
+            
+        except Exception as e:
+            self.logger.error(f"Erro na verificação de integridade: {e}")
+            return False
+    
     def save_user_config(self, config: UserConfig) -> bool:
         """Salva configurações de usuário no banco"""
         try:
-            conn = get_connection()
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Criar tabela se não existir
@@ -329,7 +1738,7 @@ class DatabaseManager:
     def get_user_config(self, user_id: str = "default") -> UserConfig:
         """Busca configurações de usuário por ID"""
         try:
-            conn = get_connection()
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -436,7 +1845,7 @@ class DatabaseManager:
     def get_config_history(self, user_id: str = "default", limit: int = 10) -> List[Dict]:
         """Retorna histórico de alterações de configuração"""
         try:
-            conn = get_connection()
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Criar tabela de histórico se não existir
@@ -473,43 +1882,4 @@ class DatabaseManager:
         except Exception as e:
             self.logger.error(f"Erro ao buscar histórico: {e}")
             return []
-    
-    def get_estatisticas(self) -> Dict[str, any]:
-        """Retorna estatísticas do banco"""
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # Contar figuras
-            cursor.execute("SELECT COUNT(*) FROM figuras_tributarias WHERE ativo = 1")
-            total_figuras = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM figuras_tributarias WHERE ativo = 1 AND tipo_tributacao = 'st'")
-            figuras_st = cursor.fetchone()[0]
-            
-            # Contar cálculos
-            cursor.execute("SELECT COUNT(*) FROM calculos_icms_st")
-            total_calculos = cursor.fetchone()[0]
-            
-            # Últimos cálculos
-            cursor.execute("""
-                SELECT data_calculo, total_icms_st_recolher 
-                FROM calculos_icms_st 
-                ORDER BY data_calculo DESC 
-                LIMIT 5
-            """)
-            ultimos_calculos = cursor.fetchall()
-            
-            conn.close()
-            
-            return {
-                'total_figuras': total_figuras,
-                'figuras_st': figuras_st,
-                'total_calculos': total_calculos,
-                'ultimos_calculos': ultimos_calculos
-            }
-            
-        except Exception as e:
-            self.logger.error(f"Erro ao buscar estatísticas: {e}")
-            return {}
         
\ No newline at end of file
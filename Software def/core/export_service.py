@@ -0,0 +1,144 @@
+"""
+Geração sob demanda das exportações, com cache em disco limitado por tamanho
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from components.exports import COLUNAS_ITENS, get_exportador, linhas_resultado, parquet_disponivel, resumo_resultado, write_excel
+from models.resultado_calculo import ResultadoCalculoGeral
+from utils.logger import SystemLogger
+from utils.exceptions import ExportError
+
+# Formatos de exportação: extensão -> tipo MIME
+FORMATOS_EXPORTACAO = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv",
+    'parquet': "application/vnd.apache.parquet"
+}
+
+class ExportService:
+    """Gera arquivos de exportação somente quando pedidos e os reaproveita
+    
+    Cada arquivo é identificado pelo cálculo (hash do resultado, precedido
+    do ID quando salvo), pelo formato e pela versão das figuras tributárias. O
+    diretório é limitado a `limite_mb`, descartando os arquivos usados há
+    mais tempo (data de modificação, renovada a cada acesso).
+    """
+    
+    def __init__(self, db_manager, diretorio: Optional[Path] = None, limite_mb: float = 200.0):
+        self.logger = SystemLogger('export_service')
+        self.db_manager = db_manager
+        self.diretorio = Path(diretorio) if diretorio else Path(db_manager.storage.diretorio) / "exportacoes"
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        
+        self._lock = threading.Lock()
+    
+    def exportar(self, resultado: ResultadoCalculoGeral, formato: str = 'xlsx',
+                 calculo_id: Optional[int] = None) -> bytes:
+        """Conteúdo do arquivo exportado, gerado apenas se não estiver em cache"""
+        return self.get_arquivo(resultado, formato, calculo_id).read_bytes()
+    
+    def get_arquivo(self, resultado: ResultadoCalculoGeral, formato: str = 'xlsx',
+                    calculo_id: Optional[int] = None) -> Path:
+        """Caminho do arquivo exportado no cache, gerando-o se necessário"""
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ExportError(f"Formato de exportação não suportado: {formato}")
+        
+        arquivo = self.diretorio / f"{self._chave(resultado, calculo_id)}.{formato}"
+        
+        with self._lock:
+            if arquivo.exists():
+                # Renova o acesso para a política de descarte
+                os.utime(arquivo)
+                return arquivo
+            
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+            temporario = arquivo.with_name(f".{arquivo.name}.tmp")
+            
+            try:
+                self._gerar(resultado, formato, temporario)
+                os.replace(temporario, arquivo)
+            except Exception as e:
+                self.logger.error(f"Erro ao gerar exportação {arquivo.name}: {e}")
+                raise ExportError(f"Erro ao gerar exportação: {e}")
+            finally:
+                temporario.unlink(missing_ok=True)
+            
+            self.logger.info(f"Exportação gerada: {arquivo.name} ({arquivo.stat().st_size} bytes)")
+            self._limitar(manter=arquivo)
+            return arquivo
+    
+    def formatos_disponiveis(self) -> List[str]:
+        """Formatos suportados no ambiente (Parquet depende do pyarrow)"""
+        return [formato for formato in FORMATOS_EXPORTACAO if formato != 'parquet' or parquet_disponivel()]
+    
+    def get_mime(self, formato: str) -> str:
+        """Tipo MIME do formato"""
+        return FORMATOS_EXPORTACAO[formato]
+    
+    def get_estatisticas(self) -> Dict[str, int]:
+        """Quantidade de arquivos e bytes ocupados pelo cache"""
+        arquivos = self._arquivos()
+        return {'arquivos': len(arquivos), 'bytes': sum(tamanho for _, _, tamanho in arquivos)}
+    
+    def limpar(self) -> int:
+        """Remove todos os arquivos do cache e retorna quantos foram removidos"""
+        with self._lock:
+            arquivos = self._arquivos()
+            for caminho, _, _ in arquivos:
+                caminho.unlink(missing_ok=True)
+            return len(arquivos)
+    
+    def _chave(self, resultado: ResultadoCalculoGeral, calculo_id: Optional[int]) -> str:
+        """Identificação do arquivo: cálculo (ID e conteúdo) + versão das figuras"""
+        versao = self.db_manager.get_versao_figuras()
+        
+        conteudo = "|".join([
+            str(resultado.chave_nfe), resultado.data_calculo.isoformat(), str(resultado.total_itens),
+            *(f"{item.codigo_item}:{item.valor_total}:{item.valor_icms_st_recolher}"
+              for item in resultado.detalhes_itens)
+        ])
+        hash_conteudo = hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:16]
+        
+        # O ID sozinho não basta: após restaurar um backup, IDs voltam a ser usados por outros cálculos
+        if calculo_id is not None:
+            return f"calculo_{calculo_id}_{hash_conteudo}_v{versao}"
+        return f"avulso_{hash_conteudo}_v{versao}"
+    
+    def _gerar(self, resultado: ResultadoCalculoGeral, formato: str, destino: Path):
+        """Grava a exportação do resultado no destino"""
+        if formato == 'xlsx':
+            write_excel(destino, linhas_resultado(resultado), COLUNAS_ITENS, resumo_resultado(resultado))
+        else:
+            get_exportador(formato)(str(destino), linhas_resultado(resultado), COLUNAS_ITENS)
+    
+    def _limitar(self, manter: Path):
+        """Descarta os arquivos menos usados até o cache caber no limite"""
+        arquivos = sorted(self._arquivos(), key=lambda arquivo: arquivo[1])
+        total = sum(tamanho for _, _, tamanho in arquivos)
+        
+        for caminho, _, tamanho in arquivos:
+            if total <= self.limite_bytes:
+                break
+            if caminho == manter:
+                continue
+            try:
+                caminho.unlink()
+                total -= tamanho
+            except OSError as e:
+                self.logger.warning(f"Não foi possível remover exportação {caminho.name}: {e}")
+    
+    def _arquivos(self):
+        """Arquivos do cache: (caminho, último acesso, tamanho)"""
+        if not self.diretorio.exists():
+            return []
+        
+        arquivos = []
+        for caminho in self.diretorio.iterdir():
+            if caminho.is_file() and not caminho.name.startswith('.'):
+                info = caminho.stat()
+                arquivos.append((caminho, info.st_mtime, info.st_size))
+        return arquivos
\ No newline at end of file
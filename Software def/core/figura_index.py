@@ -0,0 +1,63 @@
+"""
+Índice em memória das versões de figuras tributárias por vigência
+"""
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+from models.figura_tributaria import FiguraTributaria
+
+class FiguraVigenciaIndex:
+    """Resolve a figura vigente de um NCM em uma data sem consultar o banco
+    
+    Guarda, por NCM, as versões ordenadas pelo início de vigência; cada
+    consulta é uma busca binária. Pensado para recálculos em lote de
+    períodos históricos: uma carga do banco, uma busca por item.
+    """
+    
+    def __init__(self, versoes: Iterable[FiguraTributaria]):
+        self._inicios: Dict[str, List[date]] = {}
+        self._versoes: Dict[str, List[FiguraTributaria]] = {}
+        
+        # Com o mesmo início, a versão mais recente (maior ID) fica por último e prevalece
+        for figura in sorted(versoes, key=lambda f: (f.ncm, f.vigencia_inicio or date.min, f.versao_id or 0)):
+            self._inicios.setdefault(figura.ncm, []).append(figura.vigencia_inicio or date.min)
+            self._versoes.setdefault(figura.ncm, []).append(figura)
+    
+    def get(self, ncm: str, data: Optional[Union[date, datetime, str]] = None) -> Optional[FiguraTributaria]:
+        """Figura ativa vigente para o NCM na data (padrão: hoje)"""
+        inicios = self._inicios.get(ncm)
+        if not inicios:
+            return None
+        
+        data = self._como_data(data)
+        posicao = bisect_right(inicios, data) - 1
+        if posicao < 0:
+            return None
+        
+        figura = self._versoes[ncm][posicao]
+        if not figura.ativo or not figura.vigente_em(data):
+            return None
+        
+        return figura
+    
+    def versoes(self, ncm: str) -> List[FiguraTributaria]:
+        """Todas as versões do NCM, em ordem de vigência"""
+        return list(self._versoes.get(ncm, []))
+    
+    def __contains__(self, ncm: str) -> bool:
+        return ncm in self._versoes
+    
+    def __len__(self) -> int:
+        return len(self._versoes)
+    
+    @staticmethod
+    def _como_data(valor: Optional[Union[date, datetime, str]]) -> date:
+        """Normaliza a data de consulta"""
+        if valor is None:
+            return date.today()
+        if isinstance(valor, datetime):
+            return valor.date()
+        if isinstance(valor, date):
+            return valor
+        return date.fromisoformat(str(valor)[:10])
\ No newline at end of file
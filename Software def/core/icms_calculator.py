@@ -1,14 +1,16 @@
 """
 Calculadora de ICMS ST com fórmulas específicas
 """
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime
+from datetime import date, datetime
 
 from models.nota_fiscal import ItemNFe
 from models.figura_tributaria import FiguraTributaria
 from models.resultado_calculo import ResultadoCalculoItem, ResultadoCalculoGeral
 from core.database_manager import DatabaseManager
+from core.figura_index import FiguraVigenciaIndex
 from core.xml_processor import XMLProcessor
 from utils.logger import SystemLogger
 from utils.exceptions import CalculationError, ValidationError
@@ -17,18 +19,42 @@ from utils.validators import Validators
 class ICMSCalculator:
     """Calculadora de ICMS ST com fórmulas específicas"""
     
-    def __init__(self):
+    def __init__(self, db_manager: Optional[DatabaseManager] = None):
         self.logger = SystemLogger('icms_calculator')
-        self.db_manager = DatabaseManager()
+        self.db_manager = db_manager or DatabaseManager()
         self.xml_processor = XMLProcessor()
         self.validators = Validators()
         
         # Configurações de precisão decimal
         self.decimal_places = 2
         self.rounding = ROUND_HALF_UP
+        
+        # Snapshot das figuras (todas as versões), recarregado quando elas mudam
+        self._figuras: Optional[FiguraVigenciaIndex] = None
+        self._versao_figuras: Optional[int] = None
+        self._lock_figuras = threading.Lock()
+    
+    def carregar_figuras(self) -> FiguraVigenciaIndex:
+        """Snapshot em memória das figuras, relido só após gravações
+        
+        A validade vem do contador 'figuras' de controle_alteracoes: cada
+        cálculo faz uma consulta leve ao contador em vez de uma por item.
+        """
+        versao = self.db_manager.get_versao_dados('figuras')
+        
+        with self._lock_figuras:
+            if self._figuras is None or versao != self._versao_figuras:
+                self._figuras = self.db_manager.get_indice_vigencias()
+                self._versao_figuras = versao
+            return self._figuras
     
-    def calcular_icms_st_xml(self, xml_content: bytes, frete_por_fora: float = 0.0) -> ResultadoCalculoGeral:
-        """Calcula ICMS ST a partir de arquivo XML da NFe"""
+    def calcular_icms_st_xml(self, xml_content: bytes, frete_por_fora: float = 0.0,
+                             data_referencia: Optional[date] = None,
+                             usar_data_emissao: bool = False) -> ResultadoCalculoGeral:
+        """Calcula ICMS ST a partir de arquivo XML da NFe
+        
+        Com `data_referencia` (ou `usar_data_emissao`) usa as figuras vigentes naquela data.
+        """
         try:
             # Processar XML
             dados_xml = self.xml_processor.processar_xml_nfe(xml_content)
@@ -39,18 +65,28 @@ class ICMSCalculator:
             itens_nfe = dados_xml['produtos']
             chave_nfe = dados_xml.get('dados_nfe', {}).get('chave_nfe')
             
+            if usar_data_emissao and data_referencia is None:
+                data_referencia = dados_xml.get('dados_nfe', {}).get('data_emissao')
+            
             # Aplicar rateio de frete por fora se necessário
             if frete_por_fora > 0:
                 itens_nfe = self._ratear_frete_por_fora(itens_nfe, frete_por_fora)
             
             # Calcular ICMS ST
-            return self.calcular_icms_st_itens(itens_nfe, chave_nfe, 'XML')
+            resultado = self.calcular_icms_st_itens(itens_nfe, chave_nfe, 'XML', data_referencia)
+            
+            emitente = dados_xml.get('dados_nfe', {}).get('emitente', {})
+            resultado.cnpj_emitente = emitente.get('cnpj')
+            resultado.nome_emitente = emitente.get('nome')
+            
+            return resultado
             
         except Exception as e:
             self.logger.error(f"Erro no cálculo ICMS ST XML: {e}")
             raise CalculationError(f"Falha no cálculo: {e}")
     
-    def calcular_icms_st_manual(self, dados_itens: List[Dict[str, Any]], frete_por_fora: float = 0.0) -> ResultadoCalculoGeral:
+    def calcular_icms_st_manual(self, dados_itens: List[Dict[str, Any]], frete_por_fora: float = 0.0,
+                                data_referencia: Optional[date] = None) -> ResultadoCalculoGeral:
         """Calcula ICMS ST para dados inseridos manualmente"""
         try:
             # Converter dados manuais para ItemNFe
@@ -71,21 +107,77 @@ class ICMSCalculator:
                 itens_nfe = self._ratear_frete_por_fora(itens_nfe, frete_por_fora)
             
             # Calcular ICMS ST
-            return self.calcular_icms_st_itens(itens_nfe, None, 'MANUAL')
+            return self.calcular_icms_st_itens(itens_nfe, None, 'MANUAL', data_referencia)
             
         except Exception as e:
             self.logger.error(f"Erro no cálculo ICMS ST manual: {e}")
             raise CalculationError(f"Falha no cálculo: {e}")
     
-    def calcular_icms_st_itens(self, itens: List[ItemNFe], chave_nfe: Optional[str], origem: str) -> ResultadoCalculoGeral:
+    def calcular_icms_st_tabela(self, itens, frete_por_fora: float = 0.0,
+                                data_referencia: Optional[date] = None) -> ResultadoCalculoGeral:
+        """Calcula ICMS ST para itens validados em lote (DataFrame de item_importer.validar_itens)
+        
+        Linhas com erro são ignoradas; as demais já vêm convertidas e
+        viram ItemNFe diretamente, sem a conversão item a item dos dicts.
+        """
+        try:
+            if 'erro' in itens.columns:
+                itens = itens[itens['erro'] == '']
+            
+            if itens.empty:
+                raise ValidationError("Nenhum item válido fornecido")
+            
+            itens_nfe = [
+                ItemNFe(
+                    codigo=codigo, descricao=descricao, ncm=ncm, quantidade=quantidade,
+                    valor_unitario=valor_unitario, valor_total=valor_total,
+                    valor_ipi=valor_ipi, valor_frete=valor_frete
+                )
+                for codigo, descricao, ncm, quantidade, valor_unitario, valor_total, valor_ipi, valor_frete
+                in itens[['codigo', 'descricao', 'ncm', 'quantidade', 'valor_unitario',
+                          'valor_total', 'valor_ipi', 'valor_frete']].itertuples(index=False, name=None)
+            ]
+            
+            # Aplicar rateio de frete por fora se necessário
+            if frete_por_fora > 0:
+                itens_nfe = self._ratear_frete_por_fora(itens_nfe, frete_por_fora)
+            
+            return self.calcular_icms_st_itens(itens_nfe, None, 'MANUAL', data_referencia)
+            
+        except Exception as e:
+            self.logger.error(f"Erro no cálculo ICMS ST em lote: {e}")
+            raise CalculationError(f"Falha no cálculo: {e}")
+    
+    def calcular_icms_st_lotes(self, lotes: Iterable, data_referencia: Optional[date] = None
+                               ) -> Iterator[Tuple[Any, Optional[ResultadoCalculoGeral]]]:
+        """Calcula lotes validados um a um (planilhas grandes), sem reunir os itens
+        
+        Para cada lote devolve (lote, resultado); lotes sem linhas válidas
+        trazem resultado None. O frete por fora não se aplica, pois o rateio
+        depende do total de todos os itens.
+        """
+        for lote in lotes:
+            if 'erro' in lote.columns and not (lote['erro'] == '').any():
+                yield lote, None
+                continue
+            
+            yield lote, self.calcular_icms_st_tabela(lote, 0.0, data_referencia)
+    
+    def calcular_icms_st_itens(self, itens: List[ItemNFe], chave_nfe: Optional[str], origem: str,
+                               data_referencia: Optional[date] = None) -> ResultadoCalculoGeral:
         """Calcula ICMS ST para lista de itens"""
         try:
             resultados_itens = []
             observacoes_gerais = []
             
+            # Figuras do snapshot em memória (todas as vigências): uma busca por item
+            indice = self.carregar_figuras()
+            if data_referencia:
+                observacoes_gerais.append(f"Figuras vigentes em {data_referencia:%d/%m/%Y}")
+            
             for item in itens:
                 try:
-                    resultado_item = self._calcular_item_icms_st(item)
+                    resultado_item = self._calcular_item_icms_st(item, indice, data_referencia)
                     resultados_itens.append(resultado_item)
                 except Exception as e:
                     self.logger.error(f"Erro no cálculo do item {item.codigo}: {e}")
@@ -107,15 +199,19 @@ class ICMSCalculator:
             self.logger.error(f"Erro no cálculo ICMS ST: {e}")
             raise CalculationError(f"Falha no cálculo: {e}")
     
-    def _calcular_item_icms_st(self, item: ItemNFe) -> ResultadoCalculoItem:
+    def _calcular_item_icms_st(self, item: ItemNFe, indice: Optional[FiguraVigenciaIndex] = None,
+                               data_referencia: Optional[date] = None) -> ResultadoCalculoItem:
         """Calcula ICMS ST para um item usando as fórmulas corretas"""
         observacoes = []
         
         # Normalizar NCM
         ncm_normalizado = self.validators.normalizar_ncm(item.ncm)
         
-        # Buscar figura tributária
-        figura = self.db_manager.get_figura_tributaria(ncm_normalizado)
+        # Buscar figura tributária (vigente na data de referência, quando houver índice)
+        if indice is not None:
+            figura = indice.get(ncm_normalizado, data_referencia)
+        else:
+            figura = self.db_manager.get_figura_tributaria(ncm_normalizado)
         
         if not figura:
             observacoes.append(f"Figura tributária não encontrada para NCM {ncm_normalizado}")
@@ -185,6 +281,7 @@ class ICMSCalculator:
             mva_ajustado=mva_ajustado,
             reducao_bc_st=figura.reducao_bc_icms_st,
             reducao_bc_proprio=figura.reducao_bc_icms_proprio,
+            figura_versao_id=figura.versao_id,
             base_calculo_st=self._round_decimal(base_calculo_st),
             valor_icms_st_debito=self._round_decimal(valor_icms_st_debito),
             valor_icms_proprio_credito=self._round_decimal(valor_icms_proprio_credito),
@@ -268,6 +365,7 @@ class ICMSCalculator:
             tipo_tributacao=figura.tipo_tributacao,
             reducao_bc_st=figura.reducao_bc_icms_st,
             reducao_bc_proprio=figura.reducao_bc_icms_proprio,
+            figura_versao_id=figura.versao_id,
             valor_custo_final=item.valor_total + item.valor_ipi + item.valor_frete + frete_fora,
             possui_figura=True,
             observacoes=observacoes
@@ -0,0 +1,259 @@
+"""
+Leitura e validação em lote de itens para cálculo manual (grade, planilhas CSV/XLSX e texto colado)
+"""
+import io
+import unicodedata
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+import pandas as pd
+
+from components.exports import COLUNAS_ITENS, linhas_resultado, write_csv, write_excel
+from utils.logger import SystemLogger
+
+# Linhas lidas, validadas e calculadas por vez nas planilhas grandes
+TAMANHO_LOTE_IMPORTACAO = 5000
+
+# Linhas com erro guardadas para exibição (as demais entram só na contagem)
+MAX_ERROS_IMPORTACAO = 1000
+
+# Colunas dos itens manuais, na ordem de calcular_icms_st_manual
+COLUNAS_ITENS_MANUAIS = ('codigo', 'descricao', 'ncm', 'quantidade', 'valor_unitario', 'valor_ipi', 'valor_frete')
+
+# Cabeçalhos aceitos (sem acentos, minúsculos) -> coluna
+SINONIMOS_COLUNAS: Dict[str, str] = {
+    'codigo': 'codigo', 'cod': 'codigo', 'codigo do produto': 'codigo', 'codigo produto': 'codigo',
+    'sku': 'codigo', 'referencia': 'codigo', 'cprod': 'codigo',
+    'descricao': 'descricao', 'produto': 'descricao', 'descricao do produto': 'descricao', 'xprod': 'descricao',
+    'ncm': 'ncm', 'ncm/sh': 'ncm', 'classificacao fiscal': 'ncm',
+    'quantidade': 'quantidade', 'qtd': 'quantidade', 'qtde': 'quantidade', 'quant': 'quantidade', 'qcom': 'quantidade',
+    'valor unitario': 'valor_unitario', 'valor_unitario': 'valor_unitario', 'vl unit': 'valor_unitario',
+    'vlr unit': 'valor_unitario', 'preco': 'valor_unitario', 'preco unitario': 'valor_unitario',
+    'vuncom': 'valor_unitario',
+    'valor ipi': 'valor_ipi', 'valor_ipi': 'valor_ipi', 'ipi': 'valor_ipi', 'vipi': 'valor_ipi',
+    'valor frete': 'valor_frete', 'valor_frete': 'valor_frete', 'frete': 'valor_frete', 'vfrete': 'valor_frete'
+}
+
+def normalizar_colunas(frame: pd.DataFrame) -> pd.DataFrame:
+    """Renomeia os cabeçalhos reconhecidos para as colunas dos itens e descarta os demais"""
+    def _chave(nome) -> str:
+        texto = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode('ascii')
+        return ' '.join(texto.lower().replace('.', ' ').split())
+    
+    renomear = {}
+    for coluna in frame.columns:
+        destino = SINONIMOS_COLUNAS.get(_chave(coluna))
+        if destino and destino not in renomear.values():
+            renomear[coluna] = destino
+    
+    return frame[list(renomear)].rename(columns=renomear)
+
+def ler_planilha(arquivo: Union[bytes, io.IOBase], nome: str = '') -> pd.DataFrame:
+    """Lê uma planilha de itens (XLSX ou CSV, separador detectado) com as colunas normalizadas"""
+    conteudo = io.BytesIO(arquivo) if isinstance(arquivo, bytes) else arquivo
+    
+    if nome.lower().endswith(('.xlsx', '.xlsm')):
+        frame = pd.read_excel(conteudo)
+    else:
+        frame = pd.read_csv(conteudo, sep=_separador(conteudo), dtype=str, encoding='utf-8-sig')
+    
+    return normalizar_colunas(frame)
+
+def ler_planilha_em_lotes(arquivo: Union[bytes, io.IOBase], nome: str = '',
+                          tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO) -> Iterator[pd.DataFrame]:
+    """Lê a planilha em blocos de `tamanho_lote` linhas, cada um já validado (validar_itens)
+    
+    CSV é lido pelo pandas em blocos e XLSX pelo openpyxl em modo somente
+    leitura, de modo que só um bloco fica em memória por vez. A coluna
+    `linha` segue a numeração da planilha inteira.
+    """
+    conteudo = io.BytesIO(arquivo) if isinstance(arquivo, bytes) else arquivo
+    
+    if nome.lower().endswith(('.xlsx', '.xlsm')):
+        blocos = _blocos_excel(conteudo, tamanho_lote)
+    else:
+        blocos = pd.read_csv(conteudo, sep=_separador(conteudo), dtype=str, encoding='utf-8-sig',
+                             chunksize=tamanho_lote)
+    
+    primeira_linha = 1
+    for bloco in blocos:
+        yield validar_itens(normalizar_colunas(bloco), primeira_linha)
+        primeira_linha += len(bloco)
+
+def ler_texto_colado(texto: str) -> pd.DataFrame:
+    """Lê linhas coladas de uma planilha (tabulação, ';' ou ',') com cabeçalho na primeira linha"""
+    if not texto.strip():
+        return pd.DataFrame(columns=list(COLUNAS_ITENS_MANUAIS))
+    
+    separador = '\t' if '\t' in texto else None
+    frame = pd.read_csv(io.StringIO(texto.strip()), sep=separador, engine='python', dtype=str)
+    return normalizar_colunas(frame)
+
+def validar_itens(frame: pd.DataFrame, primeira_linha: int = 1) -> pd.DataFrame:
+    """Normaliza e valida os itens de uma vez, coluna a coluna
+    
+    Retorna as colunas dos itens já convertidas, `valor_total`, `linha`
+    (posição na origem, a partir de `primeira_linha`) e `erro` (vazio nas
+    linhas válidas, mensagens separadas por "; " nas demais). Linhas
+    inteiramente vazias são descartadas.
+    """
+    itens = frame.reindex(columns=list(COLUNAS_ITENS_MANUAIS))
+    itens.insert(0, 'linha', range(primeira_linha, primeira_linha + len(itens)))
+    
+    # Linhas em branco (ex.: sobras da grade editável)
+    vazias = itens[list(COLUNAS_ITENS_MANUAIS)].apply(_texto).eq('').all(axis=1)
+    itens = itens[~vazias].reset_index(drop=True)
+    
+    codigo = _texto(itens['codigo'])
+    descricao = _texto(itens['descricao'])
+    ncm = _ncm(itens['ncm'])
+    quantidade = _numero(itens['quantidade'])
+    valor_unitario = _numero(itens['valor_unitario'])
+    valor_ipi = _numero(itens['valor_ipi']).fillna(0.0)
+    valor_frete = _numero(itens['valor_frete']).fillna(0.0)
+    
+    regras = (
+        (codigo.eq(''), "Código obrigatório"),
+        (descricao.eq(''), "Descrição obrigatória"),
+        (ncm.eq(''), "NCM obrigatório"),
+        (ncm.ne('') & ncm.str.len().ne(8), "NCM deve ter 8 dígitos"),
+        (quantidade.isna(), "Quantidade inválida"),
+        (quantidade.le(0), "Quantidade deve ser maior que zero"),
+        (valor_unitario.isna(), "Valor unitário inválido"),
+        (valor_unitario.le(0), "Valor unitário deve ser maior que zero"),
+        (valor_ipi.lt(0), "IPI não pode ser negativo"),
+        (valor_frete.lt(0), "Frete não pode ser negativo")
+    )
+    
+    erro = pd.Series('', index=itens.index, dtype=object)
+    for mascara, mensagem in regras:
+        erro = erro.mask(mascara, erro + mensagem + '; ')
+    
+    return pd.DataFrame({
+        'linha': itens['linha'],
+        'codigo': codigo,
+        'descricao': descricao,
+        'ncm': ncm,
+        'quantidade': quantidade,
+        'valor_unitario': valor_unitario,
+        'valor_total': quantidade * valor_unitario,
+        'valor_ipi': valor_ipi,
+        'valor_frete': valor_frete,
+        'erro': erro.str.rstrip('; ')
+    })
+
+def itens_validos(itens: pd.DataFrame) -> pd.DataFrame:
+    """Linhas sem erro de um resultado de validar_itens"""
+    return itens[itens['erro'].eq('')]
+
+class ImportadorPlanilha:
+    """Calcula planilhas de itens de qualquer tamanho (ex.: exportações do ERP) em lotes
+    
+    Cada lote é lido, validado, calculado e gravado no arquivo de saída antes
+    do seguinte, com memória limitada pelo tamanho do lote. Os itens
+    calculados vão para o arquivo; totais e erros voltam no resumo.
+    """
+    
+    def __init__(self, icms_calculator, tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO,
+                 max_erros: int = MAX_ERROS_IMPORTACAO):
+        self.logger = SystemLogger('item_importer')
+        self.icms_calculator = icms_calculator
+        self.tamanho_lote = tamanho_lote
+        self.max_erros = max_erros
+    
+    def calcular(self, arquivo: Union[bytes, io.IOBase], nome: str, destino, formato: str = 'csv',
+                 progresso: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+        """Calcula a planilha e grava os itens em `destino` (CSV ou XLSX)
+        
+        `progresso` recebe o número de linhas já processadas após cada lote.
+        """
+        resumo: Dict[str, Any] = {
+            'linhas': 0, 'itens_calculados': 0, 'linhas_com_erro': 0,
+            'total_valor_produtos': 0.0, 'total_icms_st': 0.0, 'total_custo_final': 0.0,
+            'erros': []
+        }
+        
+        def _linhas():
+            lotes = ler_planilha_em_lotes(arquivo, nome, self.tamanho_lote)
+            for lote, resultado in self.icms_calculator.calcular_icms_st_lotes(lotes):
+                com_erro = lote[lote['erro'] != '']
+                resumo['linhas'] += len(lote)
+                resumo['linhas_com_erro'] += len(com_erro)
+                
+                vagas = self.max_erros - len(resumo['erros'])
+                if vagas > 0 and not com_erro.empty:
+                    resumo['erros'].extend(
+                        com_erro[['linha', 'codigo', 'descricao', 'erro']].head(vagas).to_dict('records')
+                    )
+                
+                if resultado is not None:
+                    resumo['itens_calculados'] += resultado.total_itens
+                    resumo['total_valor_produtos'] += resultado.total_valor_produtos
+                    resumo['total_icms_st'] += resultado.total_icms_st
+                    resumo['total_custo_final'] += resultado.total_custo_final
+                    yield from linhas_resultado(resultado)
+                
+                if progresso:
+                    progresso(resumo['linhas'])
+        
+        exportador = write_excel if formato == 'xlsx' else write_csv
+        exportador(destino, _linhas(), COLUNAS_ITENS)
+        
+        self.logger.info(
+            f"Planilha {nome} calculada: {resumo['itens_calculados']} itens, "
+            f"{resumo['linhas_com_erro']} linhas com erro"
+        )
+        return resumo
+
+def _separador(conteudo: io.IOBase) -> str:
+    """Separador do CSV pelo cabeçalho (';', tabulação ou ','), sem consumir o arquivo"""
+    posicao = conteudo.tell()
+    cabecalho = conteudo.readline()
+    conteudo.seek(posicao)
+    
+    if isinstance(cabecalho, bytes):
+        cabecalho = cabecalho.decode('utf-8', errors='ignore')
+    return max((';', '\t', ','), key=cabecalho.count)
+
+def _blocos_excel(conteudo: io.IOBase, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    """Primeira aba do XLSX em blocos de linhas (openpyxl somente leitura)"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(conteudo, read_only=True, data_only=True)
+    try:
+        linhas = workbook.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [str(titulo) if titulo is not None else '' for titulo in next(linhas, ())]
+        
+        while True:
+            bloco = list(islice(linhas, tamanho_lote))
+            if not bloco:
+                break
+            yield pd.DataFrame.from_records(bloco, columns=cabecalho)
+    finally:
+        workbook.close()
+
+def _texto(serie: pd.Series) -> pd.Series:
+    """Texto sem espaços nas pontas; ausentes viram vazio (números inteiros sem ".0")"""
+    if pd.api.types.is_float_dtype(serie) and serie.dropna().mod(1).eq(0).all():
+        serie = serie.astype('Int64')
+    return serie.astype('string').str.strip().fillna('').astype(object)
+
+def _ncm(serie: pd.Series) -> pd.Series:
+    """NCM só com dígitos; colunas numéricas (planilhas) recuperam o zero à esquerda"""
+    if pd.api.types.is_numeric_dtype(serie):
+        numeros = serie.round().astype('Int64').astype('string')
+        return numeros.str.zfill(8).fillna('').astype(object)
+    return _texto(serie).str.replace(r'\D', '', regex=True)
+
+def _numero(serie: pd.Series) -> pd.Series:
+    """Números em float, aceitando "R$ 1.234,56" e "1234.56"; inválidos viram NaN"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    
+    texto = _texto(serie).str.replace(r'[R$\s]', '', regex=True)
+    
+    # Vírgula decimal: pontos são separadores de milhar
+    brasileiro = texto.str.contains(',', regex=False)
+    texto = texto.where(~brasileiro, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    
+    return pd.to_numeric(texto.mask(texto.eq('')), errors='coerce').astype(float)
\ No newline at end of file
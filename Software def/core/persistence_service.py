@@ -0,0 +1,150 @@
+"""
+Serviço de persistência assíncrona dos cálculos (write-behind)
+"""
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from models.resultado_calculo import ResultadoCalculoGeral
+from utils.logger import SystemLogger
+from utils.exceptions import DatabaseError
+
+# Marcadores internos da fila
+_SALVAR = 'salvar'
+_FLUSH = 'flush'
+_PARAR = 'parar'
+
+class PersistenceService:
+    """Grava cálculos em uma thread dedicada, agrupando salvamentos em lotes
+    
+    Os cálculos entram em uma fila limitada e são gravados pela thread
+    escritora em transações únicas de até `max_lote` cálculos. Cada envio
+    retorna um Future que é resolvido com o ID gravado (confirmação de
+    durabilidade) ou com a exceção do salvamento.
+    """
+    
+    def __init__(self, db_manager, max_fila: int = 100, max_lote: int = 20, timeout_fila: float = 5.0):
+        self.logger = SystemLogger('persistence_service')
+        self.db_manager = db_manager
+        self.max_lote = max_lote
+        self.timeout_fila = timeout_fila
+        
+        self._fila: queue.Queue = queue.Queue(maxsize=max_fila)
+        self._encerrado = False
+        self._lock = threading.Lock()
+        
+        self._thread = threading.Thread(target=self._executar, name='persistence-writer', daemon=True)
+        self._thread.start()
+        
+        # Garantir que nada fique na fila ao encerrar o processo
+        atexit.register(self.shutdown)
+    
+    def submit(self, resultado: ResultadoCalculoGeral,
+               callback: Optional[Callable[[int], None]] = None) -> Future:
+        """Enfileira cálculo para salvamento e retorna Future com o ID gravado"""
+        if self._encerrado:
+            raise DatabaseError("Serviço de persistência encerrado")
+        
+        future: Future = Future()
+        
+        if callback:
+            def _notificar(f: Future):
+                if f.exception() is None:
+                    callback(f.result())
+            future.add_done_callback(_notificar)
+        
+        try:
+            # Fila cheia bloqueia o chamador por até timeout_fila (backpressure)
+            self._fila.put((_SALVAR, resultado, future), timeout=self.timeout_fila)
+        except queue.Full:
+            raise DatabaseError("Fila de salvamento cheia, tente novamente")
+        
+        return future
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda a gravação de tudo que foi enfileirado até agora"""
+        if not self._thread.is_alive():
+            return self._fila.empty()
+        
+        marcador: Future = Future()
+        self._fila.put((_FLUSH, None, marcador))
+        
+        try:
+            return marcador.result(timeout=timeout)
+        except Exception as e:
+            self.logger.warning(f"Flush não concluído: {e}")
+            return False
+    
+    def shutdown(self, timeout: Optional[float] = 10.0):
+        """Grava pendências e encerra a thread escritora"""
+        with self._lock:
+            if self._encerrado:
+                return
+            self._encerrado = True
+        
+        if self._thread.is_alive():
+            self._fila.put((_PARAR, None, None))
+            self._thread.join(timeout)
+        
+        self.logger.info("Serviço de persistência encerrado")
+    
+    def pendentes(self) -> int:
+        """Quantidade aproximada de cálculos aguardando gravação"""
+        return self._fila.qsize()
+    
+    def _executar(self):
+        """Laço da thread escritora"""
+        while True:
+            lote = [self._fila.get()]
+            
+            # Coalescer o que já estiver na fila em um único lote
+            while len(lote) < self.max_lote:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            
+            parar = self._processar_lote(lote)
+            
+            for _ in lote:
+                self._fila.task_done()
+            
+            if parar:
+                return
+    
+    def _processar_lote(self, lote: List[Tuple]) -> bool:
+        """Grava os salvamentos do lote e resolve marcadores; retorna True ao parar"""
+        salvamentos = [(resultado, future) for tipo, resultado, future in lote if tipo == _SALVAR]
+        
+        if salvamentos:
+            self._gravar(salvamentos)
+        
+        parar = False
+        for tipo, _, future in lote:
+            if tipo == _FLUSH:
+                future.set_result(True)
+            elif tipo == _PARAR:
+                parar = True
+        
+        return parar
+    
+    def _gravar(self, salvamentos: List[Tuple[ResultadoCalculoGeral, Future]]):
+        """Grava o lote em uma transação; em caso de falha, grava item a item"""
+        try:
+            ids = self.db_manager.save_calculos([resultado for resultado, _ in salvamentos])
+            for (_, future), calculo_id in zip(salvamentos, ids):
+                future.set_result(calculo_id)
+            return
+        
+        except Exception as e:
+            self.logger.warning(f"Falha no lote de {len(salvamentos)} cálculos, gravando individualmente: {e}")
+        
+        # Isolar o cálculo problemático sem perder os demais
+        for resultado, future in salvamentos:
+            try:
+                future.set_result(self.db_manager.save_calculo(resultado))
+            except Exception as e:
+                self.logger.error(f"Erro ao salvar cálculo em segundo plano: {e}")
+                future.set_exception(e)
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Relatórios de ICMS ST sobre os rollups e o histórico de cálculos
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logger import SystemLogger
+
+class ReportService:
+    """Relatórios por período, NCM, fornecedor e origem, e maiores itens por ICMS ST
+    
+    Os totais vêm de rollup_calculos e rollup_itens: meses inteiros do
+    intervalo usam a granularidade mensal e os meses das pontas, a diária,
+    sem ler os cálculos salvos nem as partições arquivadas.
+    """
+    
+    METRICAS = ('qtd_calculos', 'qtd_itens', 'valor_produtos', 'icms_st_recolher', 'custo_final')
+    
+    def __init__(self, db_manager):
+        self.logger = SystemLogger('report_service')
+        self.db_manager = db_manager
+    
+    def versao(self) -> int:
+        """Contador de alterações dos cálculos (chave de cache dos relatórios)"""
+        return self.db_manager.get_versao_dados('calculos')
+    
+    def por_periodo(self, inicio: date, fim: date, granularidade: str = 'mes') -> List[Dict[str, Any]]:
+        """Totais por mês ('mes') ou por dia ('dia') do intervalo"""
+        if granularidade == 'dia':
+            linhas = self.db_manager.get_rollups('dia', 'geral', inicio.isoformat(), fim.isoformat())
+        else:
+            linhas = []
+            for fatia, fatia_inicio, fatia_fim in self._fatias(inicio, fim):
+                linhas.extend(self.db_manager.get_rollups(fatia, 'geral', fatia_inicio, fatia_fim))
+        
+        # Dias avulsos das pontas entram no total do seu mês
+        totais: Dict[str, Dict[str, Any]] = {}
+        for linha in linhas:
+            periodo = linha['periodo'] if granularidade == 'dia' else linha['periodo'][:7]
+            self._acumular(totais, periodo, linha)
+        
+        return [self._com_carga({'periodo': periodo, **metricas}) for periodo, metricas in sorted(totais.items())]
+    
+    def por_dimensao(self, dimensao: str, inicio: date, fim: date,
+                     limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Totais por chave da dimensão ('ncm', 'origem' ou 'emitente'), maiores ICMS ST primeiro"""
+        totais: Dict[str, Dict[str, Any]] = {}
+        for fatia, fatia_inicio, fatia_fim in self._fatias(inicio, fim):
+            for linha in self.db_manager.get_rollups(fatia, dimensao, fatia_inicio, fatia_fim):
+                self._acumular(totais, linha['chave'], linha)
+        
+        # Um cálculo com vários NCMs conta em cada um: qtd_calculos por NCM não soma o total
+        linhas = [self._com_carga({'chave': chave, **metricas}) for chave, metricas in totais.items()]
+        linhas.sort(key=lambda linha: linha['icms_st_recolher'], reverse=True)
+        return linhas[:limite] if limite else linhas
+    
+    def por_ncm(self, inicio: date, fim: date, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """ICMS ST por NCM"""
+        return [{'ncm': linha.pop('chave'), **linha} for linha in self.por_dimensao('ncm', inicio, fim, limite)]
+    
+    def por_origem(self, inicio: date, fim: date) -> List[Dict[str, Any]]:
+        """ICMS ST por origem do cálculo (XML ou MANUAL)"""
+        return [{'origem': linha.pop('chave'), **linha} for linha in self.por_dimensao('origem', inicio, fim)]
+    
+    def por_fornecedor(self, inicio: date, fim: date, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """ICMS ST por CNPJ do emitente, com a razão social registrada nos cálculos"""
+        linhas = self.por_dimensao('emitente', inicio, fim, limite)
+        nomes = self._nomes_emitentes(inicio, fim, [linha['chave'] for linha in linhas if linha['chave']])
+        
+        return [
+            {'cnpj_emitente': linha['chave'], 'nome_emitente': nomes.get(linha['chave'], ''),
+             **{campo: valor for campo, valor in linha.items() if campo != 'chave'}}
+            for linha in linhas
+        ]
+    
+    def top_itens(self, inicio: date, fim: date, n: int = 20) -> List[Dict[str, Any]]:
+        """Os `n` itens (código + NCM) com maior ICMS ST a recolher no intervalo"""
+        # Meses inteiros e dias das pontas vêm de rollup_itens; aqui só se somam as fatias
+        totais: Dict[Tuple[str, str], List[Any]] = {}
+        for fatia, fatia_inicio, fatia_fim in self._fatias(inicio, fim):
+            for codigo, ncm, descricao_id, *metricas in self.db_manager.get_rollup_itens(fatia, fatia_inicio, fatia_fim):
+                total = totais.setdefault((codigo, ncm), [descricao_id, 0, 0, 0.0, 0, 0])
+                for posicao, valor in enumerate(metricas, 1):
+                    total[posicao] += valor or 0
+        
+        maiores = sorted(totais.items(), key=lambda item: item[1][5], reverse=True)[:n]
+        descricoes = self.db_manager.get_textos_itens([total[0] for _, total in maiores])
+        
+        return [
+            {
+                'codigo_item': codigo,
+                'descricao': descricoes.get(descricao_id, ''),
+                'ncm': ncm,
+                'qtd_calculos': calculos,
+                'ocorrencias': ocorrencias,
+                'quantidade': quantidade,
+                'valor_produtos': valor / 100.0,
+                'icms_st_recolher': icms_st / 100.0,
+                'carga_st': icms_st / valor * 100.0 if valor else 0.0
+            }
+            for (codigo, ncm), (descricao_id, calculos, ocorrencias, quantidade, valor, icms_st) in maiores
+        ]
+    
+    def _fatias(self, inicio: date, fim: date) -> List[Tuple[str, str, str]]:
+        """Divide o intervalo em (granularidade, início, fim) de rollup: meses inteiros e dias avulsos"""
+        fatias = []
+        
+        # Primeiro e último dia dos meses inteiramente contidos no intervalo
+        primeiro_mes = inicio if inicio.day == 1 else (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+        ultimo_dia_fim = fim.replace(day=monthrange(fim.year, fim.month)[1])
+        ultimo_mes = fim if fim == ultimo_dia_fim else fim.replace(day=1) - timedelta(days=1)
+        
+        if primeiro_mes > ultimo_mes:
+            return [('dia', inicio.isoformat(), fim.isoformat())]
+        
+        if inicio < primeiro_mes:
+            fatias.append(('dia', inicio.isoformat(), (primeiro_mes - timedelta(days=1)).isoformat()))
+        
+        fatias.append(('mes', primeiro_mes.strftime('%Y-%m'), ultimo_mes.strftime('%Y-%m')))
+        
+        if ultimo_mes < fim:
+            fatias.append(('dia', (ultimo_mes + timedelta(days=1)).isoformat(), fim.isoformat()))
+        
+        return fatias
+    
+    def _acumular(self, totais: Dict[str, Dict[str, Any]], chave: str, linha: Dict[str, Any]):
+        """Soma as métricas da linha de rollup no total da chave"""
+        total = totais.setdefault(chave, dict.fromkeys(self.METRICAS, 0))
+        for metrica in self.METRICAS:
+            total[metrica] += linha[metrica] or 0
+    
+    def _com_carga(self, linha: Dict[str, Any]) -> Dict[str, Any]:
+        """Acrescenta a carga de ST (ICMS ST sobre o valor dos produtos, em %)"""
+        linha['carga_st'] = (
+            linha['icms_st_recolher'] / linha['valor_produtos'] * 100.0 if linha['valor_produtos'] else 0.0
+        )
+        return linha
+    
+    def _nomes_emitentes(self, inicio: date, fim: date, cnpjs: List[str]) -> Dict[str, str]:
+        """Razão social registrada para cada CNPJ nos cálculos do intervalo"""
+        if not cnpjs:
+            return {}
+        
+        sql = f"""
+            SELECT cnpj_emitente, MAX(nome_emitente)
+            FROM {{esquema}}.calculos_icms_st
+            WHERE cnpj_emitente IN ({', '.join('?' * len(cnpjs))})
+              AND data_calculo >= ? AND data_calculo < date(?, '+1 day')
+            GROUP BY cnpj_emitente
+        """
+        
+        nomes: Dict[str, str] = {}
+        try:
+            for cnpj, nome in self.db_manager.iter_historico(
+                    sql, (*cnpjs, inicio.isoformat(), fim.isoformat()), inicio, fim):
+                if nome:
+                    nomes[cnpj] = nome
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar nomes dos emitentes: {e}")
+        return nomes
\ No newline at end of file
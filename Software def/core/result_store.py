@@ -0,0 +1,104 @@
+"""
+Armazenamento dos resultados de cálculo da sessão (LRU por impressão digital das entradas)
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date
+from typing import Any, Callable, Optional, Tuple
+
+from models.resultado_calculo import ResultadoCalculoGeral
+
+def impressao_digital(*partes: Any) -> str:
+    """Hash SHA-256 das entradas de um cálculo (bytes entram como estão, o resto pelo repr)"""
+    hash_entradas = hashlib.sha256()
+    for parte in partes:
+        dados = parte if isinstance(parte, bytes) else repr(parte).encode('utf-8')
+        # Tamanho antes de cada parte evita colisões por concatenação
+        hash_entradas.update(len(dados).to_bytes(8, 'big'))
+        hash_entradas.update(dados)
+    return hash_entradas.hexdigest()
+
+# Origens digitadas, sem data própria: o dia do cálculo entra na impressão digital
+ORIGENS_SEM_DATA = ('MANUAL', 'LOTE')
+
+def impressao_calculo(origem: str, *entradas: Any, versao_figuras: int, dia: Optional[date] = None) -> str:
+    """Impressão digital de um cálculo da página: origem, entradas e versão das figuras
+    
+    Para entradas manuais inclui o dia (padrão: hoje), de modo que as mesmas
+    entradas em outro dia gerem outro cálculo salvo, com a própria data.
+    """
+    partes = [origem, *entradas, versao_figuras]
+    if origem in ORIGENS_SEM_DATA:
+        partes.append(dia or date.today())
+    return impressao_digital(*partes)
+
+class ResultStore:
+    """Resultados já calculados na sessão, com descarte dos menos usados
+    
+    Cada entrada guarda o resultado e o salvamento correspondente (ID ou
+    Future do salvamento em segundo plano), para que reexecuções da página
+    não recalculem nem salvem de novo o mesmo cálculo.
+    """
+    
+    def __init__(self, max_resultados: int = 8):
+        self.max_resultados = max_resultados
+        self._entradas: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, impressao: str) -> Optional[ResultadoCalculoGeral]:
+        """Resultado armazenado para a impressão digital (marca como usado)"""
+        with self._lock:
+            entrada = self._entradas.get(impressao)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(impressao)
+            return entrada[0]
+    
+    def put(self, impressao: str, resultado: ResultadoCalculoGeral):
+        """Armazena o resultado, descartando o menos usado se o limite for excedido"""
+        resultado.impressao_digital = impressao
+        with self._lock:
+            self._entradas[impressao] = [resultado, None]
+            self._entradas.move_to_end(impressao)
+            while len(self._entradas) > self.max_resultados:
+                self._entradas.popitem(last=False)
+    
+    def obter_ou_calcular(self, impressao: str,
+                          calcular: Callable[[], ResultadoCalculoGeral]) -> Tuple[ResultadoCalculoGeral, bool]:
+        """Resultado armazenado ou recém-calculado, e se foi calculado agora"""
+        resultado = self.get(impressao)
+        if resultado is not None:
+            return resultado, False
+        
+        resultado = calcular()
+        self.put(impressao, resultado)
+        return resultado, True
+    
+    def get_salvamento(self, impressao: Optional[str]):
+        """ID ou Future do salvamento do resultado (None se não salvo ou se o salvamento falhou)"""
+        with self._lock:
+            entrada = self._entradas.get(impressao) if impressao else None
+            salvamento = entrada[1] if entrada else None
+        
+        if isinstance(salvamento, Future) and salvamento.done() and salvamento.exception() is not None:
+            return None
+        return salvamento
+    
+    def set_salvamento(self, impressao: Optional[str], salvamento):
+        """Registra o salvamento (ID ou Future) do resultado armazenado"""
+        with self._lock:
+            if impressao in self._entradas:
+                self._entradas[impressao][1] = salvamento
+    
+    def limpar(self):
+        """Remove todos os resultados da sessão"""
+        with self._lock:
+            self._entradas.clear()
+    
+    def __contains__(self, impressao: str) -> bool:
+        return impressao in self._entradas
+    
+    def __len__(self) -> int:
+        return len(self._entradas)
\ No newline at end of file
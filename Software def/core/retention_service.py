@@ -0,0 +1,130 @@
+"""
+Retenção do histórico de cálculos (arquivamento mensal e expurgo conforme manter_historico_dias)
+
+Uso pela linha de comando (a partir da pasta da aplicação):
+    python -m core.retention_service [--dias 365] [--lote 500]
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from utils.logger import SystemLogger
+
+class RetentionService:
+    """Expurga cálculos mais antigos que o período de histórico configurado"""
+    
+    def __init__(self, db_manager, config_manager=None, tamanho_lote: int = 500, pausa_lote: float = 0.05):
+        self.logger = SystemLogger('retention_service')
+        self.db_manager = db_manager
+        self.config_manager = config_manager
+        self.tamanho_lote = tamanho_lote
+        self.pausa_lote = pausa_lote
+        
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def executar(self, dias: Optional[int] = None, arquivar: bool = True) -> Dict[str, Any]:
+        """Arquiva meses fechados, remove cálculos expirados em lotes e devolve o espaço ao sistema"""
+        if dias is None:
+            dias = self._dias_configurados()
+        data_limite = datetime.now() - timedelta(days=dias)
+        mes_limite = data_limite.strftime('%Y-%m')
+        
+        # Meses anteriores ao corrente saem do banco principal para as partições
+        arquivados = self.db_manager.arquivar_meses_anteriores() if arquivar else {}
+        
+        total_removidos = 0
+        
+        # Partições inteiramente expiradas são descartadas de uma vez;
+        # a do mês limite é expurgada em lotes, como o banco principal
+        for particao in self.db_manager.listar_particoes(fim=mes_limite):
+            if particao['mes'] < mes_limite:
+                total_removidos += self.db_manager.remover_particao(particao['mes'])
+            else:
+                total_removidos += self._expurgar(data_limite, particao['mes'])
+        
+        total_removidos += self._expurgar(data_limite)
+        
+        paginas_liberadas = self.db_manager.incremental_vacuum() if total_removidos else 0
+        
+        self.logger.info(
+            f"Retenção de {dias} dias: {sum(arquivados.values())} cálculos arquivados, "
+            f"{total_removidos} removidos, {paginas_liberadas} páginas liberadas"
+        )
+        
+        return {
+            'data_limite': data_limite,
+            'meses_arquivados': arquivados,
+            'calculos_removidos': total_removidos,
+            'paginas_liberadas': paginas_liberadas
+        }
+    
+    def _expurgar(self, data_limite: datetime, mes: Optional[str] = None) -> int:
+        """Remove em lotes os cálculos anteriores à data limite (banco principal ou partição)"""
+        total_removidos = 0
+        while not self._parar.is_set():
+            removidos = self.db_manager.delete_calculos_anteriores(data_limite, self.tamanho_lote, mes)
+            total_removidos += removidos
+            
+            if removidos < self.tamanho_lote:
+                break
+            
+            # Pausa entre lotes para dar vez aos demais escritores
+            time.sleep(self.pausa_lote)
+        
+        return total_removidos
+    
+    def start_scheduler(self, intervalo_horas: float = 24.0):
+        """Executa a retenção periodicamente em uma thread de fundo"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._parar.clear()
+        
+        def _loop():
+            while not self._parar.is_set():
+                try:
+                    self.executar()
+                except Exception as e:
+                    self.logger.error(f"Erro na execução agendada da retenção: {e}")
+                self._parar.wait(intervalo_horas * 3600)
+        
+        self._thread = threading.Thread(target=_loop, name='retention-scheduler', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Retenção agendada a cada {intervalo_horas} horas")
+    
+    def stop_scheduler(self, timeout: Optional[float] = 5.0):
+        """Interrompe a execução agendada"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def _dias_configurados(self) -> int:
+        """Período de retenção definido em UserConfig.manter_historico_dias"""
+        if self.config_manager:
+            return self.config_manager.get_config_value("default", "manter_historico_dias", 365)
+        return self.db_manager.get_user_config().manter_historico_dias
+
+def main():
+    """Ponto de entrada da linha de comando"""
+    parser = argparse.ArgumentParser(description="Expurga cálculos fora do período de retenção")
+    parser.add_argument('--dias', type=int, help="Dias de histórico a manter (padrão: configuração do usuário)")
+    parser.add_argument('--lote', type=int, default=500, help="Cálculos removidos por transação")
+    parser.add_argument('--sem-arquivar', action='store_true', help="Não move meses fechados para as partições")
+    args = parser.parse_args()
+    
+    from core.database_manager import DatabaseManager
+    
+    service = RetentionService(DatabaseManager(), tamanho_lote=args.lote)
+    resultado = service.executar(args.dias, arquivar=not args.sem_arquivar)
+    
+    print(
+        f"{resultado['calculos_removidos']} cálculos anteriores a "
+        f"{resultado['data_limite']:%d/%m/%Y} removidos; "
+        f"{resultado['paginas_liberadas']} páginas liberadas"
+    )
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
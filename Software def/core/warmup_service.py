@@ -0,0 +1,127 @@
+"""
+Aquecimento dos serviços na inicialização, em segundo plano
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import SystemLogger
+
+# NFe mínima (um item com IPI e transporte) para exercitar o parser e o cálculo
+XML_AQUECIMENTO = b"""<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
+  <NFe>
+    <infNFe Id="NFe00000000000000000000550000000000000000000000" versao="4.00">
+      <ide><dhEmi>2025-01-01T00:00:00-03:00</dhEmi></ide>
+      <emit><CNPJ>00000000000000</CNPJ><xNome>Aquecimento</xNome></emit>
+      <dest><CNPJ>00000000000000</CNPJ><xNome>Aquecimento</xNome></dest>
+      <det nItem="1">
+        <prod>
+          <cProd>1</cProd><xProd>Item de aquecimento</xProd><NCM>22021000</NCM>
+          <qCom>1.0000</qCom><vUnCom>1.00</vUnCom><vProd>1.00</vProd>
+        </prod>
+        <imposto><IPI><IPITrib><vIPI>0.00</vIPI></IPITrib></IPI></imposto>
+      </det>
+      <total><ICMSTot><vProd>1.00</vProd><vFrete>0.00</vFrete><vNF>1.00</vNF></ICMSTot></total>
+      <transp><modFrete>9</modFrete></transp>
+    </infNFe>
+  </NFe>
+</nfeProc>"""
+
+class WarmupService:
+    """Executa em segundo plano as cargas que o primeiro acesso pagaria
+    
+    Etapas, em ordem: banco (esquema, contadores e catálogo de partições),
+    figuras (snapshot em memória do calculador), xml (parser e cálculo de
+    uma NFe de exemplo, sem salvar) e dashboard (métricas da página
+    inicial). Falha em uma etapa não interrompe as demais; o relatório
+    indica o que ficou pronto e quanto cada etapa levou.
+    """
+    
+    def __init__(self, db_manager, icms_calculator, dashboard_service=None):
+        self.logger = SystemLogger('warmup_service')
+        self.db_manager = db_manager
+        self.icms_calculator = icms_calculator
+        self.dashboard_service = dashboard_service
+        
+        self._etapas: List[Dict[str, Any]] = []
+        self._duracao_ms: Optional[float] = None
+        self._pronto = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def pronto(self) -> bool:
+        """Indica se o aquecimento terminou (com ou sem falhas)"""
+        return self._pronto.is_set()
+    
+    def start(self):
+        """Inicia o aquecimento em uma thread daemon (uma vez)"""
+        with self._lock:
+            if self.pronto or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self.executar, name='aquecimento', daemon=True)
+            self._thread.start()
+    
+    def aguardar(self, timeout: Optional[float] = None) -> bool:
+        """Espera o fim do aquecimento; retorna se terminou dentro do prazo"""
+        return self._pronto.wait(timeout)
+    
+    def executar(self) -> Dict[str, Any]:
+        """Executa as etapas na thread atual e retorna o relatório"""
+        inicio = time.perf_counter()
+        
+        for nome, etapa in self._etapas_configuradas():
+            inicio_etapa = time.perf_counter()
+            registro: Dict[str, Any] = {'etapa': nome}
+            try:
+                registro.update(ok=True, detalhe=etapa())
+            except Exception as e:
+                self.logger.error(f"Erro no aquecimento ({nome}): {e}")
+                registro.update(ok=False, detalhe=str(e))
+            registro['duracao_ms'] = (time.perf_counter() - inicio_etapa) * 1000
+            self._etapas.append(registro)
+        
+        self._duracao_ms = (time.perf_counter() - inicio) * 1000
+        self._pronto.set()
+        
+        falhas = [registro['etapa'] for registro in self._etapas if not registro['ok']]
+        self.logger.info(
+            f"Aquecimento concluído em {self._duracao_ms:.0f} ms"
+            + (f" (falhas: {', '.join(falhas)})" if falhas else "")
+        )
+        return self.relatorio()
+    
+    def relatorio(self) -> Dict[str, Any]:
+        """Situação do aquecimento: pronto, duração total e resultado de cada etapa"""
+        return {
+            'pronto': self.pronto,
+            'duracao_ms': self._duracao_ms,
+            'etapas': [dict(registro) for registro in self._etapas]
+        }
+    
+    def resumo(self) -> str:
+        """Uma linha para a interface com a situação do aquecimento"""
+        if not self.pronto:
+            return "⏳ Preparando serviços..."
+        
+        falhas = [registro['etapa'] for registro in self._etapas if not registro['ok']]
+        if falhas:
+            return f"⚠️ Serviços prontos com falhas no aquecimento: {', '.join(falhas)}"
+        return f"✅ Serviços prontos (aquecimento em {self._duracao_ms:.0f} ms)"
+    
+    def _etapas_configuradas(self) -> List[Tuple[str, Callable[[], str]]]:
+        """Etapas (nome, função que devolve o detalhe) conforme os serviços disponíveis"""
+        etapas = [
+            ('banco', lambda: f"{self.db_manager.aquecer()} objetos no esquema"),
+            ('figuras', lambda: f"{len(self.icms_calculator.carregar_figuras())} NCMs em memória"),
+            ('xml', self._aquecer_xml)
+        ]
+        if self.dashboard_service is not None:
+            etapas.append(('dashboard', lambda: f"{len(self.dashboard_service.get_metricas())} métricas"))
+        return etapas
+    
+    def _aquecer_xml(self) -> str:
+        """Processa e calcula a NFe de exemplo (parser, caminhos XPath e cálculo)"""
+        resultado = self.icms_calculator.calcular_icms_st_xml(XML_AQUECIMENTO)
+        return f"{resultado.total_itens} item calculado"
\ No newline at end of file
@@ -4,6 +4,7 @@ Processador de arquivos XML de NFe
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Any, Optional
 from decimal import Decimal
+from datetime import date
 
 from models.nota_fiscal import ItemNFe
 from utils.logger import SystemLogger
@@ -56,6 +57,11 @@ class XMLProcessor:
             inf_nfe = root.find('.//nfe:infNFe', ns)
             chave_nfe = inf_nfe.get('Id')[3:] if inf_nfe is not None else None
             
+            # Data de emissão (dhEmi na versão 3.10+, dEmi nas anteriores)
+            ide = root.find('.//nfe:ide', ns)
+            emissao = self._get_text(ide, 'nfe:dhEmi', ns) or self._get_text(ide, 'nfe:dEmi', ns)
+            data_emissao = date.fromisoformat(emissao[:10]) if emissao else None
+            
             # Dados do emitente
             emit = root.find('.//nfe:emit', ns)
             emitente = {
@@ -81,6 +87,7 @@ class XMLProcessor:
             
             return {
                 'chave_nfe': chave_nfe,
+                'data_emissao': data_emissao,
                 'emitente': emitente,
                 'destinatario': destinatario,
                 'totais': totais
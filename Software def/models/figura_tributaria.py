@@ -2,8 +2,8 @@
 Modelo para Figura Tributária
 """
 from dataclasses import dataclass
-from typing import Optional
-from datetime import datetime
+from typing import Optional, Union
+from datetime import date, datetime
 
 @dataclass
 class FiguraTributaria:
@@ -22,6 +22,9 @@ class FiguraTributaria:
     ativo: bool = True
     data_criacao: Optional[datetime] = None
     data_atualizacao: Optional[datetime] = None
+    vigencia_inicio: Optional[date] = None
+    vigencia_fim: Optional[date] = None  # exclusivo; None = vigente
+    versao_id: Optional[int] = None
     
     def __post_init__(self):
         if self.data_criacao is None:
@@ -29,6 +32,14 @@ class FiguraTributaria:
         if self.data_atualizacao is None:
             self.data_atualizacao = datetime.now()
     
+    def vigente_em(self, data: Union[date, datetime]) -> bool:
+        """Indica se esta versão da figura vale na data informada"""
+        if isinstance(data, datetime):
+            data = data.date()
+        if self.vigencia_inicio and data < self.vigencia_inicio:
+            return False
+        return self.vigencia_fim is None or data < self.vigencia_fim
+    
     def validar(self) -> list:
         """Valida a figura tributária e retorna lista de erros"""
         erros = []
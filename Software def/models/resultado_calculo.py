@@ -1,8 +1,8 @@
 """
 Modelos para resultados de cálculo
 """
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 @dataclass
@@ -24,6 +24,7 @@ class ResultadoCalculoItem:
     mva_ajustado: float = 0.0
     reducao_bc_st: float = 0.0
     reducao_bc_proprio: float = 0.0
+    figura_versao_id: Optional[int] = None  # versão da figura usada no cálculo
     
     # Cálculos ICMS ST
     base_calculo_st: float = 0.0
@@ -62,6 +63,16 @@ class ResultadoCalculoGeral:
     total_icms_proprio_credito: float = 0.0
     total_frete_por_fora: float = 0.0
     
+    # Emitente da NFe (cálculos via XML)
+    cnpj_emitente: Optional[str] = None
+    nome_emitente: Optional[str] = None
+    
+    # Hash das entradas do cálculo (XML, frete, versão das figuras); torna o salvamento idempotente
+    impressao_digital: Optional[str] = None
+    
+    # Tabela colunar dos itens, construída sob demanda por to_frame()
+    _frame: Any = field(default=None, init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         # Calcular totais dos novos campos
         self.total_icms_st_debito = sum(item.valor_icms_st_debito for item in self.detalhes_itens)
@@ -70,4 +81,61 @@ class ResultadoCalculoGeral:
         
         # Para compatibilidade
         if self.total_icms_st == 0.0:
-            self.total_icms_st = sum(item.valor_icms_st_recolher for item in self.detalhes_itens)
\ No newline at end of file
+            self.total_icms_st = sum(item.valor_icms_st_recolher for item in self.detalhes_itens)
+    
+    def to_frame(self):
+        """Itens em um DataFrame (uma coluna por campo do item), construído uma única vez
+        
+        O DataFrame é compartilhado por tela, resumos e estatísticas e deve
+        ser tratado como somente leitura. Observações vêm unidas por "; ".
+        """
+        if self._frame is not None and len(self._frame) == len(self.detalhes_itens):
+            return self._frame
+        
+        import pandas as pd
+        
+        campos = [f.name for f in fields(ResultadoCalculoItem)]
+        colunas: Dict[str, list] = {campo: [] for campo in campos}
+        
+        for item in self.detalhes_itens:
+            for campo in campos:
+                colunas[campo].append(getattr(item, campo))
+        
+        colunas['observacoes'] = ["; ".join(obs) if obs else "" for obs in colunas['observacoes']]
+        
+        frame = pd.DataFrame(colunas, columns=campos)
+        frame['figura_versao_id'] = frame['figura_versao_id'].astype('Int64')
+        self._frame = frame
+        return frame
+    
+    def resumo_por_ncm(self):
+        """Totais por NCM: itens, quantidade, valor total, ICMS ST e participação no valor"""
+        resumo = self.to_frame().groupby('ncm', sort=False).agg(
+            itens=('codigo_item', 'size'),
+            quantidade=('quantidade', 'sum'),
+            valor_total=('valor_total', 'sum'),
+            icms_st=('valor_icms_st_recolher', 'sum')
+        ).reset_index()
+        
+        total = self.total_valor_produtos or resumo['valor_total'].sum()
+        resumo['participacao'] = resumo['valor_total'] / total * 100 if total else 0.0
+        return resumo
+    
+    def get_estatisticas(self) -> Dict[str, Any]:
+        """Contagens e percentuais dos itens, derivados do DataFrame"""
+        frame = self.to_frame()
+        total = len(frame)
+        
+        com_figura = int(frame['possui_figura'].sum()) if total else 0
+        com_st = int((frame['valor_icms_st_recolher'] > 0).sum()) if total else 0
+        
+        return {
+            'total_itens': total,
+            'itens_com_figura': com_figura,
+            'itens_sem_figura': total - com_figura,
+            'itens_com_st': com_st,
+            'itens_sem_st': total - com_st,
+            'percentual_com_figura': com_figura / total * 100 if total else 0.0,
+            'percentual_com_st': com_st / total * 100 if total else 0.0,
+            'valor_medio_item': self.total_valor_produtos / total if total else 0.0
+        }
\ No newline at end of file
@@ -1,13 +1,50 @@
 """
 Interface de cálculo de ICMS ST
 """
+import os
+import tempfile
 import streamlit as st
-import pandas as pd
-import io
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import Optional
 from models.resultado_calculo import ResultadoCalculoGeral
-from components.exports import export_to_excel
-from components.charts import show_estatisticas_calculo
+from core.result_store import ResultStore, impressao_calculo
+
+# Fragmentos: interações dentro deles reexecutam só o trecho, não a página
+_fragmento = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda funcao: funcao)
+
+# Colunas da tabela de itens: campo do DataFrame do resultado -> configuração
+COLUNAS_TABELA_ITENS = {
+    'codigo_item': st.column_config.TextColumn("Código"),
+    'descricao': st.column_config.TextColumn("Descrição", width="large"),
+    'ncm': st.column_config.TextColumn("NCM"),
+    'quantidade': st.column_config.NumberColumn("Qtd", format="%.2f"),
+    'valor_unitario': st.column_config.NumberColumn("Vlr Unit", format="R$ %.2f"),
+    'valor_total': st.column_config.NumberColumn("Vlr Total", format="R$ %.2f"),
+    'valor_icms_st_recolher': st.column_config.NumberColumn("ICMS ST", format="R$ %.2f"),
+    'valor_custo_final': st.column_config.NumberColumn("Custo Final", format="R$ %.2f"),
+    'possui_figura': st.column_config.CheckboxColumn("Possui Figura"),
+    'observacoes': st.column_config.TextColumn("Observações")
+}
+
+# Opções de paginação da tabela de itens
+ITENS_POR_PAGINA = [50, 100, 250, 500]
+
+# Acima deste número de itens, as seções de análise começam recolhidas
+LIMITE_SECOES_AUTOMATICAS = 500
+
+# Colunas da grade de itens do cálculo em lote
+COLUNAS_GRADE_ITENS = {
+    'codigo': st.column_config.TextColumn("Código*"),
+    'descricao': st.column_config.TextColumn("Descrição*", width="large"),
+    'ncm': st.column_config.TextColumn("NCM*", help="8 dígitos"),
+    'quantidade': st.column_config.NumberColumn("Quantidade*", min_value=0.0, format="%.2f"),
+    'valor_unitario': st.column_config.NumberColumn("Valor Unitário*", min_value=0.0, format="R$ %.2f"),
+    'valor_ipi': st.column_config.NumberColumn("IPI", min_value=0.0, format="R$ %.2f"),
+    'valor_frete': st.column_config.NumberColumn("Frete", min_value=0.0, format="R$ %.2f")
+}
+
+# Cálculos salvos listados por página na busca
+CALCULOS_POR_PAGINA = 20
 
 def show_calculo_icms(services):
     """Exibe a interface de cálculo de ICMS ST"""
@@ -29,6 +66,11 @@ def show_calculo_manual(services):
     """Interface para cálculo manual"""
     st.subheader("📝 Cálculo Manual")
     
+    modo = st.radio("Entrada", ["Item único", "Vários itens (pedido)"], horizontal=True, key="modo_calculo_manual")
+    if modo != "Item único":
+        show_calculo_em_lote(services)
+        return
+    
     # Formulário para entrada de dados
     with st.form("calculo_manual"):
         col1, col2 = st.columns(2)
@@ -46,34 +88,237 @@ def show_calculo_manual(services):
             frete_por_fora = st.number_input("Frete por Fora (R$)", min_value=0.0, value=0.0, step=0.01)
         
         submitted = st.form_submit_button("🧮 Calcular ICMS ST", type="primary")
-        
+    
+    # Validar dados
+    if not all([codigo, descricao, ncm]):
         if submitted:
+            st.error("Preencha todos os campos obrigatórios (*)")
+        return
+    
+    try:
+        # Preparar dados para cálculo
+        dados_item = {
+            'codigo': codigo,
+            'descricao': descricao,
+            'ncm': ncm,
+            'quantidade': quantidade,
+            'valor_unitario': valor_unitario,
+            'valor_ipi': valor_ipi,
+            'valor_frete': valor_frete
+        }
+        
+        # Calcular ICMS ST (ou reaproveitar o resultado das mesmas entradas)
+        icms_calculator = services['icms_calculator']
+        resultado = get_resultado_sessao(
+            services, ('MANUAL', sorted(dados_item.items()), frete_por_fora),
+            lambda: icms_calculator.calcular_icms_st_manual([dados_item], frete_por_fora),
+            calcular=submitted
+        )
+        
+        # Exibir resultados
+        if resultado:
+            show_resultado_calculo(resultado, services)
+    
+    except Exception as e:
+        st.error(f"Erro no cálculo: {e}")
+
+def show_calculo_em_lote(services):
+    """Pedido inteiro em uma grade editável, preenchida à mão, colada ou carregada de planilha"""
+    # pandas e o importador só são carregados quando a grade é aberta
+    import pandas as pd
+    from core.item_importer import COLUNAS_ITENS_MANUAIS, itens_validos, ler_planilha, ler_texto_colado, validar_itens
+    
+    if 'itens_lote' not in st.session_state:
+        st.session_state['itens_lote'] = _grade_itens(pd.DataFrame(columns=list(COLUNAS_ITENS_MANUAIS)))
+        st.session_state['itens_lote_versao'] = 0
+    
+    with st.expander("📥 Carregar itens de planilha", expanded=False):
+        arquivo = st.file_uploader(
+            "Planilha CSV ou XLSX", type=['csv', 'xlsx'], key="lote_arquivo",
+            help="Colunas: código, descrição, NCM, quantidade, valor unitário, IPI e frete (opcionais)"
+        )
+        texto = st.text_area("Ou cole as linhas copiadas da planilha (com o cabeçalho)", height=120, key="lote_texto")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            carregar = st.button("📋 Carregar na grade", use_container_width=True)
+        with col2:
+            limpar = st.button("🗑️ Limpar grade", use_container_width=True)
+        
+        if carregar and (arquivo is not None or texto.strip()):
             try:
-                # Validar dados
-                if not all([codigo, descricao, ncm]):
-                    st.error("Preencha todos os campos obrigatórios (*)")
-                    return
-                
-                # Preparar dados para cálculo
-                dados_item = {
-                    'codigo': codigo,
-                    'descricao': descricao,
-                    'ncm': ncm,
-                    'quantidade': quantidade,
-                    'valor_unitario': valor_unitario,
-                    'valor_ipi': valor_ipi,
-                    'valor_frete': valor_frete
-                }
-                
-                # Calcular ICMS ST
-                icms_calculator = services['icms_calculator']
-                resultado = icms_calculator.calcular_icms_st_manual([dados_item], frete_por_fora)
-                
-                # Exibir resultados
-                show_resultado_calculo(resultado, services)
+                carregados = []
+                if arquivo is not None:
+                    carregados.append(ler_planilha(arquivo.getvalue(), arquivo.name))
+                if texto.strip():
+                    carregados.append(ler_texto_colado(texto))
                 
+                # Valores convertidos (ex.: "1.234,56") vão para a grade; inválidos ficam vazios
+                st.session_state['itens_lote'] = _grade_itens(
+                    validar_itens(pd.concat(carregados, ignore_index=True))
+                )
+                st.session_state['itens_lote_versao'] += 1
             except Exception as e:
-                st.error(f"Erro no cálculo: {e}")
+                st.error(f"Não foi possível ler os itens: {e}")
+        
+        if limpar:
+            st.session_state['itens_lote'] = _grade_itens(pd.DataFrame(columns=list(COLUNAS_ITENS_MANUAIS)))
+            st.session_state['itens_lote_versao'] += 1
+    
+    show_importacao_planilha(services)
+    
+    # Nova versão da grade a cada carga: a edição em andamento é descartada
+    editados = st.data_editor(
+        st.session_state['itens_lote'],
+        column_config=COLUNAS_GRADE_ITENS,
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        key=f"grade_lote_{st.session_state['itens_lote_versao']}"
+    )
+    
+    # Validação de todas as linhas de uma vez
+    itens = validar_itens(editados)
+    validos = itens_validos(itens)
+    com_erro = itens[itens['erro'] != '']
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Linhas", len(itens))
+    col2.metric("Válidas", len(validos))
+    col3.metric("Com erro", len(com_erro))
+    
+    if not com_erro.empty:
+        st.warning(f"⚠️ {len(com_erro)} linha(s) com erro ficam fora do cálculo até serem corrigidas")
+        st.dataframe(
+            com_erro[['linha', 'codigo', 'descricao', 'erro']],
+            column_config={
+                'linha': st.column_config.NumberColumn("Linha", format="%d"),
+                'codigo': "Código",
+                'descricao': "Descrição",
+                'erro': st.column_config.TextColumn("Erro", width="large")
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    frete_por_fora = st.number_input("Frete por Fora (R$)", min_value=0.0, value=0.0, step=0.01, key="lote_frete")
+    calcular = st.button("🧮 Calcular Pedido", type="primary", disabled=validos.empty)
+    
+    if validos.empty:
+        return
+    
+    try:
+        # Todo o pedido em uma chamada (ou o resultado das mesmas linhas já calculado)
+        icms_calculator = services['icms_calculator']
+        colunas = list(COLUNAS_ITENS_MANUAIS)
+        resultado = get_resultado_sessao(
+            services, ('LOTE', validos[colunas].to_csv(index=False).encode('utf-8'), frete_por_fora),
+            lambda: icms_calculator.calcular_icms_st_tabela(validos, frete_por_fora),
+            calcular=calcular
+        )
+        
+        if resultado:
+            show_resultado_calculo(resultado, services)
+    
+    except Exception as e:
+        st.error(f"Erro no cálculo: {e}")
+
+def show_importacao_planilha(services):
+    """Planilhas grandes: calculadas em lotes direto para um arquivo, sem passar pela grade"""
+    with st.expander("📦 Planilha grande (exportação do ERP)", expanded=False):
+        st.caption(
+            "Os itens são lidos, validados e calculados em lotes, com memória constante. "
+            "O resultado vai para um arquivo (não é salvo no histórico) e o frete por fora não se aplica."
+        )
+        
+        arquivo = st.file_uploader("Planilha CSV ou XLSX", type=['csv', 'xlsx'], key="importacao_arquivo")
+        formato = st.selectbox(
+            "Formato do resultado", ['csv', 'xlsx'], key="importacao_formato",
+            format_func=lambda f: "CSV" if f == 'csv' else "Excel"
+        )
+        
+        if arquivo is not None and st.button("⚙️ Calcular planilha", key="importacao_calcular"):
+            from core.item_importer import ImportadorPlanilha
+            
+            _descartar_importacao()
+            descritor, caminho = tempfile.mkstemp(suffix=f".{formato}")
+            os.close(descritor)
+            
+            with st.status("Calculando planilha...") as status:
+                try:
+                    resumo = ImportadorPlanilha(services['icms_calculator']).calcular(
+                        arquivo, arquivo.name, caminho, formato,
+                        progresso=lambda linhas: status.update(label=f"Calculando planilha... {linhas} linhas")
+                    )
+                    st.session_state['importacao_planilha'] = {
+                        'resumo': resumo, 'caminho': caminho, 'formato': formato, 'nome': arquivo.name
+                    }
+                    status.update(label="Planilha calculada", state="complete")
+                except Exception as e:
+                    os.unlink(caminho)
+                    status.update(label="Falha no cálculo da planilha", state="error")
+                    st.error(f"Erro no cálculo da planilha: {e}")
+        
+        importacao = st.session_state.get('importacao_planilha')
+        if not importacao or not os.path.exists(importacao['caminho']):
+            return
+        
+        import pandas as pd
+        
+        resumo = importacao['resumo']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Linhas", resumo['linhas'])
+        col2.metric("Itens Calculados", resumo['itens_calculados'])
+        col3.metric("Com Erro", resumo['linhas_com_erro'])
+        col4.metric("ICMS ST Total", f"R$ {resumo['total_icms_st']:,.2f}")
+        
+        if resumo['erros']:
+            if resumo['linhas_com_erro'] > len(resumo['erros']):
+                st.caption(f"Exibindo as primeiras {len(resumo['erros'])} linhas com erro")
+            st.dataframe(
+                pd.DataFrame(resumo['erros']),
+                column_config={
+                    'linha': st.column_config.NumberColumn("Linha", format="%d"),
+                    'codigo': "Código",
+                    'descricao': "Descrição",
+                    'erro': st.column_config.TextColumn("Erro", width="large")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        
+        from core.export_service import FORMATOS_EXPORTACAO
+        
+        def _conteudo():
+            with open(importacao['caminho'], 'rb') as arquivo_resultado:
+                return arquivo_resultado.read()
+        
+        st.download_button(
+            label="⬇️ Baixar Resultado",
+            data=_conteudo,
+            file_name=f"{os.path.splitext(importacao['nome'])[0]}_icms_st.{importacao['formato']}",
+            mime=FORMATOS_EXPORTACAO[importacao['formato']],
+            on_click="ignore",
+            type="primary"
+        )
+
+def _descartar_importacao():
+    """Remove o arquivo da importação anterior da sessão"""
+    importacao = st.session_state.pop('importacao_planilha', None)
+    if importacao and os.path.exists(importacao['caminho']):
+        os.unlink(importacao['caminho'])
+
+def _grade_itens(itens):
+    """Itens nas colunas e tipos da grade editável (texto e números)"""
+    import pandas as pd
+    from core.item_importer import COLUNAS_ITENS_MANUAIS
+    
+    grade = itens.reindex(columns=list(COLUNAS_ITENS_MANUAIS))
+    for coluna in ('codigo', 'descricao', 'ncm'):
+        grade[coluna] = grade[coluna].astype('string')
+    for coluna in ('quantidade', 'valor_unitario', 'valor_ipi', 'valor_frete'):
+        grade[coluna] = pd.to_numeric(grade[coluna], errors='coerce').astype(float)
+    return grade.reset_index(drop=True)
 
 def show_upload_xml(services):
     """Interface para upload de XML"""
@@ -105,68 +350,235 @@ def show_upload_xml(services):
                 value=True,
                 help="Se desmarcado, usará MVA padrão para itens sem figura"
             )
+            
+            usar_data_emissao = st.checkbox(
+                "Usar figuras vigentes na emissão da NFe",
+                value=False,
+                help="Recalcula com o MVA e as alíquotas vigentes na data de emissão"
+            )
         
-        if st.button("🧮 Processar XML e Calcular", type="primary"):
-            try:
-                # Ler conteúdo do arquivo
-                xml_content = uploaded_file.read()
-                
-                # Processar XML e calcular
-                icms_calculator = services['icms_calculator']
-                resultado = icms_calculator.calcular_icms_st_xml(xml_content, frete_por_fora)
-                
-                # Exibir resultados
+        processar = st.button("🧮 Processar XML e Calcular", type="primary")
+        
+        try:
+            # Ler conteúdo do arquivo
+            xml_content = uploaded_file.getvalue()
+            
+            # Processar XML e calcular (ou reaproveitar o resultado das mesmas entradas)
+            icms_calculator = services['icms_calculator']
+            resultado = get_resultado_sessao(
+                services, ('XML', xml_content, frete_por_fora, usar_data_emissao),
+                lambda: icms_calculator.calcular_icms_st_xml(
+                    xml_content, frete_por_fora, usar_data_emissao=usar_data_emissao
+                ),
+                calcular=processar
+            )
+            
+            # Exibir resultados
+            if resultado:
                 show_resultado_calculo(resultado, services)
-                
-            except Exception as e:
-                st.error(f"Erro no processamento do XML: {e}")
+        
+        except Exception as e:
+            st.error(f"Erro no processamento do XML: {e}")
+
+def get_result_store() -> ResultStore:
+    """Resultados calculados nesta sessão"""
+    if 'result_store' not in st.session_state:
+        st.session_state['result_store'] = ResultStore()
+    return st.session_state['result_store']
+
+def get_resultado_sessao(services, entradas: tuple, calcular_resultado, calcular: bool = True):
+    """Resultado das entradas já calculado na sessão ou, se `calcular`, calculado agora
+    
+    A impressão digital combina as entradas com a versão das figuras
+    tributárias (um cadastro novo invalida os resultados armazenados) e,
+    nas entradas manuais, com o dia do cálculo.
+    """
+    impressao = impressao_calculo(*entradas, versao_figuras=services['db_manager'].get_versao_figuras())
+    store = get_result_store()
+    
+    if not calcular:
+        return store.get(impressao)
+    
+    resultado, _ = store.obter_ou_calcular(impressao, calcular_resultado)
+    return resultado
 
 def show_calculo_por_nfe(services):
     """Interface para cálculo por NFe existente"""
     st.subheader("📋 Cálculo por NFe Existente")
-    st.info("Funcionalidade em desenvolvimento - Permitirá selecionar NFes já importadas")
+    
+    db_manager = services['db_manager']
+    hoje = date.today()
+    
+    # Busca no servidor: só a página de cabeçalhos vem do banco
+    with st.form("busca_calculos"):
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            chave = st.text_input("Chave da NFe", help="Chave completa ou parte dela")
+        
+        with col2:
+            periodo = st.date_input("Período", value=(hoje - timedelta(days=30), hoje), format="DD/MM/YYYY")
+        
+        with col3:
+            cnpj_emitente = st.text_input("CNPJ do emitente")
+        
+        buscar = st.form_submit_button("🔍 Buscar Cálculos", type="primary")
+    
+    if buscar:
+        # O intervalo pode vir incompleto enquanto o usuário escolhe as datas
+        datas = list(periodo) if isinstance(periodo, (list, tuple)) else [periodo]
+        inicio, fim = (datas[0], datas[-1]) if datas else (None, None)
+        st.session_state['filtros_calculos'] = {
+            'chave_nfe': chave or None,
+            'inicio': inicio.isoformat() if inicio else None,
+            'fim': fim.isoformat() if fim else None,
+            'cnpj_emitente': cnpj_emitente or None
+        }
+        st.session_state['filtros_calculos_pagina'] = 0
+        st.session_state.pop('calculo_aberto', None)
+    
+    filtros = st.session_state.get('filtros_calculos')
+    if not filtros:
+        st.info("Informe os filtros e clique em Buscar Cálculos")
+        return
+    
+    pagina = st.session_state.get('filtros_calculos_pagina', 0)
+    
+    # Uma linha a mais indica se existe próxima página
+    calculos = db_manager.buscar_calculos(
+        limite=CALCULOS_POR_PAGINA + 1, deslocamento=pagina * CALCULOS_POR_PAGINA, **filtros
+    )
+    tem_proxima = len(calculos) > CALCULOS_POR_PAGINA
+    calculos = calculos[:CALCULOS_POR_PAGINA]
+    
+    if not calculos:
+        st.warning("Nenhum cálculo salvo encontrado para os filtros informados")
+        return
+    
+    selecao = st.dataframe(
+        calculos,
+        column_order=['data_calculo', 'origem', 'chave_nfe', 'nome_emitente', 'cnpj_emitente',
+                      'total_itens', 'total_valor_produtos', 'total_icms_st_recolher'],
+        column_config={
+            'data_calculo': "Data",
+            'origem': "Origem",
+            'chave_nfe': "Chave NFe",
+            'nome_emitente': "Emitente",
+            'cnpj_emitente': "CNPJ",
+            'total_itens': "Itens",
+            'total_valor_produtos': st.column_config.NumberColumn("Valor Produtos", format="R$ %.2f"),
+            'total_icms_st_recolher': st.column_config.NumberColumn("ICMS ST", format="R$ %.2f")
+        },
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"calculos_salvos_{pagina}"
+    )
+    
+    col_anterior, col_info, col_proxima = st.columns([1, 3, 1])
+    
+    with col_anterior:
+        if st.button("◀ Anterior", disabled=pagina == 0, use_container_width=True):
+            st.session_state['filtros_calculos_pagina'] = pagina - 1
+            st.rerun()
+    
+    with col_info:
+        st.caption(f"Página {pagina + 1} · selecione uma linha para abrir o cálculo")
+    
+    with col_proxima:
+        if st.button("Próxima ▶", disabled=not tem_proxima, use_container_width=True):
+            st.session_state['filtros_calculos_pagina'] = pagina + 1
+            st.rerun()
+    
+    if selecao.selection.rows:
+        st.session_state['calculo_aberto'] = calculos[selecao.selection.rows[0]]
+    
+    calculo = st.session_state.get('calculo_aberto')
+    if calculo:
+        st.markdown("---")
+        show_calculo_salvo(db_manager, calculo)
+
+@_fragmento
+def show_calculo_salvo(db_manager, calculo: dict):
+    """Cabeçalho do cálculo salvo e itens carregados página a página do banco"""
+    st.subheader(f"🧾 Cálculo #{calculo['id']} — {calculo['chave_nfe'] or calculo['origem']}")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total de Itens", calculo['total_itens'])
+    
+    with col2:
+        st.metric("Valor dos Produtos", f"R$ {calculo['total_valor_produtos']:,.2f}")
+    
+    with col3:
+        st.metric("ICMS ST Total", f"R$ {calculo['total_icms_st_recolher']:,.2f}")
+    
+    with col4:
+        st.metric("Custo Final Total", f"R$ {calculo['total_custo_final']:,.2f}")
+    
+    chave = f"calculo_salvo_{calculo['id']}"
+    col_tamanho, col_pagina = st.columns(2)
+    
+    with col_tamanho:
+        por_pagina = st.selectbox("Itens por página", ITENS_POR_PAGINA, key=f"{chave}_tamanho")
+    
+    total_paginas = max(1, -(-calculo['total_itens'] // por_pagina))
+    
+    with col_pagina:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1,
+                                 key=f"{chave}_pagina")
+    
+    itens = db_manager.get_itens_calculo(calculo['id'], calculo['data_calculo'], por_pagina,
+                                         (pagina - 1) * por_pagina)
+    for item in itens:
+        item['observacoes'] = item['observacoes'].replace('\n', '; ')
+    
+    st.dataframe(
+        itens,
+        column_order=list(COLUNAS_TABELA_ITENS),
+        column_config=COLUNAS_TABELA_ITENS,
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(f"Página {pagina} de {total_paginas} · {calculo['total_itens']} itens")
 
 def show_resultado_calculo(resultado: ResultadoCalculoGeral, services):
-    """Exibe os resultados do cálculo - VERSÃO COM SALVAMENTO E EXPORT AUTOMÁTICO"""
+    """Exibe os resultados do cálculo - VERSÃO COM SALVAMENTO AUTOMÁTICO E EXPORT SOB DEMANDA"""
     try:
         st.success("✅ Cálculo realizado com sucesso!")
         
         # ==========================================
         # SALVAMENTO AUTOMÁTICO NO BANCO
         # ==========================================
-        st.info("💾 Salvando automaticamente no banco de dados...")
-        
+        # Reexecuções da página reaproveitam o salvamento já feito nesta sessão
+        store = get_result_store()
+        salvamento = store.get_salvamento(resultado.impressao_digital)
         try:
-            if services and 'db_manager' in services:
+            if salvamento is not None:
+                st.info("💾 Cálculo já salvo nesta sessão")
+            elif services and services.get('persistence_service'):
+                # Gravação em segundo plano: a tela não espera pelo disco
+                future = services['persistence_service'].submit(resultado)
+                st.session_state['ultimo_salvamento'] = future
+                salvamento = future
+                st.info("💾 Cálculo enviado para salvamento automático em segundo plano")
+            elif services and 'db_manager' in services:
                 db_manager = services['db_manager']
                 if hasattr(db_manager, 'save_calculo'):
                     resultado_id = db_manager.save_calculo(resultado)
+                    salvamento = resultado_id
                     st.success(f"✅ Cálculo salvo automaticamente! ID: {resultado_id}")
                 else:
                     st.warning("⚠️ Método de salvamento não disponível")
             else:
                 st.warning("⚠️ Serviço de banco não disponível")
+            
+            store.set_salvamento(resultado.impressao_digital, salvamento)
         except Exception as e:
             st.error(f"❌ Erro no salvamento automático: {str(e)}")
         
-        # ==========================================
-        # GERAÇÃO AUTOMÁTICA DO EXCEL
-        # ==========================================
-        st.info("📊 Gerando arquivo Excel automaticamente...")
-        
-        excel_data = None
-        try:
-            from components.exports import export_to_excel
-            excel_data = export_to_excel(resultado)
-            if excel_data:
-                st.success("✅ Excel gerado automaticamente!")
-            else:
-                st.warning("⚠️ Falha na geração automática do Excel")
-        except ImportError:
-            st.error("❌ Módulo de exportação não encontrado")
-        except Exception as e:
-            st.error(f"❌ Erro na geração automática do Excel: {str(e)}")
-        
         # ==========================================
         # RESUMO GERAL
         # ==========================================
@@ -191,145 +603,24 @@ def show_resultado_calculo(resultado: ResultadoCalculoGeral, services):
         # ==========================================
         st.subheader("📋 Detalhes dos Itens")
         
-        # Converter para DataFrame
-        df_itens = []
-        for item in resultado.detalhes_itens:
-            df_itens.append({
-                'Código': item.codigo_item,
-                'Descrição': item.descricao,
-                'NCM': item.ncm,
-                'Qtd': item.quantidade,
-                'Vlr Unit': f"R$ {item.valor_unitario:.2f}",
-                'Vlr Total': f"R$ {item.valor_total:.2f}",
-                'ICMS ST': f"R$ {item.valor_icms_st_recolher:.2f}",
-                'Custo Final': f"R$ {item.valor_custo_final:.2f}",
-                'Possui Figura': "✅" if item.possui_figura else "❌",
-                'Observações': "; ".join(item.observacoes) if item.observacoes else "-"
-            })
-        
-        df = pd.DataFrame(df_itens)
-        st.dataframe(df, use_container_width=True)
+        show_tabela_itens(resultado)
         
         # ==========================================
-        # DOWNLOAD DO EXCEL (SE GERADO)
-        # ==========================================
-        if excel_data:
-            st.markdown("---")
-            st.subheader("📥 Download Disponível")
-            
-            col_download1, col_download2 = st.columns([1, 3])
-            
-            with col_download1:
-                st.download_button(
-                    label="⬇️ Download Excel",
-                    data=excel_data,
-                    file_name=f"calculo_icms_st_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="download_automatico",
-                    use_container_width=True
-                )
-            
-            with col_download2:
-                st.info("📊 Arquivo Excel pronto para download com todos os detalhes do cálculo")
-        
-        # ==========================================
-        # ESTATÍSTICAS AUTOMÁTICAS (OPCIONAL)
+        # DOWNLOAD SOB DEMANDA
         # ==========================================
         st.markdown("---")
-        st.subheader("📈 Estatísticas Automáticas")
-        
-        # Estatísticas básicas sempre visíveis
-        total_com_figura = sum(1 for item in resultado.detalhes_itens if item.possui_figura)
-        total_sem_figura = resultado.total_itens - total_com_figura
-        
-        col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
-        
-        with col_stat1:
-            st.metric("Itens com Figura", total_com_figura)
-        
-        with col_stat2:
-            st.metric("Itens sem Figura", total_sem_figura)
-        
-        with col_stat3:
-            percentual = (total_com_figura / resultado.total_itens * 100) if resultado.total_itens > 0 else 0
-            st.metric("% com Figura", f"{percentual:.1f}%")
+        st.subheader("📥 Download")
         
-        with col_stat4:
-            valor_medio = resultado.total_valor_produtos / resultado.total_itens if resultado.total_itens > 0 else 0
-            st.metric("Valor Médio/Item", f"R$ {valor_medio:.2f}")
-        
-        # ==========================================
-        # RESUMO POR NCM (AUTOMÁTICO)
-        # ==========================================
-        st.subheader("📋 Resumo por NCM")
-        
-        ncm_resumo = {}
-        for item in resultado.detalhes_itens:
-            ncm = item.ncm
-            if ncm not in ncm_resumo:
-                ncm_resumo[ncm] = {
-                    'quantidade': 0,
-                    'valor_total': 0,
-                    'icms_st': 0,
-                    'itens': 0
-                }
-            
-            ncm_resumo[ncm]['quantidade'] += item.quantidade
-            ncm_resumo[ncm]['valor_total'] += item.valor_total
-            ncm_resumo[ncm]['icms_st'] += item.valor_icms_st_recolher
-            ncm_resumo[ncm]['itens'] += 1
-        
-        df_ncm = pd.DataFrame([
-            {
-                'NCM': ncm,
-                'Qtd Itens': dados['itens'],
-                'Quantidade': f"{dados['quantidade']:.2f}",
-                'Valor Total': f"R$ {dados['valor_total']:,.2f}",
-                'ICMS ST': f"R$ {dados['icms_st']:,.2f}",
-                'Participação': f"{(dados['valor_total']/resultado.total_valor_produtos*100):.1f}%"
-            }
-            for ncm, dados in ncm_resumo.items()
-        ])
-        
-        st.dataframe(df_ncm, use_container_width=True)
-        
-        # ==========================================
-        # GRÁFICOS AUTOMÁTICOS (SE DISPONÍVEL)
-        # ==========================================
         try:
-            from components.charts import show_estatisticas_calculo
-            
-            # Checkbox para mostrar gráficos detalhados
-            if st.checkbox("📈 Mostrar Gráficos Detalhados", value=False):
-                st.markdown("---")
-                st.subheader("📈 Gráficos Detalhados")
-                show_estatisticas_calculo(resultado)
-                
-        except ImportError:
-            st.info("ℹ️ Gráficos detalhados não disponíveis (módulo não encontrado)")
+            show_downloads_resultado(resultado, services, salvamento)
         except Exception as e:
-            st.warning(f"⚠️ Erro ao carregar gráficos: {str(e)}")
+            st.error(f"❌ Erro ao preparar downloads: {str(e)}")
         
         # ==========================================
-        # INFORMAÇÕES TÉCNICAS
+        # ESTATÍSTICAS, RESUMO POR NCM E GRÁFICOS
         # ==========================================
         st.markdown("---")
-        
-        with st.expander("🔧 Informações Técnicas"):
-            st.write(f"**Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            st.write(f"**Total de Itens Processados:** {resultado.total_itens}")
-            st.write(f"**Valor Total dos Produtos:** R$ {resultado.total_valor_produtos:,.2f}")
-            st.write(f"**Total ICMS ST Calculado:** R$ {resultado.total_icms_st:,.2f}")
-            st.write(f"**Custo Final Total:** R$ {resultado.total_custo_final:,.2f}")
-            
-            # Status dos serviços
-            st.write("**Status dos Serviços:**")
-            if services:
-                for nome_servico, servico in services.items():
-                    status = "✅ Disponível" if servico else "❌ Indisponível"
-                    st.write(f"- {nome_servico}: {status}")
-            else:
-                st.write("- ❌ Nenhum serviço disponível")
+        show_analises_resultado(resultado, services)
         
         # ==========================================
         # RESUMO FINAL
@@ -342,17 +633,16 @@ def show_resultado_calculo(resultado: ResultadoCalculoGeral, services):
         with col_resumo1:
             st.info("✅ **Ações Executadas Automaticamente:**\n\n" +
                    "💾 Cálculo salvo no banco de dados\n\n" +
-                   "📊 Arquivo Excel gerado\n\n" +
                    "📈 Estatísticas calculadas\n\n" +
                    "📋 Resumos criados")
         
         with col_resumo2:
             st.info("📥 **Próximos Passos:**\n\n" +
-                   "⬇️ Faça o download do Excel\n\n" +
+                   "⬇️ Faça o download do Excel, CSV ou Parquet\n\n" +
                    "📈 Analise as estatísticas\n\n" +
                    "🔍 Verifique os detalhes por NCM\n\n" +
                    "🔄 Execute novo cálculo se necessário")
-        
+    
     except Exception as e:
         st.error(f"❌ Erro crítico na exibição: {str(e)}")
         
@@ -376,7 +666,176 @@ def show_resultado_calculo(resultado: ResultadoCalculoGeral, services):
                         st.success(f"✅ Salvamento de emergência realizado! ID: {resultado_id}")
             except Exception as save_error:
                 st.error(f"❌ Falha no salvamento de emergência: {str(save_error)}")
-            
+        
         except Exception as fallback_error:
             st.error(f"❌ Erro crítico no fallback: {str(fallback_error)}")
-            st.code(f"Detalhes: {type(fallback_error).__name__}: {str(fallback_error)}")
\ No newline at end of file
+            st.code(f"Detalhes: {type(fallback_error).__name__}: {str(fallback_error)}")
+
+@_fragmento
+def show_tabela_itens(resultado: ResultadoCalculoGeral):
+    """Tabela de itens ordenada e paginada no servidor (só a página atual vai ao navegador)"""
+    df = resultado.to_frame()
+    chave = f"itens_{resultado.data_calculo:%Y%m%d%H%M%S%f}"
+    
+    col_ordem, col_sentido, col_tamanho, col_pagina = st.columns([3, 2, 2, 2])
+    
+    with col_ordem:
+        ordenar_por = st.selectbox(
+            "Ordenar por", [None] + list(COLUNAS_TABELA_ITENS),
+            format_func=lambda campo: COLUNAS_TABELA_ITENS[campo]['label'] if campo else "Ordem da nota",
+            key=f"{chave}_ordem"
+        )
+    
+    with col_sentido:
+        decrescente = st.toggle("Decrescente", value=False, key=f"{chave}_sentido")
+    
+    with col_tamanho:
+        por_pagina = st.selectbox("Itens por página", ITENS_POR_PAGINA, key=f"{chave}_tamanho")
+    
+    total_paginas = max(1, -(-len(df) // por_pagina))
+    
+    with col_pagina:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1,
+                                 key=f"{chave}_pagina")
+    
+    inicio = (pagina - 1) * por_pagina
+    pagina_itens = _pagina_ordenada(df, ordenar_por, decrescente, inicio, por_pagina)
+    
+    st.dataframe(
+        pagina_itens[list(COLUNAS_TABELA_ITENS)],
+        column_config=COLUNAS_TABELA_ITENS,
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(f"Itens {min(inicio + 1, len(df))}–{min(inicio + por_pagina, len(df))} de {len(df)} "
+               f"· página {pagina} de {total_paginas}")
+
+def _pagina_ordenada(df, coluna: Optional[str], decrescente: bool, inicio: int, quantidade: int):
+    """Linhas de uma página do DataFrame ordenado pela coluna (None mantém a ordem da nota)"""
+    if coluna is None:
+        return df.iloc[::-1].iloc[inicio:inicio + quantidade] if decrescente else df.iloc[inicio:inicio + quantidade]
+    
+    if quantidade < len(df) and df[coluna].dtype.kind in 'fi':
+        # Colunas numéricas: seleção parcial em vez de ordenar a tabela inteira
+        selecionar = df.nlargest if decrescente else df.nsmallest
+        return selecionar(inicio + quantidade, coluna, keep='first').iloc[inicio:]
+    
+    return df.sort_values(coluna, ascending=not decrescente, kind='stable').iloc[inicio:inicio + quantidade]
+
+@_fragmento
+def show_analises_resultado(resultado: ResultadoCalculoGeral, services):
+    """Estatísticas, resumo por NCM, gráficos e informações técnicas, carregados sob demanda"""
+    st.subheader("📈 Estatísticas Automáticas")
+    
+    # Estatísticas básicas sempre visíveis
+    estatisticas = resultado.get_estatisticas()
+    
+    col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
+    
+    with col_stat1:
+        st.metric("Itens com Figura", estatisticas['itens_com_figura'])
+    
+    with col_stat2:
+        st.metric("Itens sem Figura", estatisticas['itens_sem_figura'])
+    
+    with col_stat3:
+        st.metric("% com Figura", f"{estatisticas['percentual_com_figura']:.1f}%")
+    
+    with col_stat4:
+        st.metric("Valor Médio/Item", f"R$ {estatisticas['valor_medio_item']:.2f}")
+    
+    chave = f"analises_{resultado.data_calculo:%Y%m%d%H%M%S%f}"
+    automatico = resultado.total_itens <= LIMITE_SECOES_AUTOMATICAS
+    
+    # Resumo por NCM
+    if st.toggle("📋 Resumo por NCM", value=automatico, key=f"{chave}_ncm"):
+        st.dataframe(
+            resultado.resumo_por_ncm(),
+            column_config={
+                'ncm': "NCM",
+                'itens': "Qtd Itens",
+                'quantidade': st.column_config.NumberColumn("Quantidade", format="%.2f"),
+                'valor_total': st.column_config.NumberColumn("Valor Total", format="R$ %.2f"),
+                'icms_st': st.column_config.NumberColumn("ICMS ST", format="R$ %.2f"),
+                'participacao': st.column_config.NumberColumn("Participação", format="%.1f%%")
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    # Gráficos detalhados
+    if st.toggle("📈 Mostrar Gráficos Detalhados", value=False, key=f"{chave}_graficos"):
+        try:
+            st.subheader("📈 Gráficos Detalhados")
+            # plotly e numpy só são importados quando os gráficos são pedidos
+            from components.charts import show_estatisticas_calculo
+            show_estatisticas_calculo(resultado)
+        except Exception as e:
+            st.warning(f"⚠️ Erro ao carregar gráficos: {str(e)}")
+    
+    # Informações técnicas
+    if st.toggle("🔧 Informações Técnicas", value=False, key=f"{chave}_tecnicas"):
+        st.write(f"**Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        st.write(f"**Total de Itens Processados:** {resultado.total_itens}")
+        st.write(f"**Valor Total dos Produtos:** R$ {resultado.total_valor_produtos:,.2f}")
+        st.write(f"**Total ICMS ST Calculado:** R$ {resultado.total_icms_st:,.2f}")
+        st.write(f"**Custo Final Total:** R$ {resultado.total_custo_final:,.2f}")
+        
+        # Status dos serviços
+        st.write("**Status dos Serviços:**")
+        if services:
+            for nome_servico, servico in services.items():
+                status = "✅ Disponível" if servico else "❌ Indisponível"
+                st.write(f"- {nome_servico}: {status}")
+        else:
+            st.write("- ❌ Nenhum serviço disponível")
+
+def show_downloads_resultado(resultado: ResultadoCalculoGeral, services, salvamento=None):
+    """Botões de download; o arquivo só é gerado (ou lido do cache) ao clicar"""
+    export_service = services.get('export_service') if services else None
+    if export_service is None:
+        from core.export_service import ExportService
+        export_service = ExportService(services['db_manager'])
+    
+    rotulos = {'xlsx': "⬇️ Excel", 'csv': "⬇️ CSV", 'parquet': "⬇️ Parquet"}
+    formatos = export_service.formatos_disponiveis()
+    
+    # Formato padrão do usuário primeiro
+    formato_padrao = 'xlsx'
+    if services.get('config_manager'):
+        formato_padrao = services['config_manager'].get_export_config().get('formato_padrao', 'xlsx')
+    formatos.sort(key=lambda formato: formato != formato_padrao)
+    
+    def _gerador(formato):
+        # Executado pelo Streamlit somente no clique, fora da reexecução da página
+        def _gerar():
+            return export_service.exportar(resultado, formato, _calculo_id(salvamento))
+        return _gerar
+    
+    carimbo = resultado.data_calculo.strftime('%Y%m%d_%H%M%S')
+    colunas = st.columns(len(formatos) + 1)
+    
+    for coluna, formato in zip(colunas, formatos):
+        with coluna:
+            st.download_button(
+                label=rotulos[formato],
+                data=_gerador(formato),
+                file_name=f"calculo_icms_st_{carimbo}.{formato}",
+                mime=export_service.get_mime(formato),
+                key=f"download_{formato}_{carimbo}",
+                on_click="ignore",
+                type="primary" if formato == formatos[0] else "secondary",
+                use_container_width=True
+            )
+    
+    with colunas[-1]:
+        st.caption("Arquivos gerados ao clicar e reaproveitados nos downloads seguintes")
+
+def _calculo_id(salvamento, timeout: float = 5.0):
+    """ID do cálculo salvo (aguarda o salvamento em segundo plano por até `timeout`)"""
+    if salvamento is None or isinstance(salvamento, int):
+        return salvamento
+    try:
+        return salvamento.result(timeout=timeout)
+    except Exception:
+        return None
\ No newline at end of file
@@ -371,11 +371,39 @@ def show_config_sistema(config_manager, config, services):
     with col5:
         if st.button("💾 Backup Manual", help="Realiza backup imediato"):
             try:
-                # Implementar backup manual se necessário
-                st.success("✅ Backup realizado com sucesso!")
+                backup_service = services.get('backup_service')
+                if backup_service:
+                    arquivo = backup_service.criar_backup()
+                    st.success(f"✅ Backup realizado com sucesso: {arquivo.name}")
+                else:
+                    st.error("❌ Serviço de backup não disponível")
             except Exception as e:
                 st.error(f"❌ Erro ao realizar backup: {e}")
     
+    backup_service = services.get('backup_service')
+    if backup_service:
+        with st.expander("🗂️ Backups Disponíveis"):
+            backups = backup_service.listar_backups()
+            
+            if not backups:
+                st.info("Nenhum backup encontrado")
+            
+            for arquivo in backups:
+                col_nome, col_tamanho, col_acao = st.columns([3, 1, 1])
+                
+                with col_nome:
+                    st.write(arquivo.name)
+                
+                with col_tamanho:
+                    st.write(f"{arquivo.stat().st_size / 1024:.1f} KB")
+                
+                with col_acao:
+                    if st.button("🔍 Verificar", key=f"verificar_{arquivo.name}"):
+                        if backup_service.verificar_backup(arquivo):
+                            st.success("Íntegro")
+                        else:
+                            st.error("Corrompido")
+    
     if st.button("💾 Salvar Configurações do Sistema", type="primary"):
         try:
             config.backup_automatico = backup_automatico
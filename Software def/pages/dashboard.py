@@ -4,27 +4,28 @@ Dashboard principal da aplicação
 import streamlit as st
 from datetime import datetime
 
+from core.dashboard_service import DashboardService
+
 def show_dashboard(services):
     """Exibe o dashboard principal"""
     st.header("📊 Dashboard")
     
     try:
-        db_manager = services['db_manager']
+        dashboard_service = services.get('dashboard_service') or DashboardService(services['db_manager'])
+        
+        # Estatísticas gerais (em cache até a próxima gravação no banco)
+        metricas = dashboard_service.get_metricas()
         
-        # Estatísticas gerais
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_figuras = len(db_manager.get_all_figuras_tributarias())
-            st.metric("Figuras Tributárias", total_figuras)
+            st.metric("Figuras Tributárias", metricas.get('total_figuras', 0))
         
         with col2:
-            # Placeholder para estatísticas de cálculos
-            st.metric("Cálculos Realizados", "0")
+            st.metric("Cálculos Realizados", metricas.get('total_calculos', 0))
         
         with col3:
-            # Placeholder para total ICMS ST
-            st.metric("Total ICMS ST", "R$ 0,00")
+            st.metric("Total ICMS ST", f"R$ {metricas.get('total_icms_st', 0.0):,.2f}")
         
         with col4:
             # Placeholder para economia
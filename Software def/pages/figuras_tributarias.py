@@ -3,9 +3,12 @@ Interface de gerenciamento de figuras tributárias
 """
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 from models.figura_tributaria import FiguraTributaria
 
+# Quantidade de figuras exibidas por página na listagem
+FIGURAS_POR_PAGINA = 50
+
 def show_figuras_tributarias(services):
     """Exibe a interface de figuras tributárias"""
     st.header("📋 Figuras Tributárias")
@@ -84,6 +87,12 @@ def show_cadastro_figura(services):
         
         observacoes = st.text_area("Observações")
         
+        vigencia_inicio = st.date_input(
+            "Vigente a partir de",
+            value=date.today(),
+            help="Cadastrar novamente um NCM cria uma nova versão; a anterior vale até esta data"
+        )
+        
         if st.form_submit_button("💾 Cadastrar Figura", type="primary"):
             try:
                 # Validar dados
@@ -113,7 +122,7 @@ def show_cadastro_figura(services):
                 
                 # Salvar no banco
                 db_manager = services['db_manager']
-                db_manager.save_figura_tributaria(figura)
+                db_manager.save_figura_tributaria(figura, vigencia_inicio)
                 
                 st.success("✅ Figura tributária cadastrada com sucesso!")
                 st.rerun()
@@ -127,33 +136,15 @@ def show_lista_figuras(services):
     
     try:
         db_manager = services['db_manager']
-        figuras_dict = db_manager.get_all_figuras_tributarias()
-        
-        if not figuras_dict:
-            st.info("Nenhuma figura tributária cadastrada")
-            return
-        
-        # Converter para DataFrame
-        df_data = []
-        for ncm, figura in figuras_dict.items():
-            df_data.append({
-                'NCM': figura.ncm,
-                'Descrição': figura.descricao,
-                'Tipo': 'ST' if figura.tipo_tributacao == 'st' else 'Tributado',
-                'MVA 12%': f"{figura.mva_ajustado_12:.2f}%",
-                'MVA 4%': f"{figura.mva_ajustado_4:.2f}%",
-                'Red. ST': f"{figura.reducao_bc_icms_st:.2f}%",
-                'Red. Próprio': f"{figura.reducao_bc_icms_proprio:.2f}%",
-                'Ativo': "✅" if figura.ativo else "❌"
-            })
         
-        df = pd.DataFrame(df_data)
+        # Busca textual (FTS) na descrição, ranqueada por relevância
+        busca = st.text_input("🔎 Buscar por descrição", placeholder="Ex.: cerveja lata 350")
         
-        # Filtros
+        # Filtros (aplicados no SQL)
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            filtro_ncm = st.text_input("Filtrar por NCM")
+            filtro_ncm = st.text_input("Filtrar por NCM", help="Prefixo do NCM")
         
         with col2:
             filtro_tipo = st.selectbox(
@@ -167,35 +158,88 @@ def show_lista_figuras(services):
                 ["Todos", "Ativo", "Inativo"]
             )
         
-        # Aplicar filtros
-        df_filtrado = df.copy()
-        
-        if filtro_ncm:
-            df_filtrado = df_filtrado[df_filtrado['NCM'].str.contains(filtro_ncm, case=False)]
-        
-        if filtro_tipo != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['Tipo'] == filtro_tipo]
-        
-        if filtro_ativo == "Ativo":
-            df_filtrado = df_filtrado[df_filtrado['Ativo'] == "✅"]
-        elif filtro_ativo == "Inativo":
-            df_filtrado = df_filtrado[df_filtrado['Ativo'] == "❌"]
-        
-        # Exibir tabela
-        st.dataframe(df_filtrado, use_container_width=True)
+        filtros = {
+            'ncm_prefix': ''.join(c for c in filtro_ncm if c.isdigit()) or None,
+            'tipo_tributacao': {'ST': 'st', 'Tributado': 'tributado'}.get(filtro_tipo),
+            'ativo': {'Ativo': True, 'Inativo': False}.get(filtro_ativo)
+        }
+        
+        # Paginação keyset: pilha com o último NCM de cada página visitada
+        chave_filtros = (filtros['ncm_prefix'], filtros['tipo_tributacao'], filtros['ativo'])
+        if st.session_state.get('figuras_filtros') != chave_filtros:
+            st.session_state['figuras_filtros'] = chave_filtros
+            st.session_state['figuras_cursores'] = [None]
+        
+        cursores = st.session_state['figuras_cursores']
+        tamanho_pagina = FIGURAS_POR_PAGINA
+        
+        if busca.strip():
+            figuras = db_manager.buscar_figuras(busca, limit=tamanho_pagina)
+            total_filtrado = len(figuras)
+        else:
+            total_filtrado = db_manager.count_figuras(filtros)
+            figuras = db_manager.list_figuras(after_ncm=cursores[-1], limit=tamanho_pagina, filters=filtros)
+        
+        if busca.strip() and not figuras:
+            st.info("Nenhuma figura encontrada para a busca")
+        elif busca.strip():
+            st.caption(f"{total_filtrado} figuras mais relevantes para \"{busca.strip()}\"")
+            st.dataframe(pd.DataFrame([{
+                'NCM': figura.ncm,
+                'Descrição': figura.descricao,
+                'Tipo': 'ST' if figura.tipo_tributacao == 'st' else 'Tributado',
+                'MVA 12%': f"{figura.mva_ajustado_12:.2f}%",
+                'Ativo': "✅" if figura.ativo else "❌"
+            } for figura in figuras]), use_container_width=True)
+        elif not figuras and len(cursores) == 1:
+            st.info("Nenhuma figura tributária encontrada")
+        else:
+            # Converter página atual para DataFrame
+            df = pd.DataFrame([{
+                'NCM': figura.ncm,
+                'Descrição': figura.descricao,
+                'Tipo': 'ST' if figura.tipo_tributacao == 'st' else 'Tributado',
+                'MVA 12%': f"{figura.mva_ajustado_12:.2f}%",
+                'MVA 4%': f"{figura.mva_ajustado_4:.2f}%",
+                'Red. ST': f"{figura.reducao_bc_icms_st:.2f}%",
+                'Red. Próprio': f"{figura.reducao_bc_icms_proprio:.2f}%",
+                'Ativo': "✅" if figura.ativo else "❌"
+            } for figura in figuras])
+            
+            st.dataframe(df, use_container_width=True)
+            
+            # Navegação entre páginas
+            pagina_atual = len(cursores)
+            total_paginas = max(1, -(-total_filtrado // tamanho_pagina))
+            
+            nav1, nav2, nav3 = st.columns([1, 2, 1])
+            
+            with nav1:
+                if st.button("⬅️ Anterior", disabled=pagina_atual == 1, key="figuras_anterior"):
+                    cursores.pop()
+                    st.rerun()
+            
+            with nav2:
+                st.caption(f"Página {pagina_atual} de {total_paginas} • {total_filtrado} figuras encontradas")
+            
+            with nav3:
+                tem_proxima = len(figuras) == tamanho_pagina and pagina_atual < total_paginas
+                if st.button("Próxima ➡️", disabled=not tem_proxima, key="figuras_proxima"):
+                    cursores.append(figuras[-1].ncm)
+                    st.rerun()
         
-        # Estatísticas
+        # Estatísticas (COUNT no banco)
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("Total de Figuras", len(df))
+            st.metric("Total de Figuras", db_manager.count_figuras())
         
         with col2:
-            figuras_st = len(df[df['Tipo'] == 'ST'])
+            figuras_st = db_manager.count_figuras({'tipo_tributacao': 'st'})
             st.metric("Figuras ST", figuras_st)
         
         with col3:
-            figuras_ativas = len(df[df['Ativo'] == "✅"])
+            figuras_ativas = db_manager.count_figuras({'ativo': True})
             st.metric("Figuras Ativas", figuras_ativas)
         
     except Exception as e:
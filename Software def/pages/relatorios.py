@@ -1,40 +1,170 @@
 """
 Interface de relatórios do sistema
 """
+import os
+import tempfile
+import pandas as pd
 import streamlit as st
-from datetime import datetime
+from datetime import date, datetime
+
+from core.report_service import ReportService
+
+# Relatórios disponíveis: rótulo -> método do ReportService
+RELATORIOS = {
+    "📅 Por Período": 'por_periodo',
+    "🏷️ Por NCM": 'por_ncm',
+    "🏭 Por Fornecedor": 'por_fornecedor',
+    "🔀 Por Origem": 'por_origem',
+    "🎯 Maiores Itens": 'top_itens'
+}
+
+# Colunas comuns às tabelas de relatório
+COLUNAS_RELATORIO = {
+    'periodo': st.column_config.TextColumn("Período"),
+    'ncm': st.column_config.TextColumn("NCM"),
+    'origem': st.column_config.TextColumn("Origem"),
+    'cnpj_emitente': st.column_config.TextColumn("CNPJ Emitente"),
+    'nome_emitente': st.column_config.TextColumn("Emitente", width="large"),
+    'codigo_item': st.column_config.TextColumn("Código"),
+    'descricao': st.column_config.TextColumn("Descrição", width="large"),
+    'qtd_calculos': st.column_config.NumberColumn("Cálculos", format="%d"),
+    'qtd_itens': st.column_config.NumberColumn("Itens", format="%d"),
+    'ocorrencias': st.column_config.NumberColumn("Ocorrências", format="%d"),
+    'quantidade': st.column_config.NumberColumn("Quantidade", format="%.2f"),
+    'valor_produtos': st.column_config.NumberColumn("Valor Produtos", format="R$ %.2f"),
+    'icms_st_recolher': st.column_config.NumberColumn("ICMS ST", format="R$ %.2f"),
+    'custo_final': st.column_config.NumberColumn("Custo Final", format="R$ %.2f"),
+    'carga_st': st.column_config.NumberColumn("Carga ST", format="%.2f%%")
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _relatorio(_report_service: ReportService, nome: str, versao: int, inicio: date, fim: date,
+               **parametros) -> pd.DataFrame:
+    """Relatório em cache; `versao` (contador de alterações dos cálculos) renova o cache"""
+    return pd.DataFrame(getattr(_report_service, nome)(inicio, fim, **parametros))
+
+def get_report_service(services) -> ReportService:
+    """Serviço de relatórios registrado na aplicação (ou criado sobre o db_manager)"""
+    return services.get('report_service') or ReportService(services['db_manager'])
 
 def show_relatorios(services):
     """Exibe a interface de relatórios"""
     st.header("📄 Relatórios")
-    st.info("Funcionalidade em desenvolvimento")
     
-    # Placeholder para relatórios futuros
-    st.subheader("📊 Relatórios Disponíveis")
+    report_service = get_report_service(services)
+    
+    # Padrão: os últimos 12 meses, a partir do primeiro dia do mês
+    hoje = date.today()
+    ano, mes = (hoje.year, hoje.month - 11) if hoje.month == 12 else (hoje.year - 1, hoje.month + 1)
     
     col1, col2 = st.columns(2)
+    with col1:
+        inicio = st.date_input("Data inicial", value=date(ano, mes, 1), format="DD/MM/YYYY", key="rel_inicio")
+    with col2:
+        fim = st.date_input("Data final", value=hoje, format="DD/MM/YYYY", key="rel_fim")
+    
+    if inicio > fim:
+        st.error("A data inicial deve ser anterior à data final")
+    else:
+        rotulo = st.radio("Relatório", list(RELATORIOS), horizontal=True, key="rel_tipo")
+        show_relatorio(report_service, RELATORIOS[rotulo], inicio, fim)
+    
+    st.divider()
+    show_exportacao_periodo(services)
+
+def show_relatorio(report_service: ReportService, nome: str, inicio: date, fim: date):
+    """Exibe o relatório escolhido (apenas ele é consultado)"""
+    parametros = {}
+    
+    if nome == 'por_periodo':
+        granularidade = st.radio("Agrupar por", ["mes", "dia"], horizontal=True, key="rel_granularidade",
+                                 format_func=lambda g: "Mês" if g == 'mes' else "Dia")
+        parametros['granularidade'] = granularidade
+    elif nome in ('por_ncm', 'por_fornecedor'):
+        parametros['limite'] = st.selectbox("Exibir", [20, 50, 100, 500], key="rel_limite",
+                                            format_func=lambda n: f"{n} maiores")
+    elif nome == 'top_itens':
+        parametros['n'] = st.selectbox("Exibir", [10, 20, 50, 100], index=1, key="rel_top",
+                                       format_func=lambda n: f"{n} maiores")
+    
+    with st.spinner("Gerando relatório..."):
+        dados = _relatorio(report_service, nome, report_service.versao(), inicio, fim, **parametros)
+    
+    if dados.empty:
+        st.info("Nenhum cálculo salvo no período")
+        return
+    
+    if nome == 'por_periodo':
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Cálculos", int(dados['qtd_calculos'].sum()))
+        col2.metric("Valor dos Produtos", f"R$ {dados['valor_produtos'].sum():,.2f}")
+        col3.metric("ICMS ST", f"R$ {dados['icms_st_recolher'].sum():,.2f}")
+        carga = dados['icms_st_recolher'].sum() / dados['valor_produtos'].sum() * 100 if dados['valor_produtos'].sum() else 0
+        col4.metric("Carga ST", f"{carga:.2f}%")
+        
+        st.bar_chart(dados.set_index('periodo')['icms_st_recolher'], y_label="ICMS ST (R$)", x_label="Período")
+    elif nome != 'top_itens':
+        chave = dados.columns[0]
+        st.bar_chart(dados.head(15).set_index(chave)['icms_st_recolher'], y_label="ICMS ST (R$)", horizontal=True)
+    
+    st.dataframe(
+        dados,
+        hide_index=True,
+        use_container_width=True,
+        column_config={coluna: config for coluna, config in COLUNAS_RELATORIO.items() if coluna in dados.columns}
+    )
+
+def show_exportacao_periodo(services):
+    """Exportação consolidada do histórico de cálculos por período"""
+    st.subheader("📥 Exportação do Histórico por Período")
+    
+    hoje = date.today()
+    
+    col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.info("""
-        **Relatórios Planejados:**
-        - 📈 Histórico de Cálculos
-        - 💰 Análise de ICMS ST por Período
-        - 📋 Relatório de Figuras Tributárias
-        - 🎯 Análise de Performance
-        """)
+        inicio = st.date_input("Data inicial", value=hoje.replace(day=1), format="DD/MM/YYYY", key="exp_inicio")
+        fim = st.date_input("Data final", value=hoje, format="DD/MM/YYYY", key="exp_fim")
     
     with col2:
-        st.warning("""
-        **Em Desenvolvimento:**
-        - 📊 Dashboard Executivo
-        - 📈 Gráficos Interativos
-        - 📋 Exportação Personalizada
-        - 🔍 Filtros Avançados
-        """)
-    
-    # Placeholder para funcionalidades futuras
-    st.divider()
-    st.subheader("🚧 Área de Desenvolvimento")
+        cnpj_emitente = st.text_input("CNPJ do emitente", key="exp_cnpj")
+        ncm_prefixo = st.text_input("NCM (prefixo)", help="Ex.: 2202 para todos os NCMs iniciados por 2202", key="exp_ncm")
+    
+    with col3:
+        origem = st.selectbox("Origem", ["Todas", "XML", "MANUAL"], key="exp_origem")
+        formato = st.selectbox(
+            "Formato", ["xlsx", "csv"],
+            format_func=lambda f: "Excel (resumo + uma aba por mês)" if f == 'xlsx' else "CSV",
+            key="exp_formato"
+        )
+    
+    if inicio > fim:
+        st.error("A data inicial deve ser anterior à data final")
+        return
+    
+    db_manager = services['db_manager']
+    
+    def _gerar():
+        # Executado no clique: grava em arquivo temporário e devolve o conteúdo
+        descritor, caminho = tempfile.mkstemp(suffix=f".{formato}")
+        os.close(descritor)
+        try:
+            from components.exports import export_historico_periodo
+            export_historico_periodo(
+                db_manager, caminho, inicio.isoformat(), fim.isoformat(), formato,
+                cnpj_emitente=cnpj_emitente or None, ncm_prefixo=ncm_prefixo or None,
+                origem=None if origem == "Todas" else origem
+            )
+            with open(caminho, 'rb') as arquivo:
+                return arquivo.read()
+        finally:
+            os.unlink(caminho)
     
-    if st.button("🔄 Atualizar Relatórios"):
-        st.info("Funcionalidade será implementada em versões futuras")
\ No newline at end of file
+    st.download_button(
+        label="⬇️ Exportar Histórico",
+        data=_gerar,
+        file_name=f"historico_icms_st_{inicio:%Y%m%d}_{fim:%Y%m%d}.{formato}",
+        mime="text/csv" if formato == 'csv' else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore",
+        type="primary"
+    )
\ No newline at end of file
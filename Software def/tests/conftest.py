@@ -0,0 +1,47 @@
+"""
+Fixtures dos testes: banco em memória (MemoryStorage) com calculador
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Pasta da aplicação no path, como ao rodar `streamlit run app.py`
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.storage import MemoryStorage
+from core.database_manager import DatabaseManager
+from core.icms_calculator import ICMSCalculator
+from models.figura_tributaria import FiguraTributaria
+
+@pytest.fixture
+def storage():
+    """Banco em memória descartado ao fim do teste"""
+    storage = MemoryStorage()
+    yield storage
+    storage.close()
+
+@pytest.fixture
+def db(storage):
+    """DatabaseManager sobre o banco em memória, com uma figura ST cadastrada"""
+    db = DatabaseManager(storage)
+    db.save_figura_tributaria(FiguraTributaria('22021000', 'Refrigerantes', 'st', mva_ajustado_12=40.0))
+    return db
+
+@pytest.fixture
+def calculadora(db):
+    """Calculador ligado ao banco em memória"""
+    return ICMSCalculator(db)
+
+@pytest.fixture
+def salvar(db, calculadora):
+    """Calcula e salva um cálculo manual de um item na data informada; retorna o ID"""
+    def salvar(data: datetime, valor: float = 10.0, descricao: str = 'Refrigerante lata',
+               ncm: str = '22021000') -> int:
+        resultado = calculadora.calcular_icms_st_manual([
+            {'codigo': 'A1', 'descricao': descricao, 'ncm': ncm, 'quantidade': 1, 'valor_unitario': valor}
+        ])
+        resultado.data_calculo = data
+        return db.save_calculo(resultado)
+    return salvar
\ No newline at end of file
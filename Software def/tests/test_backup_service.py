@@ -0,0 +1,94 @@
+"""
+Backups: banco e partições, verificação e restauração
+"""
+from datetime import datetime
+
+import pytest
+
+from core.backup_service import BackupService
+from utils.exceptions import DatabaseError
+
+@pytest.fixture
+def backup_service(db, tmp_path):
+    """Serviço de backup gravando em pasta temporária"""
+    return BackupService(db, diretorio=tmp_path / "backups")
+
+def test_backup_verificado_e_restaurado(db, salvar, backup_service):
+    primeiro = salvar(datetime.now(), 10.0)
+    backup = backup_service.criar_backup()
+    salvar(datetime.now(), 20.0)
+    
+    assert backup.name.endswith(BackupService.EXTENSAO)
+    assert backup_service.verificar_backup(backup)
+    assert backup_service.ultimo_backup() is not None
+    
+    assert backup_service.restaurar_backup(backup)
+    assert [calculo['id'] for calculo in db.buscar_calculos()] == [primeiro]
+    assert db.get_rollup()['valor_produtos'] == 10.0
+
+def test_backups_ficam_na_pasta_do_storage(db, storage):
+    backup = BackupService(db).criar_backup()
+    
+    assert backup.parent == storage.diretorio / "backups"
+    storage.close()
+    assert not backup.exists()
+
+def test_backup_corrompido_nao_e_restaurado(db, salvar, backup_service):
+    salvar(datetime.now(), 10.0)
+    backup = backup_service.criar_backup()
+    backup.write_bytes(b"nao e um gzip")
+    
+    assert not backup_service.verificar_backup(backup)
+    with pytest.raises(OSError):
+        backup_service.restaurar_backup(backup)
+    assert db.get_estatisticas()['total_calculos'] == 1
+
+def test_backup_inclui_particoes(db, salvar, backup_service):
+    salvar(datetime(2024, 3, 5), 10.0)
+    salvar(datetime(2024, 4, 5), 20.0)
+    db.arquivar_meses_anteriores()
+    db.comprimir_particao('2024-03')
+    
+    backup = backup_service.criar_backup()
+    
+    pasta = backup_service._pasta_particoes(backup)
+    assert sorted(arquivo.name for arquivo in pasta.iterdir()) == ['calculos_2024_03.db.gz', 'calculos_2024_04.db.gz']
+    assert backup_service.listar_backups() == [backup]
+    assert backup_service.verificar_backup(backup)
+
+def test_verificacao_falha_sem_particao(db, salvar, backup_service):
+    salvar(datetime(2024, 3, 5), 10.0)
+    db.arquivar_mes('2024-03')
+    backup = backup_service.criar_backup()
+    
+    (backup_service._pasta_particoes(backup) / 'calculos_2024_03.db.gz').unlink()
+    
+    assert not backup_service.verificar_backup(backup)
+    with pytest.raises(DatabaseError):
+        backup_service.restaurar_backup(backup)
+    assert db.listar_particoes()[0]['mes'] == '2024-03'
+
+def test_restauracao_devolve_banco_e_particoes(db, salvar, backup_service, storage):
+    id_marco = salvar(datetime(2024, 3, 5), 10.0)
+    salvar(datetime(2024, 4, 5), 20.0)
+    db.arquivar_meses_anteriores()
+    db.comprimir_particao('2024-03')
+    backup = backup_service.criar_backup()
+    
+    # Depois do backup: partições removidas e um mês novo arquivado
+    db.remover_particao('2024-03')
+    db.remover_particao('2024-04')
+    salvar(datetime(2024, 5, 5), 30.0)
+    db.arquivar_mes('2024-05')
+    
+    assert backup_service.restaurar_backup(backup)
+    
+    assert [(particao['mes'], particao['comprimido']) for particao in db.listar_particoes()] == [
+        ('2024-03', False), ('2024-04', False)
+    ]
+    assert sorted(arquivo.name for arquivo in (storage.diretorio / "historico").iterdir()) == [
+        'calculos_2024_03.db', 'calculos_2024_04.db'
+    ]
+    assert db.get_itens_calculo(id_marco, '2024-03-05')[0]['valor_total'] == 10.0
+    assert db.get_estatisticas()['total_calculos'] == 2
+    assert db.get_rollup()['valor_produtos'] == 30.0
\ No newline at end of file
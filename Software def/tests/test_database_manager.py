@@ -0,0 +1,84 @@
+"""
+Gravação e leitura de cálculos salvos
+"""
+from datetime import date, datetime
+
+from core.database_manager import DatabaseManager
+from core.result_store import impressao_calculo
+
+def test_salvar_item_com_descricao_vazia(db, calculadora):
+    resultado = calculadora.calcular_icms_st_manual([
+        {'codigo': 'A1', 'descricao': '', 'ncm': '22021000', 'quantidade': 1, 'valor_unitario': 10.0},
+        {'codigo': 'B2', 'descricao': 'Refrigerante lata', 'ncm': '22021000', 'quantidade': 2, 'valor_unitario': 5.0}
+    ])
+    resultado.data_calculo = datetime(2024, 3, 5)
+    
+    calculo_id = db.save_calculo(resultado)
+    
+    itens = db.get_itens_calculo(calculo_id, '2024-03-05')
+    assert [item['descricao'] for item in itens] == ['', 'Refrigerante lata']
+
+def test_ultimos_calculos_sem_ler_particoes(db, salvar, monkeypatch):
+    salvar(datetime(2024, 3, 5), 1.0)
+    db.arquivar_mes('2024-03')
+    for valor in range(5):
+        salvar(datetime.now(), 10.0 + valor)
+    
+    anexadas = []
+    original = db._particao_anexada
+    monkeypatch.setattr(db, '_particao_anexada',
+                        lambda conn, mes, *args, **kwargs: anexadas.append(mes) or original(conn, mes, *args, **kwargs))
+    
+    assert len(db.get_estatisticas()['ultimos_calculos']) == 5
+    assert anexadas == []
+
+def _resultado_manual(calculadora, dia: date):
+    """Cálculo manual como o da página, com a impressão digital do dia"""
+    dados = {'codigo': 'A1', 'descricao': 'Refrigerante lata', 'ncm': '22021000', 'quantidade': 1, 'valor_unitario': 10.0}
+    resultado = calculadora.calcular_icms_st_manual([dados])
+    resultado.data_calculo = datetime.combine(dia, datetime.min.time())
+    resultado.impressao_digital = impressao_calculo('MANUAL', sorted(dados.items()), 0.0, versao_figuras=1, dia=dia)
+    return resultado
+
+def test_salvamento_idempotente_apos_arquivamento(db, calculadora):
+    resultado = _resultado_manual(calculadora, date(2024, 3, 5))
+    calculo_id = db.save_calculo(resultado)
+    assert db.save_calculo(resultado) == calculo_id
+    
+    db.arquivar_mes('2024-03')
+    
+    assert db.save_calculo(resultado) == calculo_id
+    assert db.get_estatisticas()['total_calculos'] == 1
+
+def test_impressoes_de_particoes_antigas_indexadas_na_inicializacao(db, calculadora, storage):
+    resultado = _resultado_manual(calculadora, date(2024, 3, 5))
+    calculo_id = db.save_calculo(resultado)
+    db.arquivar_mes('2024-03')
+    db.comprimir_particao('2024-03')
+    
+    # Partição arquivada antes do registro de impressões digitais
+    conn = storage.connect()
+    conn.execute("DELETE FROM impressoes_arquivadas")
+    conn.execute("UPDATE particoes_historico SET impressoes_indexadas = 0")
+    conn.commit()
+    conn.close()
+    
+    assert DatabaseManager(storage).save_calculo(resultado) == calculo_id
+
+def test_calculo_removido_da_particao_pode_ser_salvo_de_novo(db, calculadora):
+    resultado = _resultado_manual(calculadora, date(2024, 3, 5))
+    calculo_id = db.save_calculo(resultado)
+    db.arquivar_mes('2024-03')
+    
+    assert db.delete_calculos_anteriores(datetime(2024, 4, 1), mes='2024-03') == 1
+    
+    assert db.save_calculo(resultado) != calculo_id
+    assert db.get_estatisticas()['total_calculos'] == 1
+
+def test_mesmas_entradas_manuais_em_outro_dia_sao_outro_calculo(db, calculadora):
+    primeiro = db.save_calculo(_resultado_manual(calculadora, date(2024, 3, 5)))
+    
+    segundo = db.save_calculo(_resultado_manual(calculadora, date(2024, 3, 6)))
+    
+    assert segundo != primeiro
+    assert [str(calculo['data_calculo'])[:10] for calculo in db.buscar_calculos()] == ['2024-03-06', '2024-03-05']
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Exportações sob demanda: cache em disco por cálculo e versão das figuras
+"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from core.export_service import ExportService
+
+@pytest.fixture
+def export_service(db, tmp_path):
+    """Serviço de exportação com cache em pasta temporária"""
+    return ExportService(db, diretorio=tmp_path / "exportacoes")
+
+def _resultado(calculadora, valor: float):
+    resultado = calculadora.calcular_icms_st_manual([
+        {'codigo': 'A1', 'descricao': 'Refrigerante lata', 'ncm': '22021000', 'quantidade': 1, 'valor_unitario': valor}
+    ])
+    resultado.data_calculo = datetime(2024, 3, 5)
+    return resultado
+
+def test_exportacao_reaproveitada_do_cache(db, calculadora, export_service):
+    resultado = _resultado(calculadora, 10.0)
+    calculo_id = db.save_calculo(resultado)
+    
+    arquivo = export_service.get_arquivo(resultado, 'csv', calculo_id)
+    
+    assert export_service.get_arquivo(resultado, 'csv', calculo_id) == arquivo
+    assert export_service.get_estatisticas()['arquivos'] == 1
+
+def test_id_reutilizado_apos_restauracao_nao_serve_exportacao_antiga(db, calculadora, export_service):
+    db.save_calculo(_resultado(calculadora, 10.0))
+    backup = sqlite3.connect(':memory:')
+    db.backup_to(backup)
+    
+    anterior = _resultado(calculadora, 20.0)
+    calculo_id = db.save_calculo(anterior)
+    exportacao_anterior = export_service.exportar(anterior, 'csv', calculo_id)
+    
+    db.restore_from(backup)
+    backup.close()
+    novo = _resultado(calculadora, 30.0)
+    assert db.save_calculo(novo) == calculo_id
+    
+    exportacao = export_service.exportar(novo, 'csv', calculo_id)
+    
+    assert exportacao != exportacao_anterior
+    export_service.limpar()
+    assert exportacao == export_service.exportar(novo, 'csv', calculo_id)
\ No newline at end of file
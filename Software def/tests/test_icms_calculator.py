@@ -0,0 +1,48 @@
+"""
+Snapshot das figuras no calculador: recarregado a cada alteração das figuras
+"""
+import sqlite3
+
+from config.database import init_database
+from config.storage import MemoryStorage
+from core.database_manager import DatabaseManager
+from models.figura_tributaria import FiguraTributaria
+
+def test_snapshot_recarregado_ao_gravar_figura(db, calculadora):
+    figuras = calculadora.carregar_figuras()
+    assert calculadora.carregar_figuras() is figuras
+    
+    db.save_figura_tributaria(FiguraTributaria('33030010', 'Perfumes', 'st'))
+    
+    assert '33030010' in calculadora.carregar_figuras()
+
+def test_restauracao_invalida_snapshot_de_figuras(db, calculadora, storage):
+    outro_storage = MemoryStorage()
+    try:
+        outro = DatabaseManager(outro_storage)
+        outro.save_figura_tributaria(FiguraTributaria('33030010', 'Perfumes', 'st'))
+        assert db.get_versao_dados('figuras') == outro.get_versao_dados('figuras')
+        
+        assert '22021000' in calculadora.carregar_figuras()
+        copia = sqlite3.connect(':memory:')
+        outro.backup_to(copia)
+        db.restore_from(copia)
+        copia.close()
+        
+        figuras = calculadora.carregar_figuras()
+        assert '33030010' in figuras and '22021000' not in figuras
+    finally:
+        outro_storage.close()
+
+def test_migracao_de_figuras_invalida_snapshot(storage):
+    conn = storage.connect()
+    init_database(conn)
+    conn.execute("DELETE FROM figuras_tributarias_versoes")
+    conn.execute("INSERT INTO figuras_tributarias (ncm, descricao, tipo_tributacao) VALUES ('22021000', 'Refrigerantes', 'st')")
+    conn.commit()
+    versao = conn.execute("SELECT COALESCE(MAX(versao), 0) FROM controle_alteracoes WHERE escopo = 'figuras'").fetchone()[0]
+    conn.close()
+    
+    db = DatabaseManager(storage)
+    assert db.get_versao_dados('figuras') == versao + 1
+    assert db.get_figura_tributaria('22021000') is not None
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Migrações de esquema: itens no layout original e unicidade das versões de figuras
+"""
+import sqlite3
+
+from config.database import init_database
+from core.database_manager import DatabaseManager
+
+ITENS_ORIGINAL = """
+    CREATE TABLE itens_calculo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        calculo_id INTEGER NOT NULL,
+        codigo_item TEXT NOT NULL,
+        descricao TEXT NOT NULL,
+        ncm TEXT NOT NULL,
+        quantidade REAL NOT NULL,
+        valor_unitario REAL NOT NULL,
+        valor_total REAL NOT NULL,
+        valor_ipi REAL DEFAULT 0.0,
+        valor_frete REAL DEFAULT 0.0,
+        valor_frete_fora REAL DEFAULT 0.0,
+        tipo_tributacao TEXT,
+        aliquota_icms REAL DEFAULT 0.0,
+        mva_ajustado REAL DEFAULT 0.0,
+        reducao_bc_st REAL DEFAULT 0.0,
+        reducao_bc_proprio REAL DEFAULT 0.0,
+        base_calculo_st REAL DEFAULT 0.0,
+        valor_icms_st_debito REAL DEFAULT 0.0,
+        valor_icms_proprio_credito REAL DEFAULT 0.0,
+        valor_icms_st_recolher REAL DEFAULT 0.0,
+        valor_custo_final REAL DEFAULT 0.0,
+        possui_figura BOOLEAN DEFAULT FALSE,
+        observacoes TEXT,
+        FOREIGN KEY (calculo_id) REFERENCES calculos_icms_st (id)
+    )
+"""
+
+VERSOES_COM_UNICIDADE = """
+    CREATE TABLE figuras_tributarias_versoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ncm TEXT NOT NULL,
+        descricao TEXT NOT NULL,
+        tipo_tributacao TEXT NOT NULL CHECK (tipo_tributacao IN ('st', 'tributado')),
+        aliquota_icms_12 REAL DEFAULT 12.0,
+        aliquota_icms_4 REAL DEFAULT 4.0,
+        mva_ajustado_12 REAL DEFAULT 0.0,
+        mva_ajustado_4 REAL DEFAULT 0.0,
+        reducao_bc_icms_st REAL DEFAULT 0.0,
+        reducao_bc_icms_proprio REAL DEFAULT 0.0,
+        observacoes TEXT,
+        origem_dados TEXT DEFAULT 'manual',
+        ativo BOOLEAN DEFAULT TRUE,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        vigencia_inicio DATE NOT NULL,
+        vigencia_fim DATE,
+        UNIQUE (ncm, vigencia_inicio)
+    )
+"""
+
+def _banco_antigo(storage):
+    """Banco com itens no layout original e versões com UNIQUE (ncm, vigencia_inicio)"""
+    conn = storage.connect()
+    conn.execute("""
+        CREATE TABLE calculos_icms_st (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origem TEXT NOT NULL,
+            chave_nfe TEXT,
+            total_itens INTEGER NOT NULL,
+            total_valor_produtos REAL NOT NULL,
+            total_icms_st_recolher REAL NOT NULL,
+            total_custo_final REAL NOT NULL,
+            data_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(ITENS_ORIGINAL)
+    conn.execute(VERSOES_COM_UNICIDADE)
+    conn.execute("""
+        INSERT INTO figuras_tributarias_versoes (ncm, descricao, tipo_tributacao, mva_ajustado_12, vigencia_inicio)
+        VALUES ('22021000', 'Refrigerantes', 'st', 40.0, '1900-01-01')
+    """)
+    conn.execute("""
+        INSERT INTO calculos_icms_st (id, origem, total_itens, total_valor_produtos, total_icms_st_recolher,
+                                      total_custo_final, data_calculo)
+        VALUES (1, 'manual', 2, 30.0, 1.5, 31.5, '2024-03-05 10:00:00')
+    """)
+    conn.executemany("""
+        INSERT INTO itens_calculo (calculo_id, codigo_item, descricao, ncm, quantidade, valor_unitario, valor_total,
+                                   mva_ajustado, valor_icms_st_recolher, valor_custo_final, possui_figura, observacoes)
+        VALUES (1, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        ('A1', 'Refrigerante lata', '22021000', 10.0, 10.0, 40.0, 0.99, 10.99, True, ''),
+        ('B2', 'Refrigerante lata', '22021000', 20.0, 20.0, 35.0, 0.51, 20.51, True, 'MVA informado')
+    ])
+    conn.commit()
+    conn.close()
+
+def test_compactar_itens_preserva_valores(storage):
+    _banco_antigo(storage)
+    db = DatabaseManager(storage)
+    
+    conn = storage.connect()
+    colunas = [row[1] for row in conn.execute("PRAGMA table_info(itens_calculo)")]
+    textos = conn.execute("SELECT COUNT(*) FROM textos_itens").fetchone()[0]
+    conn.close()
+    assert 'descricao' not in colunas and 'descricao_id' in colunas
+    assert textos == 2
+    
+    itens = db.get_itens_calculo(1, '2024-03-05')
+    assert [item['descricao'] for item in itens] == ['Refrigerante lata'] * 2
+    assert [item['valor_icms_st_recolher'] for item in itens] == [0.99, 0.51]
+    assert [item['observacoes'] for item in itens] == ['', 'MVA informado']
+    # MVA igual ao da figura vigente fica nulo no item e volta pela versão; o divergente é mantido
+    assert [item['mva_ajustado'] for item in itens] == [40.0, 35.0]
+    assert all(item['figura_versao_id'] == 1 for item in itens)
+
+def test_remover_unicidade_versoes(storage):
+    _banco_antigo(storage)
+    conn = storage.connect()
+    init_database(conn)
+    ddl = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'figuras_tributarias_versoes'").fetchone()[0]
+    
+    # Mesmo NCM e início de vigência: aceito depois da migração
+    conn.execute("""
+        INSERT INTO figuras_tributarias_versoes (ncm, descricao, tipo_tributacao, vigencia_inicio)
+        VALUES ('22021000', 'Refrigerantes', 'st', '1900-01-01')
+    """)
+    versoes = conn.execute("SELECT COUNT(*) FROM figuras_tributarias_versoes").fetchone()[0]
+    conn.close()
+    
+    assert 'UNIQUE' not in ddl
+    assert versoes == 2
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+Partições mensais: arquivamento, leitura de partições comprimidas e retenção
+"""
+from datetime import datetime
+
+import pytest
+
+from core.retention_service import RetentionService
+from utils.exceptions import DatabaseError
+
+def _arquivos_historico(storage):
+    """Nome, tamanho e mtime dos arquivos da pasta historico"""
+    pasta = storage.diretorio / "historico"
+    return {arquivo.name: (arquivo.stat().st_size, arquivo.stat().st_mtime_ns) for arquivo in pasta.iterdir()}
+
+def test_arquivar_mes_move_calculos_para_particao(db, salvar, storage):
+    id_marco = salvar(datetime(2024, 3, 5), 10.0)
+    salvar(datetime.now(), 20.0)
+    total = db.get_rollup()
+    
+    assert db.arquivar_mes('2024-03') == 1
+    
+    particao = db.listar_particoes()[0]
+    assert (particao['mes'], particao['id_min'], particao['qtd_calculos']) == ('2024-03', id_marco, 1)
+    assert (storage.diretorio / "historico" / particao['arquivo']).exists()
+    
+    # Consultas enxergam a partição; rollups e totais não mudam
+    assert [calculo['id'] for calculo in db.buscar_calculos(inicio='2024-03-01', fim='2024-03-31')] == [id_marco]
+    assert db.get_itens_calculo(id_marco, '2024-03-05')[0]['valor_total'] == 10.0
+    assert db.get_rollup() == total
+    assert db.get_estatisticas()['total_calculos'] == 2
+
+def test_arquivar_mes_corrente_falha(db):
+    with pytest.raises(DatabaseError):
+        db.arquivar_mes(datetime.now().strftime('%Y-%m'))
+
+def test_leitura_de_particao_comprimida_nao_altera_arquivos(db, salvar, storage):
+    from config.storage import SnapshotStorage
+    from core.database_manager import DatabaseManager
+    
+    id_marco = salvar(datetime(2024, 3, 5), 10.0)
+    db.arquivar_mes('2024-03')
+    assert db.comprimir_particao('2024-03')
+    antes = _arquivos_historico(storage)
+    
+    assert [calculo['id'] for calculo in db.buscar_calculos(inicio='2024-03-01', fim='2024-03-31')] == [id_marco]
+    assert len(db.get_itens_calculo(id_marco, '2024-03-05')) == 1
+    snapshot = DatabaseManager(SnapshotStorage(storage))
+    assert [calculo['id'] for calculo in snapshot.buscar_calculos(inicio='2024-03-01')] == [id_marco]
+    
+    assert _arquivos_historico(storage) == antes
+    assert db.listar_particoes()[0]['comprimido']
+
+def test_retencao_remove_particoes_expiradas(db, salvar):
+    salvar(datetime(2024, 3, 5), 10.0)
+    salvar(datetime(2024, 4, 5), 20.0)
+    db.arquivar_meses_anteriores()
+    
+    dias = (datetime.now() - datetime(2024, 4, 1)).days
+    resultado = RetentionService(db, pausa_lote=0).executar(dias=dias, arquivar=False)
+    
+    assert resultado['calculos_removidos'] == 1
+    assert [particao['mes'] for particao in db.listar_particoes()] == ['2024-04']
+    assert db.get_rollup()['valor_produtos'] == 20.0
\ No newline at end of file
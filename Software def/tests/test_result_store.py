@@ -0,0 +1,34 @@
+"""
+Impressões digitais dos cálculos da página e armazenamento da sessão
+"""
+from datetime import date
+
+from core.result_store import ResultStore, impressao_calculo
+
+def test_entradas_manuais_em_outro_dia_geram_outra_impressao():
+    entradas = ('MANUAL', [('codigo', 'A1'), ('valor_unitario', 10.0)], 0.0)
+    
+    hoje = impressao_calculo(*entradas, versao_figuras=1, dia=date(2024, 3, 5))
+    
+    assert impressao_calculo(*entradas, versao_figuras=1, dia=date(2024, 3, 5)) == hoje
+    assert impressao_calculo(*entradas, versao_figuras=1, dia=date(2024, 3, 6)) != hoje
+    assert impressao_calculo(*entradas, versao_figuras=2, dia=date(2024, 3, 5)) != hoje
+
+def test_xml_nao_depende_do_dia():
+    entradas = ('XML', b'<nfeProc/>', 0.0, False)
+    
+    assert (impressao_calculo(*entradas, versao_figuras=1, dia=date(2024, 3, 5))
+            == impressao_calculo(*entradas, versao_figuras=1, dia=date(2024, 3, 6)))
+
+def test_store_descarta_o_menos_usado(calculadora):
+    store = ResultStore(max_resultados=2)
+    resultado = calculadora.calcular_icms_st_manual([
+        {'codigo': 'A1', 'descricao': 'Item', 'ncm': '22021000', 'quantidade': 1, 'valor_unitario': 1.0}
+    ])
+    store.put('a', resultado)
+    store.put('b', resultado)
+    
+    store.get('a')
+    store.put('c', resultado)
+    
+    assert 'a' in store and 'c' in store and 'b' not in store
\ No newline at end of file
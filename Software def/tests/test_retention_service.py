@@ -0,0 +1,25 @@
+"""
+Retenção: expurgo em lotes conforme o período configurado ou informado
+"""
+from datetime import datetime, timedelta
+
+from core.retention_service import RetentionService
+
+def test_expurgo_em_lotes_respeita_periodo_configurado(db, salvar):
+    antigos = [salvar(datetime.now() - timedelta(days=400, hours=hora), 10.0 + hora) for hora in range(3)]
+    recente = salvar(datetime.now() - timedelta(days=10), 50.0)
+    
+    resultado = RetentionService(db, tamanho_lote=2, pausa_lote=0).executar(arquivar=False)
+    
+    assert resultado['calculos_removidos'] == len(antigos)
+    assert [calculo['id'] for calculo in db.buscar_calculos()] == [recente]
+
+def test_retencao_com_zero_dias_remove_tudo(db, salvar):
+    salvar(datetime(2024, 3, 5), 10.0)
+    salvar(datetime.now().replace(microsecond=0), 20.0)
+    
+    resultado = RetentionService(db, pausa_lote=0).executar(dias=0)
+    
+    assert resultado['calculos_removidos'] == 2
+    assert db.listar_particoes() == []
+    assert db.get_estatisticas()['total_calculos'] == 0
\ No newline at end of file
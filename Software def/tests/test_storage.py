@@ -0,0 +1,51 @@
+"""
+Backends de armazenamento: memória isolada e snapshot somente leitura
+"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from config.storage import MemoryStorage, SnapshotStorage
+from core.database_manager import DatabaseManager
+
+def test_memory_storage_isolado_e_descartado():
+    primeiro, segundo = MemoryStorage(), MemoryStorage()
+    try:
+        DatabaseManager(primeiro)
+        conn = primeiro.connect()
+        tabelas = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]
+        conn.close()
+        
+        conn = segundo.connect()
+        assert tabelas > 0
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+        conn.close()
+    finally:
+        primeiro.close()
+        segundo.close()
+
+def test_memory_storage_remove_pasta_temporaria():
+    storage = MemoryStorage()
+    pasta = storage.diretorio
+    (pasta / "historico").mkdir()
+    
+    storage.close()
+    
+    assert not pasta.exists()
+
+def test_snapshot_somente_leitura(db, salvar, storage):
+    calculo_id = salvar(datetime(2024, 3, 5), 10.0)
+    snapshot = SnapshotStorage(storage)
+    try:
+        salvar(datetime(2024, 3, 6), 20.0)
+        
+        leitor = DatabaseManager(snapshot)
+        assert [calculo['id'] for calculo in leitor.buscar_calculos()] == [calculo_id]
+        
+        conn = snapshot.connect()
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM calculos_icms_st")
+        conn.close()
+    finally:
+        snapshot.close()
\ No newline at end of file
@@ -20,4 +20,8 @@ class DatabaseError(CalculadoraFiscalError):
 
 class XMLProcessingError(CalculadoraFiscalError):
     """Erro no processamento de XML"""
+    pass
+
+class ExportError(CalculadoraFiscalError):
+    """Erro na exportação de dados"""
     pass
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Benchmark de inicialização: tempo de importação do app em um processo novo (python -X importtime)
+
+Uso pela linha de comando (a partir da pasta da aplicação):
+    python -m utils.startup_benchmark [--orcamento-ms 1000] [--repeticoes 3] [--top 15]
+
+Sai com código 1 se o tempo passar do orçamento ou se alguma dependência
+carregada sob demanda pelas páginas for importada na inicialização.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Pasta da aplicação (onde está o app.py)
+PASTA_APP = Path(__file__).parent.parent
+
+# Orçamento do import do app, em milissegundos
+ORCAMENTO_MS = 1000
+
+# Importadas só pelas páginas e exportadores, nunca na inicialização
+MODULOS_SOB_DEMANDA = ('pandas', 'numpy', 'plotly.express', 'openpyxl', 'xlsxwriter', 'pyarrow', 'pages')
+
+# Linha do -X importtime: "import time: self [us] | cumulative | nome (indentado pelo nível)"
+_LINHA_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+def medir_inicializacao(modulo: str = 'app') -> Dict[str, Any]:
+    """Importa `modulo` em um processo novo: tempo total, imports diretos e módulos carregados"""
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {modulo}"],
+        cwd=PASTA_APP, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{processo.stderr[-2000:]}")
+    
+    # Nível 0 (recuo de 1 espaço) soma o tempo total; nível 1 são os imports diretos do app
+    total = 0
+    diretos: List[Tuple[str, int]] = []
+    modulos: List[str] = []
+    for linha in processo.stderr.splitlines():
+        encontrado = _LINHA_IMPORTTIME.match(linha)
+        if not encontrado:
+            continue
+        _, cumulativo, recuo, nome = encontrado.groups()
+        nivel = (len(recuo) - 1) // 2
+        modulos.append(nome)
+        if nivel == 0:
+            total += int(cumulativo)
+        elif nivel == 1:
+            diretos.append((nome, int(cumulativo)))
+    
+    return {'total_ms': total / 1000.0, 'diretos': diretos, 'modulos': modulos}
+
+def dependencias_antecipadas(modulos: List[str]) -> List[str]:
+    """Entradas de MODULOS_SOB_DEMANDA (ou seus submódulos) importadas na inicialização"""
+    return [
+        prefixo for prefixo in MODULOS_SOB_DEMANDA
+        if any(nome == prefixo or nome.startswith(prefixo + '.') for nome in modulos)
+    ]
+
+def main():
+    """Ponto de entrada da linha de comando"""
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização do app contra um orçamento")
+    parser.add_argument('--orcamento-ms', type=float, default=ORCAMENTO_MS, help="Tempo máximo de importação do app")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Medições; vale a menor")
+    parser.add_argument('--top', type=int, default=15, help="Módulos mais lentos exibidos")
+    parser.add_argument('--modulo', default='app', help="Módulo de entrada a importar")
+    args = parser.parse_args()
+    
+    medicoes = [medir_inicializacao(args.modulo) for _ in range(max(args.repeticoes, 1))]
+    melhor = min(medicoes, key=lambda medicao: medicao['total_ms'])
+    
+    tempos = ', '.join(f"{medicao['total_ms']:.0f}" for medicao in medicoes)
+    print(f"Importação de {args.modulo}: {melhor['total_ms']:.0f} ms "
+          f"(orçamento {args.orcamento_ms:.0f} ms; medições: {tempos})")
+    for nome, cumulativo in sorted(melhor['diretos'], key=lambda modulo: modulo[1], reverse=True)[:args.top]:
+        print(f"  {cumulativo / 1000.0:8.1f} ms  {nome}")
+    
+    antecipadas = dependencias_antecipadas(melhor['modulos'])
+    if antecipadas:
+        print(f"Dependências sob demanda importadas na inicialização: {', '.join(antecipadas)}")
+    
+    if melhor['total_ms'] > args.orcamento_ms or antecipadas:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file